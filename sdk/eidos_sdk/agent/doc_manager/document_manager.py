@@ -8,6 +8,7 @@ from eidos_sdk.agent.doc_manager.parsers.base_parser import DocumentParser
 from eidos_sdk.agent.doc_manager.transformer.document_transformer import DocumentTransformer
 from eidos_sdk.agent_os import AgentOS
 from eidos_sdk.system.reference_model import Specable, AnnotatedReference
+from eidos_sdk.system.task_claims import claim_task, complete_task, wait_for_task
 
 
 class SearchResult(BaseModel):
@@ -83,6 +84,12 @@ class DocumentManager(Specable[DocumentManagerSpec]):
     async def sync_docs(self, force: bool = False):
         if force or self.last_reload + self.spec.recheck_frequency < time.time():
             self.last_reload = time.time()
+            # the documents are shared by every worker, so only one of them syncs each period. The others only need to
+            # wait for it if the documents have never been synced.
+            if not force:
+                while not await claim_task(self.collection_name, self.spec.recheck_frequency):
+                    if await wait_for_task(self.collection_name):
+                        return
             data = {}
             async for file in AgentOS.symbolic_memory.find(self.collection_name, {}):
                 data[file["file_path"]] = file["data"]
@@ -101,4 +108,5 @@ class DocumentManager(Specable[DocumentManagerSpec]):
             async for file_path in ret.removed_files:
                 await self._removeFile(file_path)
 
+            await complete_task(self.collection_name)
             self.last_reload = time.time()
@@ -105,8 +105,8 @@ class RetrieverAgent(Specable[RetrieverAgentSpec]):
         else:
             questions = [question]
         question_to_docs = {}
-        for question in questions:
-            embedded_q = await AgentOS.similarity_memory.embedder.embed_text(question)
+        embedded_questions = await AgentOS.similarity_memory.embedder.embed_batch(questions)
+        for question, embedded_q in zip(questions, embedded_questions):
             results_ = await AgentOS.similarity_memory.vector_store.raw_query(
                 f"doc_contents_{self.spec.name}", embedded_q, self.spec.max_num_results
             )
@@ -15,6 +15,10 @@ class AgentOS:
     symbolic_memory: "SymbolicMemory" = ...  # noqa: F821
     similarity_memory: "SimilarityMemory" = ...  # noqa: F821
     security_manager: "SecurityManager" = ...  # noqa: F821
+    openai_scheduler: "OpenAIScheduler" = ...  # noqa: F821
+    job_executor: "JobExecutor" = ...  # noqa: F821
+    callback_dispatcher: "CallbackDispatcher" = ...  # noqa: F821
+    machine: "AgentMachine" = ...  # noqa: F821
 
     @classmethod
     def _get_or_load_resources(cls) -> Dict[str, Dict[str, Tuple[Resource, str]]]:
@@ -34,6 +38,10 @@ class AgentOS:
         cls.symbolic_memory = machine.memory.symbolic_memory
         cls.similarity_memory = machine.memory.similarity_memory
         cls.security_manager = machine.security_manager
+        cls.openai_scheduler = machine.openai_scheduler
+        cls.job_executor = machine.job_executor
+        cls.callback_dispatcher = machine.callback_dispatcher
+        cls.machine = machine
 
     @classmethod
     def register_resource(cls, resource: Resource, source=None):  # noqa: F821
@@ -78,4 +86,8 @@ class AgentOS:
         cls.file_memory = ...
         cls.symbolic_memory = ...
         cls.similarity_memory = ...
-        cls.embedder = ...
+        cls.security_manager = ...
+        cls.openai_scheduler = ...
+        cls.job_executor = ...
+        cls.callback_dispatcher = ...
+        cls.machine = ...
@@ -1,17 +1,22 @@
 import argparse
 import logging.config
 import pathlib
+import random
+import sys
+import time
 from contextlib import asynccontextmanager
 
 import dotenv
 import uvicorn
 import yaml
 from fastapi import FastAPI
-from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
 from starlette.requests import Request
-from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from eidos_sdk.agent_os import AgentOS
+from eidos_sdk.bin import worker_pool
+from eidos_sdk.bin.worker_pool import process_local_components
+from eidos_sdk.system.agent_machine import AgentMachine
 from eidos_sdk.system.resources.machine_resource import MachineResource
 from eidos_sdk.system.resources.resources_base import load_resources, Resource
 from eidos_sdk.util.logger import logger
@@ -36,6 +41,24 @@ def parse_args():
         action="store_true",
     )
     parser.add_argument("--debug", action="store_true", help="Turn on debug logging")
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=1,
+        help="The number of worker processes. The machine is built once and forked into each worker. Defaults to 1.",
+    )
+    parser.add_argument(
+        "--allow-process-local-memory",
+        action="store_true",
+        help="Run several workers even though the machine's memory is not shared between processes.",
+    )
+    parser.add_argument(
+        "--log-sample-rate",
+        type=float,
+        default=1.0,
+        help="The fraction of requests which are logged. Failed and slow requests are always logged. Defaults to 1.",
+    )
     parser.add_argument(
         "yaml_path",
         type=str,
@@ -53,24 +76,37 @@ def parse_args():
     return parser.parse_args()
 
 
-@asynccontextmanager
-async def start_os(app, resource_generator, machine_name, log_level=logging.INFO):
+def configure_logging(log_level=logging.INFO):
     conf_ = pathlib.Path(__file__).parent.parent.parent / "logging.conf"
     logging.config.fileConfig(conf_)
     logger.setLevel(log_level)
 
+
+def build_machine(resource_generator, machine_name) -> AgentMachine:
+    """Registers the resources and builds the machine, without starting it."""
+    for resource_or_tuple in resource_generator:
+        if isinstance(resource_or_tuple, Resource):
+            resource, source = resource_or_tuple, None
+        else:
+            resource, source = resource_or_tuple
+        AgentOS.register_resource(resource=resource, source=source)
+
+    logger.info(f"Building machine '{machine_name}'")
+    machine_spec = AgentOS.get_resource(MachineResource, machine_name).spec
+    logger.debug(yaml.safe_dump(machine_spec.model_dump()))
+    return machine_spec.instantiate()
+
+
+@asynccontextmanager
+async def start_os(app, resource_generator, machine_name, log_level=logging.INFO, machine: AgentMachine = None):
+    """
+    Starts the machine for the lifetime of the app. The machine is built from the resources unless it was built
+    already (see build_machine), as it is by the parent of forked workers.
+    """
+    configure_logging(log_level)
+
     try:
-        for resource_or_tuple in resource_generator:
-            if isinstance(resource_or_tuple, Resource):
-                resource, source = resource_or_tuple, None
-            else:
-                resource, source = resource_or_tuple
-            AgentOS.register_resource(resource=resource, source=source)
-
-        logger.info(f"Building machine '{machine_name}'")
-        machine_spec = AgentOS.get_resource(MachineResource, machine_name).spec
-        logger.debug(yaml.safe_dump(machine_spec.model_dump()))
-        machine = machine_spec.instantiate()
+        machine = machine or build_machine(resource_generator, machine_name)
         AgentOS.load_machine(machine)
         await machine.start(app)
         logger.info("Server Started")
@@ -78,31 +114,99 @@ async def start_os(app, resource_generator, machine_name, log_level=logging.INFO
     except Exception:
         logger.exception("Failed to start AgentOS")
         raise
-    machine.stop()
+    await machine.stop()
     AgentOS.reset()
 
 
-class LoggingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        logger = logging.getLogger("eidolon")
-        logger.info(f"Request: {request.method} {request.url}")
+class LoggingMiddleware:
+    """
+    Logs one structured line per http request, with its method, path, status code and duration (until the last byte
+    of the response is sent, so streamed responses are timed in full). The fields are also attached to the log record
+    as `http`, for structured handlers. Query strings are left out since they may carry credentials.
+
+    Requests are logged at sample_rate, but failed (5xx or raised) and slow requests are always logged.
+
+    Like the other middleware here, this is plain ASGI middleware: BaseHTTPMiddleware runs each request in its own
+    task and wraps the response stream, which costs throughput and breaks streaming responses.
+    """
+
+    def __init__(self, app: ASGIApp, sample_rate: float = 1.0, slow_request_threshold: float = 1.0):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.slow_request_threshold = slow_request_threshold
+        self.logger = logging.getLogger("eidolon")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status_code = 500
+
+        async def send_and_record(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
         try:
-            response = await call_next(request)
-        except Exception as e:
-            logger.exception("Unhandled exception")
-            raise e
-        logger.info(f"Response: {response.status_code}")
-        return response
+            await self.app(scope, receive, send_and_record)
+        except Exception:
+            self._log(logging.ERROR, scope, 500, start, exc_info=True)
+            raise
+        duration = time.perf_counter() - start
+        if status_code >= 500:
+            self._log(logging.ERROR, scope, status_code, start)
+        elif duration >= self.slow_request_threshold:
+            self._log(logging.WARNING, scope, status_code, start)
+        elif self.sample_rate >= 1 or random.random() < self.sample_rate:
+            self._log(logging.INFO, scope, status_code, start)
 
+    def _log(self, level: int, scope: Scope, status_code: int, start: float, exc_info: bool = False):
+        if self.logger.isEnabledFor(level):
+            fields = dict(
+                method=scope["method"],
+                path=scope["path"],
+                status=status_code,
+                duration_ms=round((time.perf_counter() - start) * 1000, 2),
+            )
+            message = " ".join(f"{k}={v}" for k, v in fields.items())
+            self.logger.log(level, message, exc_info=exc_info, extra=dict(http=fields))
 
-class SecurityMiddleware(BaseHTTPMiddleware):
 
-    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint) -> Response:
-        resp = await AgentOS.security_manager.authorization_processor.dispatch(request)
-        if not resp:
-            return await call_next(request)
-        else:
-            return resp
+class SecurityMiddleware:
+    """Answers requests the security manager's authorization processor rejects, and passes the others on."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] == "http":
+            # the processor records what it learns about the caller in the request's state, which is kept in scope
+            resp = await AgentOS.security_manager.authorization_processor.dispatch(Request(scope, receive))
+            if resp:
+                return await resp(scope, receive, send)
+        await self.app(scope, receive, send)
+
+
+def add_middleware(app: FastAPI, log_sample_rate: float = 1.0):
+    """Adds the server's middleware to app. Logging is outermost, so rejected requests are logged too."""
+    app.add_middleware(SecurityMiddleware)
+    app.add_middleware(LoggingMiddleware, sample_rate=log_sample_rate)
+
+
+def create_app(
+    resource_generator, machine_name, log_level=logging.INFO, log_sample_rate=1.0, machine: AgentMachine = None
+) -> FastAPI:
+    """
+    Creates the server's app. The machine is built from the resources (unless it is given) and started by the app's
+    lifespan.
+    """
+    _app = FastAPI(
+        lifespan=lambda app: start_os(app, resource_generator, machine_name, log_level, machine),
+    )
+    add_middleware(_app, log_sample_rate)
+    return _app
 
 
 def main():
@@ -110,11 +214,10 @@ def main():
     log_level_str = "debug" if args.debug else "info"
     log_level = logging.DEBUG if args.debug else logging.INFO
 
-    _app = FastAPI(
-        lifespan=lambda app: start_os(app, load_resources(args.yaml_path), args.machine, log_level),
-    )
-    _app.add_middleware(LoggingMiddleware)
-    _app.add_middleware(SecurityMiddleware)
+    if args.workers > 1:
+        sys.exit(serve_workers(args, log_level, log_level_str))
+
+    _app = create_app(load_resources(args.yaml_path), args.machine, log_level, args.log_sample_rate)
 
     # Run the server
     uvicorn.run(
@@ -126,5 +229,29 @@ def main():
     )
 
 
+def serve_workers(args, log_level, log_level_str) -> int:
+    """
+    Builds the machine once, checks that its state can be shared between workers, and serves it from forked workers.
+    """
+    if args.reload:
+        logger.error("--reload can not be used with --workers")
+        return 2
+    configure_logging(log_level)
+    machine = build_machine(load_resources(args.yaml_path), args.machine)
+    local = process_local_components(machine)
+    if local:
+        message = (
+            f"The state of {', '.join(local)} is not shared between workers, so processes, conversations and files "
+            "written by one worker are not visible to the others. Configure a shared backend (e.g. MongoSymbolicMemory "
+            "and LocalFileMemory)"
+        )
+        if not args.allow_process_local_memory:
+            logger.error(f"{message}, or pass --allow-process-local-memory.")
+            return 2
+        logger.warning(f"{message}.")
+    _app = create_app(None, args.machine, log_level, args.log_sample_rate, machine=machine)
+    return worker_pool.serve(_app, "0.0.0.0", args.port, args.workers, log_level_str)
+
+
 if __name__ == "__main__":
     main()
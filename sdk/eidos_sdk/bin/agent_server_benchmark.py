@@ -0,0 +1,420 @@
+"""
+Benchmarks the agent http server end to end, without any network access.
+
+The server app is built with create_app (so requests pass through the same middleware as in production) and driven
+in-process. The machine uses LocalSymbolicMemory, InMemoryFileMemory, HashingEmbedding and a local chroma store, and
+the default LLMUnit is replaced with SimulatedLLMUnit, so the results measure the framework's own overhead.
+
+Usage:
+    python -m eidos_sdk.bin.agent_server_benchmark --requests 500 --concurrency 32 --output results.json
+"""
+
+import argparse
+import asyncio
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import platform
+import statistics
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from importlib import metadata
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from eidos_sdk.agent_os import AgentOS
+from eidos_sdk.bin.agent_http_server import create_app
+from eidos_sdk.cpu.llm.simulated_llm_unit import SimulatedLLMUnit
+from eidos_sdk.system.resources.machine_resource import MachineResource
+from eidos_sdk.system.resources.reference_resource import ReferenceResource
+from eidos_sdk.system.resources.resources_base import Resource, Metadata
+
+MACHINE_NAME = "benchmark"
+
+# the time spent in each instrumented layer by the request being processed, in seconds
+_layer_times: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar("layer_times", default=None)
+
+
+@dataclass
+class Scenario:
+    name: str
+    # sets up the scenario (e.g. creates processes) and returns a function which makes one request
+    prepare: Callable[[httpx.AsyncClient, int], Awaitable[Callable[[int], Awaitable[httpx.Response]]]]
+
+
+@dataclass
+class ScenarioResult:
+    latencies: List[float] = field(default_factory=list)
+    layers: List[Dict[str, float]] = field(default_factory=list)
+    errors: int = 0
+    duration: float = 0
+
+
+def resources(corpus_dir: str, vector_dir: str, llm: Dict[str, Any]) -> List[Resource]:
+    """The machine and agents under test."""
+    return [
+        MachineResource(
+            apiVersion="eidolon/v1",
+            metadata=Metadata(name=MACHINE_NAME),
+            spec=dict(
+                symbolic_memory="LocalSymbolicMemory",
+                file_memory="InMemoryFileMemory",
+                similarity_memory=dict(
+                    embedder="HashingEmbedding",
+                    vector_store=dict(implementation="ChromaVectorStore", url=f"file://{vector_dir}"),
+                ),
+            ),
+        ),
+        # every component which uses the default llm gets the simulated one
+        ReferenceResource(apiVersion="eidolon/v1", metadata=Metadata(name="LLMUnit"), spec=llm),
+        Resource(
+            apiVersion="eidolon/v1",
+            kind="Agent",
+            metadata=Metadata(name="GenericAgent"),
+            spec=dict(
+                implementation="GenericAgent",
+                description="Answers questions.",
+                system_prompt="You are a helpful assistant.",
+                user_prompt="{{instruction}}",
+                input_schema=dict(instruction=dict(type="string")),
+                output_schema=dict(
+                    type="object", properties=dict(answer=dict(type="string"), confidence=dict(type="number"))
+                ),
+            ),
+        ),
+        Resource(
+            apiVersion="eidolon/v1",
+            kind="Agent",
+            metadata=Metadata(name="TreeOfThoughtsAgent"),
+            spec=dict(
+                implementation="TreeOfThoughtsAgent",
+                description="Answers questions with the tree of thoughts algorithm.",
+                user_prompt="{{question}}",
+                input_schema=dict(question=dict(type="string")),
+                output_schema="str",
+                num_iterations=5,
+                fallback="LLM",
+            ),
+        ),
+        Resource(
+            apiVersion="eidolon/v1",
+            kind="Agent",
+            metadata=Metadata(name="RetrieverAgent"),
+            spec=dict(
+                implementation="eidos_sdk.agent.retriever_agent.retriever_agent.RetrieverAgent",
+                name="benchmark_docs",
+                description="Searches the benchmark corpus.",
+                loader_root_location=f"file://{corpus_dir}",
+            ),
+        ),
+    ]
+
+
+def write_corpus(corpus_dir: Path, documents: int):
+    topics = ["memory", "scheduling", "streaming", "caching", "security", "retrieval", "planning", "tools"]
+    for i in range(documents):
+        topic = topics[i % len(topics)]
+        text = f"Document {i} is about {topic}. " * 5 + f"It explains how agents use {topic} to answer questions."
+        (corpus_dir / f"doc_{i}.txt").write_text(text)
+
+
+def scenarios() -> List[Scenario]:
+    def program(agent: str, program_name: str, body: Dict[str, Any]):
+        async def prepare(client: httpx.AsyncClient, _concurrency: int):
+            async def request(_worker: int):
+                return await client.post(f"/agents/{agent}/programs/{program_name}", json=body)
+
+            return request
+
+        return prepare
+
+    async def prepare_action(client: httpx.AsyncClient, concurrency: int):
+        # a process only runs one action at a time, so each worker gets its own
+        process_ids = []
+        for _ in range(concurrency):
+            response = await client.post("/agents/GenericAgent/programs/question", json=dict(instruction="Hello"))
+            response.raise_for_status()
+            process_ids.append(response.json()["process_id"])
+
+        async def request(worker: int):
+            return await client.post(
+                f"/agents/GenericAgent/processes/{process_ids[worker]}/actions/respond",
+                json=dict(statement="Tell me more."),
+            )
+
+        return request
+
+    return [
+        Scenario("generic_program", program("GenericAgent", "question", dict(instruction="What is an agent?"))),
+        Scenario("generic_action", prepare_action),
+        Scenario("tot_program", program("TreeOfThoughtsAgent", "question", dict(body=dict(question="What is 2+2?")))),
+        Scenario("retriever_search", program("RetrieverAgent", "search", dict(question="How do agents use caching?"))),
+    ]
+
+
+def _record(layer: str, start: float):
+    times = _layer_times.get()
+    if times is not None:
+        times[layer] = times.get(layer, 0) + time.perf_counter() - start
+
+
+def _timed(layer: str, fn: Callable) -> Callable:
+    if inspect.isasyncgenfunction(fn):
+
+        @functools.wraps(fn)
+        async def timed_generator(*args, **kwargs):
+            generator = fn(*args, **kwargs)
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = await generator.__anext__()
+                except StopAsyncIteration:
+                    _record(layer, start)
+                    return
+                _record(layer, start)
+                yield item
+
+        return timed_generator
+    elif inspect.iscoroutinefunction(fn):
+
+        @functools.wraps(fn)
+        async def timed_coroutine(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                _record(layer, start)
+
+        return timed_coroutine
+    else:
+
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _record(layer, start)
+
+        return timed
+
+
+def _instrument(layer: str, obj: Any, names: Optional[List[str]] = None):
+    for name in names or [n for n in dir(type(obj)) if not n.startswith("_")]:
+        attr = getattr(type(obj), name, None)
+        if callable(attr) and name not in ("start", "stop"):
+            setattr(obj, name, _timed(layer, getattr(obj, name)))
+
+
+@contextmanager
+def _instrument_llm():
+    originals = SimulatedLLMUnit.execute_llm, SimulatedLLMUnit.execute_llm_stream
+    SimulatedLLMUnit.execute_llm = _timed("llm", SimulatedLLMUnit.execute_llm)
+    SimulatedLLMUnit.execute_llm_stream = _timed("llm", SimulatedLLMUnit.execute_llm_stream)
+    try:
+        yield
+    finally:
+        SimulatedLLMUnit.execute_llm, SimulatedLLMUnit.execute_llm_stream = originals
+
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # imported here since resource only exists on posix systems, and linux has /proc anyway
+        import resource
+
+        # peak rather than current usage, in kilobytes on linux and bytes on macOS
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return usage if platform.system() == "Darwin" else usage * 1024
+
+
+def _percentile(values: List[float], percentile: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(percentile / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def run_scenario(
+    client: httpx.AsyncClient, scenario: Scenario, requests: int, concurrency: int, warmup: int
+) -> ScenarioResult:
+    make_request = await scenario.prepare(client, concurrency)
+    result = ScenarioResult()
+    remaining = iter(range(warmup + requests))
+
+    async def worker(worker_id: int):
+        for i in remaining:
+            times = {}
+            token = _layer_times.set(times)
+            start = time.perf_counter()
+            try:
+                response = await make_request(worker_id)
+                ok = response.status_code < 400
+            except Exception:
+                logging.getLogger("eidolon").exception("benchmark request failed")
+                ok = False
+            finally:
+                _layer_times.reset(token)
+            if i < warmup:
+                continue
+            if ok:
+                result.latencies.append(time.perf_counter() - start)
+                result.layers.append(times)
+            else:
+                result.errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker(w) for w in range(concurrency)])
+    # warmup requests are included in the duration when concurrency > 1, so it slightly underestimates throughput
+    result.duration = time.perf_counter() - started
+    return result
+
+
+def summarize(result: ScenarioResult, requests: int, concurrency: int, memory: Dict[str, Any]) -> Dict[str, Any]:
+    latencies = result.latencies or [0.0]
+    layers = sorted({layer for times in result.layers for layer in times})
+    layer_means = {
+        layer: statistics.mean(times.get(layer, 0) for times in result.layers) * 1000 if result.layers else 0
+        for layer in layers
+    }
+    # whatever is not spent in an instrumented layer is the framework (routing, middleware, cpu, serialization)
+    layer_means["framework"] = max(0.0, statistics.mean(latencies) * 1000 - sum(layer_means.values()))
+    return dict(
+        requests=requests,
+        concurrency=concurrency,
+        errors=result.errors,
+        duration_s=result.duration,
+        throughput_rps=len(result.latencies) / result.duration if result.duration else 0,
+        latency_ms=dict(
+            mean=statistics.mean(latencies) * 1000,
+            p50=_percentile(latencies, 50) * 1000,
+            p95=_percentile(latencies, 95) * 1000,
+            p99=_percentile(latencies, 99) * 1000,
+            max=max(latencies) * 1000,
+        ),
+        layers_ms=layer_means,
+        memory=memory,
+    )
+
+
+async def run(
+    requests: int = 200,
+    concurrency: int = 16,
+    warmup: int = 10,
+    selected: Optional[List[str]] = None,
+    llm: Optional[Dict[str, Any]] = None,
+    documents: int = 50,
+    trace_memory: bool = False,
+    log_level: int = logging.WARNING,
+) -> Dict[str, Any]:
+    """Runs the selected scenarios (all by default) one after another and returns the results."""
+    llm = llm or dict(implementation=SimulatedLLMUnit.__name__, seed=0)
+    results = {}
+    with tempfile.TemporaryDirectory() as corpus_dir, tempfile.TemporaryDirectory() as vector_dir:
+        write_corpus(Path(corpus_dir), documents)
+        app = create_app(resources(corpus_dir, vector_dir, llm), MACHINE_NAME, log_level)
+        with _instrument_llm():
+            async with app.router.lifespan_context(app):
+                _instrument("symbolic_memory", AgentOS.symbolic_memory)
+                _instrument("file_memory", AgentOS.file_memory)
+                _instrument("embedding", AgentOS.similarity_memory.embedder)
+                _instrument("vector_store", AgentOS.similarity_memory.vector_store)
+                transport = httpx.ASGITransport(app=app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+                    for scenario in scenarios():
+                        if selected and scenario.name not in selected:
+                            continue
+                        if trace_memory:
+                            tracemalloc.start()
+                        rss_before = _rss_bytes()
+                        result = await run_scenario(client, scenario, requests, concurrency, warmup)
+                        memory = dict(rss_before_mb=rss_before / 2**20, rss_after_mb=_rss_bytes() / 2**20)
+                        memory["rss_growth_mb"] = memory["rss_after_mb"] - memory["rss_before_mb"]
+                        if trace_memory:
+                            current, peak = tracemalloc.get_traced_memory()
+                            tracemalloc.stop()
+                            memory.update(traced_current_mb=current / 2**20, traced_peak_mb=peak / 2**20)
+                        results[scenario.name] = summarize(result, requests, concurrency, memory)
+
+    return dict(
+        sdk_version=metadata.version("eidos-sdk") if _installed("eidos-sdk") else None,
+        python=platform.python_version(),
+        platform=platform.platform(),
+        timestamp=time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        config=dict(requests=requests, concurrency=concurrency, warmup=warmup, llm=llm, documents=documents),
+        scenarios=results,
+    )
+
+
+def _installed(distribution: str) -> bool:
+    try:
+        metadata.version(distribution)
+        return True
+    except metadata.PackageNotFoundError:
+        return False
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the agent http server with a simulated llm.")
+    parser.add_argument("-n", "--requests", type=int, default=200, help="Requests per scenario. Defaults to 200.")
+    parser.add_argument("-c", "--concurrency", type=int, default=16, help="Concurrent requests. Defaults to 16.")
+    parser.add_argument("--warmup", type=int, default=10, help="Unmeasured requests per scenario. Defaults to 10.")
+    parser.add_argument(
+        "-s",
+        "--scenario",
+        action="append",
+        choices=[scenario.name for scenario in scenarios()],
+        help="A scenario to run, may be repeated. Defaults to all scenarios.",
+    )
+    parser.add_argument("--mean-latency", type=float, default=0, help="The simulated llm's mean latency, in seconds.")
+    parser.add_argument(
+        "--latency-distribution",
+        default="constant",
+        choices=["constant", "uniform", "exponential", "lognormal"],
+        help="The simulated llm's latency distribution. Defaults to constant.",
+    )
+    parser.add_argument("--documents", type=int, default=50, help="The size of the retriever's corpus.")
+    parser.add_argument("--trace-memory", action="store_true", help="Trace allocations (slows the benchmark).")
+    parser.add_argument("--debug", action="store_true", help="Turn on debug logging")
+    parser.add_argument("-o", "--output", type=str, help="Where to write the results. Defaults to stdout.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    llm = dict(
+        implementation=SimulatedLLMUnit.__name__,
+        mean_latency=args.mean_latency,
+        latency_distribution=args.latency_distribution,
+        seed=0,
+    )
+    results = asyncio.run(
+        run(
+            requests=args.requests,
+            concurrency=args.concurrency,
+            warmup=args.warmup,
+            selected=args.scenario,
+            llm=llm,
+            documents=args.documents,
+            trace_memory=args.trace_memory,
+            log_level=logging.DEBUG if args.debug else logging.WARNING,
+        )
+    )
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
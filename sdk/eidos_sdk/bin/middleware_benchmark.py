@@ -0,0 +1,213 @@
+"""
+Benchmarks the agent http server's middleware stack: the requests per second it sustains and the latency it adds.
+
+The same minimal app is measured bare and with the server's middleware (see add_middleware), for a small json response
+and for a streamed one. Requests are made by calling the app directly, in-process, so the difference between the two
+is the cost of the stack itself. Authorization uses the NoopAuthProcessor, and log records are formatted but not
+written anywhere, so logging is measured without I/O.
+
+Usage:
+    python -m eidos_sdk.bin.middleware_benchmark --requests 5000 --concurrency 32 --log-sample-rate 0.1
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import statistics
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List
+
+from fastapi import FastAPI
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.types import ASGIApp, Message
+
+from eidos_sdk.agent_os import AgentOS
+from eidos_sdk.bin.agent_http_server import add_middleware
+from eidos_sdk.bin.agent_server_benchmark import _percentile
+from eidos_sdk.security.security_manager import SecurityManager, SecurityManagerSpec
+
+ENDPOINTS = ["json", "stream"]
+
+
+def build_app(with_middleware: bool, log_sample_rate: float) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/json")
+    async def json_endpoint():
+        return JSONResponse(dict(process_id="benchmark", state="terminated", data="ok"))
+
+    @app.get("/stream")
+    async def stream_endpoint():
+        async def chunks():
+            for i in range(10):
+                yield f"event: chunk\ndata: {i}\n\n"
+
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    if with_middleware:
+        add_middleware(app, log_sample_rate)
+    return app
+
+
+async def request(app: ASGIApp, path: str) -> int:
+    """Makes a GET request to app and returns the response's status code once its body has been sent."""
+    scope = dict(
+        type="http",
+        asgi=dict(version="3.0"),
+        http_version="1.1",
+        method="GET",
+        scheme="http",
+        path=path,
+        raw_path=path.encode(),
+        query_string=b"",
+        root_path="",
+        headers=[(b"host", b"benchmark")],
+        client=("127.0.0.1", 1234),
+        server=("benchmark", 80),
+    )
+    status = 0
+    requested = False
+    responded = asyncio.Event()
+
+    async def receive() -> Message:
+        nonlocal requested
+        if not requested:
+            requested = True
+            return dict(type="http.request", body=b"", more_body=False)
+        # like a server, only report the disconnect once the response is complete
+        await responded.wait()
+        return dict(type="http.disconnect")
+
+    async def send(message: Message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body" and not message.get("more_body", False):
+            responded.set()
+
+    await app(scope, receive, send)
+    return status
+
+
+async def measure(app: ASGIApp, path: str, requests: int, concurrency: int, warmup: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors = 0
+    remaining = iter(range(warmup + requests))
+
+    async def worker():
+        nonlocal errors
+        for i in remaining:
+            start = time.perf_counter()
+            status = await request(app, path)
+            if i < warmup:
+                continue
+            if status < 400:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    duration = time.perf_counter() - started
+    latencies = latencies or [0.0]
+    return dict(
+        errors=errors,
+        duration_s=duration,
+        throughput_rps=requests / duration if duration else 0,
+        latency_ms=dict(
+            mean=statistics.mean(latencies) * 1000,
+            p50=_percentile(latencies, 50) * 1000,
+            p95=_percentile(latencies, 95) * 1000,
+            p99=_percentile(latencies, 99) * 1000,
+            max=max(latencies) * 1000,
+        ),
+    )
+
+
+class _DiscardingHandler(logging.Handler):
+    def emit(self, record: logging.LogRecord):
+        self.format(record)
+
+
+@contextmanager
+def _benchmark_environment():
+    """Authorizes every request and formats the server's log records without writing them."""
+    security_manager = AgentOS.security_manager
+    AgentOS.security_manager = SecurityManager(spec=SecurityManagerSpec())
+    eidolon_logger = logging.getLogger("eidolon")
+    handlers, level, propagate = eidolon_logger.handlers, eidolon_logger.level, eidolon_logger.propagate
+    eidolon_logger.handlers = [_DiscardingHandler()]
+    eidolon_logger.setLevel(logging.INFO)
+    eidolon_logger.propagate = False
+    try:
+        yield
+    finally:
+        AgentOS.security_manager = security_manager
+        eidolon_logger.handlers, eidolon_logger.propagate = handlers, propagate
+        eidolon_logger.setLevel(level)
+
+
+async def run(
+    requests: int = 2000, concurrency: int = 16, warmup: int = 100, log_sample_rate: float = 1.0
+) -> Dict[str, Any]:
+    """Measures every endpoint bare and with the middleware stack, and returns the results."""
+    results = {}
+    with _benchmark_environment():
+        apps = dict(bare=build_app(False, log_sample_rate), stack=build_app(True, log_sample_rate))
+        for endpoint in ENDPOINTS:
+            runs = {
+                name: await measure(app, f"/{endpoint}", requests, concurrency, warmup) for name, app in apps.items()
+            }
+            bare, stack = runs["bare"], runs["stack"]
+            results[endpoint] = dict(
+                **runs,
+                added_latency_ms={
+                    k: stack["latency_ms"][k] - bare["latency_ms"][k] for k in ("mean", "p50", "p95", "p99")
+                },
+                throughput_ratio=stack["throughput_rps"] / bare["throughput_rps"] if bare["throughput_rps"] else 0,
+            )
+
+    return dict(
+        python=platform.python_version(),
+        platform=platform.platform(),
+        timestamp=time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        config=dict(requests=requests, concurrency=concurrency, warmup=warmup, log_sample_rate=log_sample_rate),
+        endpoints=results,
+    )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the agent http server's middleware stack.")
+    parser.add_argument("-n", "--requests", type=int, default=2000, help="Requests per run. Defaults to 2000.")
+    parser.add_argument("-c", "--concurrency", type=int, default=16, help="Concurrent requests. Defaults to 16.")
+    parser.add_argument("--warmup", type=int, default=100, help="Unmeasured requests per run. Defaults to 100.")
+    parser.add_argument(
+        "--log-sample-rate", type=float, default=1.0, help="The fraction of requests logged. Defaults to 1."
+    )
+    parser.add_argument("-o", "--output", type=str, help="Where to write the results. Defaults to stdout.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    results = asyncio.run(
+        run(
+            requests=args.requests,
+            concurrency=args.concurrency,
+            warmup=args.warmup,
+            log_sample_rate=args.log_sample_rate,
+        )
+    )
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Runs the agent http server in several worker processes, forked from a parent which has already built the machine.
+"""
+
+import os
+import signal
+import time
+from typing import Dict, List
+
+import uvicorn
+from fastapi import FastAPI
+
+from eidos_sdk.system.agent_machine import AgentMachine
+from eidos_sdk.util.logger import logger
+
+# a worker which fails sooner than this after it was started is considered broken rather than crashed
+MIN_WORKER_LIFETIME = 5
+
+
+def process_local_components(machine: AgentMachine) -> List[str]:
+    """The names of the machine's memory components whose contents workers can not share."""
+    components = dict(
+        symbolic_memory=machine.memory.symbolic_memory,
+        file_memory=machine.memory.file_memory,
+    )
+    return [
+        f"{name} ({component.__class__.__name__})"
+        for name, component in components.items()
+        if getattr(component, "process_local", False)
+    ]
+
+
+def serve(app: FastAPI, host: str, port: int, workers: int, log_level: str = "info") -> int:
+    """
+    Serves app from forked worker processes which share one listening socket, and returns the exit code of the server.
+
+    The parent supervises the workers. SIGINT and SIGTERM are forwarded to them so they shut down gracefully, and a
+    worker which crashes is replaced, unless it did not get past MIN_WORKER_LIFETIME (e.g. its machine failed to
+    start), in which case the whole server shuts down.
+    """
+    config = uvicorn.Config(app, host=host, port=port, log_level=log_level)
+    sock = config.bind_socket()
+    children: Dict[int, float] = {}
+    stopping = False
+    failed = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            # uvicorn installs its own handlers once the worker's event loop is running
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            code = 1
+            try:
+                server = uvicorn.Server(config)
+                server.run(sockets=[sock])
+                code = 0 if server.started else 3
+            except BaseException:
+                logger.exception("Worker failed")
+            finally:
+                os._exit(code)
+        children[pid] = time.monotonic()
+        logger.info(f"Started worker {pid}")
+
+    def stop(*_args):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    for _ in range(workers):
+        spawn()
+
+    while children:
+        pid, status = os.wait()
+        started = children.pop(pid, None)
+        if started is None or stopping:
+            continue
+        code = os.waitstatus_to_exitcode(status)
+        if code != 0 and time.monotonic() - started < MIN_WORKER_LIFETIME:
+            logger.error(f"Worker {pid} exited with {code} while starting, shutting down")
+            failed = True
+            stop()
+        else:
+            logger.warning(f"Worker {pid} exited with {code}, starting a new one")
+            spawn()
+
+    sock.close()
+    return 1 if failed else 0
@@ -18,16 +18,20 @@ from eidos_sdk.cpu.agent_io import IOUnit
 from eidos_sdk.cpu.conversation_memory_unit import RawMemoryUnit
 from eidos_sdk.cpu.conversational_agent_cpu import ConversationalAgentCPU
 from eidos_sdk.cpu.llm.open_ai_llm_unit import OpenAIGPT
+from eidos_sdk.cpu.llm.open_ai_scheduler import OpenAIScheduler
 from eidos_sdk.cpu.llm.open_ai_speech import OpenAiSpeech
+from eidos_sdk.cpu.llm.simulated_llm_unit import SimulatedLLMUnit
 from eidos_sdk.cpu.llm_unit import LLMUnit
 from eidos_sdk.cpu.memory_unit import MemoryUnit
 from eidos_sdk.cpu.message_summarizer import MessageSummarizer
 from eidos_sdk.cpu.no_memory_cpu import NoMemoryCPU
 from eidos_sdk.cpu.summarization_memory_unit import SummarizationMemoryUnit
+from eidos_sdk.memory.caching_embedding import CachingEmbedding
 from eidos_sdk.memory.chroma_vector_store import ChromaVectorStore
-from eidos_sdk.memory.embeddings import NoopEmbedding, Embedding, OpenAIEmbedding
+from eidos_sdk.memory.embeddings import NoopEmbedding, Embedding, OpenAIEmbedding, HashingEmbedding
 from eidos_sdk.memory.file_memory import FileMemory
 from eidos_sdk.memory.file_system_vector_store import FileSystemVectorStore
+from eidos_sdk.memory.in_memory_file_memory import InMemoryFileMemory
 from eidos_sdk.memory.local_file_memory import LocalFileMemory
 from eidos_sdk.memory.local_symbolic_memory import LocalSymbolicMemory
 from eidos_sdk.memory.mongo_symbolic_memory import MongoSymbolicMemory
@@ -37,6 +41,8 @@ from eidos_sdk.memory.similarity_memory import SimilarityMemory
 from eidos_sdk.memory.vector_store import VectorStore
 from eidos_sdk.security.security_manager import SecurityManager
 from eidos_sdk.system.agent_machine import AgentMachine
+from eidos_sdk.system.callback_dispatcher import CallbackDispatcher
+from eidos_sdk.system.job_executor import JobExecutor
 from eidos_sdk.system.resources.reference_resource import ReferenceResource
 from eidos_sdk.system.resources.resources_base import Metadata
 from eidos_sdk.util.class_utils import fqn
@@ -88,23 +94,30 @@ def named_builtins():
 
         (LLMUnit, OpenAIGPT),
         OpenAIGPT,
+        SimulatedLLMUnit,
 
         (MemoryUnit, RawMemoryUnit),
         RawMemoryUnit,
         SummarizationMemoryUnit,
 
         # machine components
+        OpenAIScheduler,
+        JobExecutor,
+        CallbackDispatcher,
         (SymbolicMemory, MongoSymbolicMemory),
         MongoSymbolicMemory,
         LocalSymbolicMemory,
 
         (FileMemory, LocalFileMemory),
         LocalFileMemory,
+        InMemoryFileMemory,
 
         SimilarityMemory,
         (Embedding, NoopEmbedding),
         NoopEmbedding,
         OpenAIEmbedding,
+        HashingEmbedding,
+        CachingEmbedding,
         (VectorStore, NoopVectorStore),
         NoopVectorStore,
         FileSystemVectorStore,
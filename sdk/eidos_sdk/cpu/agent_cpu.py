@@ -1,14 +1,21 @@
 from __future__ import annotations
 
+import asyncio
 import json
 from abc import abstractmethod, ABC
-from typing import Any, List, Dict, Literal, Union
+from collections import defaultdict
+from contextlib import nullcontext
+from typing import Any, List, Dict, Literal, Union, AsyncIterator, Tuple, Optional, Type
 
 from pydantic import BaseModel, Field
 
 from eidos_sdk.cpu.agent_io import CPUMessageTypes
 from eidos_sdk.cpu.call_context import CallContext
+from eidos_sdk.cpu.llm_message import ToolCall, ToolResponseMessage
+from eidos_sdk.cpu.logic_unit import LLMToolWrapper
+from eidos_sdk.cpu.streaming import StreamEvent, get_stream_sink
 from eidos_sdk.system.reference_model import Specable
+from eidos_sdk.util.logger import logger
 
 
 class AgentCPUSpec(BaseModel):
@@ -16,6 +23,16 @@ class AgentCPUSpec(BaseModel):
         10,
         description="The maximum number of function calls to make in a single request.",
     )
+    max_concurrent_tool_calls: int = Field(
+        8,
+        gt=0,
+        description="The maximum number of tool calls from a single llm response which are executed concurrently.",
+    )
+    tool_call_timeout: Optional[float] = Field(
+        None,
+        gt=0,
+        description="The number of seconds a tool call may run before it is cancelled, or None to wait indefinitely.",
+    )
 
 
 class AgentCPU(Specable[AgentCPUSpec], ABC):
@@ -37,6 +54,67 @@ class AgentCPU(Specable[AgentCPUSpec], ABC):
     ) -> Any:
         pass
 
+    async def schedule_request_stream(
+        self,
+        call_context: CallContext,
+        prompts: List[CPUMessageTypes],
+        output_format: Union[Literal["str"], Dict[str, Any]],
+    ) -> AsyncIterator[StreamEvent]:
+        """
+        Streams the processing of a request, ending with a result event carrying the response.
+
+        CPUs which do not support streaming yield the response of schedule_request as a single result event.
+        """
+        result = await self.schedule_request(call_context, prompts, output_format)
+        yield StreamEvent(event="result", thread_id=call_context.thread_id, data=result)
+
+    async def _execute_tool_calls(
+        self,
+        call_context: CallContext,
+        tool_calls: List[ToolCall],
+        tool_defs: Dict[str, LLMToolWrapper],
+    ) -> List[ToolResponseMessage]:
+        """
+        Executes the tool calls of an llm response concurrently. Responses are returned in the order of tool_calls.
+
+        Calls to logic units which do not allow parallel tool calls are executed one at a time (per logic unit). If a
+        call fails, the other calls are cancelled and its error is raised.
+        """
+        semaphore = asyncio.Semaphore(self.spec.max_concurrent_tool_calls)
+        serial_locks = defaultdict(asyncio.Lock)
+
+        async def execute(tool_call: ToolCall) -> ToolResponseMessage:
+            tool_def = tool_defs[tool_call.name]
+            logic_unit = tool_def.logic_unit
+            serial_lock = nullcontext() if logic_unit.allow_parallel_tool_calls() else serial_locks[id(logic_unit)]
+            # acquire the serial lock first so that queued serial calls do not hold a concurrency slot while waiting
+            async with serial_lock, semaphore:
+                try:
+                    tool_result = await asyncio.wait_for(
+                        tool_def.execute(call_context=call_context, args=tool_call.arguments),
+                        self.spec.tool_call_timeout,
+                    )
+                except asyncio.TimeoutError:
+                    logger.warning(f"tool call {tool_call.name} timed out after {self.spec.tool_call_timeout}s")
+                    tool_result = dict(error=f"Tool call timed out after {self.spec.tool_call_timeout} seconds")
+            # todo, store tool response result as Any (must be json serializable) so that it can be retrieved symmetrically
+            return ToolResponseMessage(
+                tool_call_id=tool_call.tool_call_id,
+                result=self._to_json(tool_result),
+                name=tool_call.name,
+            )
+
+        tasks = [asyncio.create_task(execute(tool_call)) for tool_call in tool_calls]
+        try:
+            return list(await asyncio.gather(*tasks))
+        except BaseException:
+            # like a TaskGroup, but the first error is raised as is: the other calls are cancelled rather than left
+            # running unobserved
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
     def _to_json(self, obj):
         if obj is None:
             return ""
@@ -80,14 +158,42 @@ class Thread:
         prompts: List[CPUMessageTypes],
         output_format: Union[Literal["str"], Dict[str, Any], type] = "str",
     ) -> Any:
+        sink = get_stream_sink()
+        if sink:
+            # the request is being streamed, so publish incremental events as they are produced
+            result = None
+            async for event in self.stream_request(prompts, output_format):
+                if event.event == "result":
+                    result = event.data
+                else:
+                    sink.put_nowait(event)
+            return result
+
+        schema, model = self._output_format(output_format)
+        rtn = await self._cpu.schedule_request(self._call_context, prompts, schema)
+        return model.model_validate(rtn) if model else rtn
+
+    async def stream_request(
+        self,
+        prompts: List[CPUMessageTypes],
+        output_format: Union[Literal["str"], Dict[str, Any], type] = "str",
+    ) -> AsyncIterator[StreamEvent]:
+        schema, model = self._output_format(output_format)
+        async for event in self._cpu.schedule_request_stream(self._call_context, prompts, schema):
+            if event.event == "result" and model:
+                event = event.model_copy(update=dict(data=model.model_validate(event.data)))
+            yield event
+
+    @staticmethod
+    def _output_format(
+        output_format: Union[Literal["str"], Dict[str, Any], type],
+    ) -> Tuple[Union[Literal["str"], Dict[str, Any]], Optional[Type[BaseModel]]]:
         if isinstance(output_format, type):
             if issubclass(output_format, BaseModel):
-                rtn = await self._cpu.schedule_request(self._call_context, prompts, output_format.model_json_schema())
-                return output_format.model_validate(rtn)
+                return output_format.model_json_schema(), output_format
             else:
                 raise ValueError("type output_format must be a pydantic BaseModel")
-        else:
-            return await self._cpu.schedule_request(self._call_context, prompts, output_format)
+        return output_format, None
 
     async def clone(self) -> Thread:
         return await self._cpu.clone_thread(self._call_context)
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import hashlib
 import uuid
 from abc import abstractmethod, ABC
 from io import IOBase
@@ -69,7 +70,9 @@ class IOUnit(ProcessingUnit):
                 tmp_path = "uploaded_images/" + str(uuid.uuid4())
                 file_memory.mkdir("uploaded_images", True)
                 file_memory.write_file(tmp_path, image_data)
-                user_message_parts.append(UserMessageImageURL(image_url=tmp_path))
+                # hashed once here so that consumers can identify the image without reading it
+                content_hash = hashlib.sha256(image_data).hexdigest()
+                user_message_parts.append(UserMessageImageURL(image_url=tmp_path, content_hash=content_hash))
             else:
                 raise ValueError(f"Unknown prompt type {prompt.type}")
 
@@ -0,0 +1,94 @@
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from eidos_sdk.cpu.call_context import CallContext
+from eidos_sdk.cpu.llm_message import LLMMessage
+from eidos_sdk.util.lru_cache import LRUCache
+
+
+@dataclass
+class CachedConversation:
+    version: int
+    boot_messages: List[LLMMessage] = field(default_factory=list)
+    messages: List[LLMMessage] = field(default_factory=list)
+    tokens: int = 0
+
+    def history(self) -> List[LLMMessage]:
+        return self.boot_messages + self.messages
+
+    def reflects(self, seq: Optional[int]) -> bool:
+        """Whether the message with sequence number seq is already part of the entry."""
+        return seq is not None and seq <= self.version
+
+    def add(self, seq: Optional[int], message: LLMMessage, is_boot_message: bool = False, tokens: int = 0):
+        """Adds a message read from symbolic memory."""
+        (self.boot_messages if is_boot_message else self.messages).append(message)
+        self.version = max(self.version, seq or 0)
+        self.tokens += tokens
+
+
+class ConversationCache:
+    """
+    A bounded, write-through cache of conversation threads.
+
+    Each entry records the version of the thread in symbolic memory it reflects, which is the sequence number of its
+    latest message (see ConversationStore). Readers only use an entry if it is still current, and writers only append
+    to an entry if no one else has written to the thread since, so writes from other workers (or racing writes in this
+    one) cause a (partial) reload rather than a stale or duplicated history.
+    """
+
+    def __init__(self, max_threads: int):
+        self._threads: Optional[LRUCache[Tuple[str, Optional[str]], CachedConversation]] = (
+            LRUCache(max_threads) if max_threads > 0 else None
+        )
+
+    @staticmethod
+    def _key(call_context: CallContext) -> Tuple[str, Optional[str]]:
+        return call_context.process_id, call_context.thread_id
+
+    def get(self, call_context: CallContext) -> Optional[CachedConversation]:
+        return self._threads.get(self._key(call_context)) if self._threads is not None else None
+
+    def get_current(self, call_context: CallContext, version: int) -> Optional[CachedConversation]:
+        """Returns the cached thread if it reflects the given version of the thread, otherwise None."""
+        entry = self.get(call_context)
+        return entry if entry and entry.version == version else None
+
+    def put(self, call_context: CallContext, entry: CachedConversation):
+        if self._threads is not None:
+            self._threads.put(self._key(call_context), entry)
+
+    def append(
+        self,
+        call_context: CallContext,
+        version: Optional[int],
+        messages: List[LLMMessage],
+        is_boot_message: bool = False,
+        tokens: int = 0,
+    ):
+        """
+        Appends messages written after the message with sequence number version, and invalidates the thread if its
+        entry does not reflect exactly that version.
+        """
+        entry = self.get(call_context)
+        if not entry:
+            return
+        if entry.version != version:
+            self.invalidate(call_context)
+            return
+        (entry.boot_messages if is_boot_message else entry.messages).extend(messages)
+        entry.version += len(messages)
+        entry.tokens += tokens
+
+    def fork(self, call_context: CallContext, new_context: CallContext, fork_seq: int):
+        """Starts the cache entry of a forked thread from its parent's entry, if the parent's entry is current."""
+        entry = self.get(call_context)
+        if entry and entry.version == fork_seq:
+            self.put(
+                new_context,
+                CachedConversation(fork_seq, list(entry.boot_messages), list(entry.messages), entry.tokens),
+            )
+
+    def invalidate(self, call_context: CallContext):
+        if self._threads is not None:
+            self._threads.pop(self._key(call_context))
@@ -1,37 +1,33 @@
 import logging
-from typing import List
+from typing import List, Optional, Dict, Any
 
-from eidos_sdk.agent_os import AgentOS
 from eidos_sdk.cpu.call_context import CallContext
+from eidos_sdk.cpu.conversation_cache import CachedConversation
 from eidos_sdk.cpu.llm_message import LLMMessage
 from eidos_sdk.cpu.memory_unit import MemoryUnit, MemoryUnitConfig
 from eidos_sdk.system.reference_model import Specable
 
 
 class RawMemoryUnit(MemoryUnit, Specable[MemoryUnitConfig]):
-    async def writeMessages(self, call_context: CallContext, messages: List[LLMMessage]):
-        conversationItems = [
-            {
-                "process_id": call_context.process_id,
-                "thread_id": call_context.thread_id,
-                "message": message.model_dump(),
-                "is_boot_message": False,
-            }
-            for message in messages
-        ]
+    """
+    Stores every message of a conversation verbatim.
 
-        logging.debug(str(messages))
-        logging.debug(conversationItems)
+    Conversations are cached per thread (see ConversationCache). Reading a cached thread costs one indexed query for
+    the thread's latest sequence number, and messages written by other workers are fetched incrementally. Forks share
+    the messages of their parent thread (see ConversationStore).
+    """
 
-        await AgentOS.symbolic_memory.insert("conversation_memory", conversationItems)
+    async def writeMessages(self, call_context: CallContext, messages: List[LLMMessage]):
+        await self._write(call_context, messages, is_boot_message=False)
 
     async def writeBootMessages(self, call_context: CallContext, messages: List[LLMMessage]):
+        await self._write(call_context, messages, is_boot_message=True)
+
+    async def _write(self, call_context: CallContext, messages: List[LLMMessage], is_boot_message: bool):
         conversationItems = [
             {
-                "process_id": call_context.process_id,
-                "thread_id": call_context.thread_id,
                 "message": message.model_dump(),
-                "is_boot_message": True,
+                "is_boot_message": is_boot_message,
             }
             for message in messages
         ]
@@ -39,30 +35,45 @@ class RawMemoryUnit(MemoryUnit, Specable[MemoryUnitConfig]):
         logging.debug(str(messages))
         logging.debug(conversationItems)
 
-        await AgentOS.symbolic_memory.insert("conversation_memory", conversationItems)
+        last_seq = await self.conversation_store.write(call_context, conversationItems)
+        self.conversation_cache.append(call_context, last_seq, messages, is_boot_message)
 
-    async def getConversationHistory(self, call_context: CallContext) -> List[LLMMessage]:
-        existingMessages = []
-        async for message in AgentOS.symbolic_memory.find(
-            "conversation_memory",
-            {
-                "process_id": call_context.process_id,
-                "thread_id": call_context.thread_id,
-                "is_boot_message": True,
-            },
-            {"is_boot_message": 0},
-        ):
-            existingMessages.append(LLMMessage.from_dict(message["message"]))
-        async for message in AgentOS.symbolic_memory.find(
-            "conversation_memory",
-            {
-                "process_id": call_context.process_id,
-                "thread_id": call_context.thread_id,
-                "is_boot_message": False,
-            },
-            {"is_boot_message": 0},
-        ):
-            existingMessages.append(LLMMessage.from_dict(message["message"]))
+    async def forkThread(self, call_context: CallContext, new_context: CallContext):
+        fork_seq = await self.conversation_store.fork(call_context, new_context)
+        self.conversation_cache.fork(call_context, new_context, fork_seq)
+
+    async def getConversationHistory(
+        self, call_context: CallContext, since_seq: Optional[int] = None, limit: Optional[int] = None
+    ) -> List[LLMMessage]:
+        if since_seq is None and limit is None:
+            conversation = await self._get_conversation(call_context)
+        else:
+            conversation = CachedConversation(version=0)
+            self._add_documents(
+                conversation, await self.conversation_store.find(call_context, since_seq=since_seq, limit=limit)
+            )
+
+        logging.debug("existingMessages = " + str(conversation.history()))
+        return conversation.history()
+
+    async def _get_conversation(self, call_context: CallContext) -> CachedConversation:
+        last_seq = await self.conversation_store.last_seq(call_context)
+        conversation = self.conversation_cache.get(call_context)
+        if conversation and conversation.version == last_seq:
+            return conversation
+        if conversation and conversation.version < last_seq:
+            # only fetch the messages written by other workers
+            docs = await self.conversation_store.find(call_context, since_seq=conversation.version)
+        else:
+            conversation = CachedConversation(version=0)
+            docs = await self.conversation_store.find(call_context)
+        self._add_documents(conversation, docs)
+        self.conversation_cache.put(call_context, conversation)
+        return conversation
 
-        logging.debug("existingMessages = " + str(existingMessages))
-        return existingMessages
+    @staticmethod
+    def _add_documents(conversation: CachedConversation, docs: List[Dict[str, Any]]):
+        for doc in docs:
+            # the message may already have been added by a concurrent read or write
+            if not conversation.reflects(doc.get("seq")):
+                conversation.add(doc.get("seq"), LLMMessage.from_dict(doc["message"]), doc["is_boot_message"])
@@ -0,0 +1,182 @@
+import asyncio
+from typing import List, Optional, Dict, Any, Tuple
+from weakref import WeakValueDictionary
+
+from eidos_sdk.agent_os import AgentOS
+from eidos_sdk.cpu.call_context import CallContext
+from eidos_sdk.util.logger import logger
+from eidos_sdk.util.lru_cache import LRUCache
+
+
+class ConversationStore:
+    """
+    Stores the messages of conversation threads in symbolic memory.
+
+    Each message document is given a sequence number which increases monotonically within its thread, and documents
+    are always read in sequence order through a (process_id, thread_id, seq) index. This allows fetching only the
+    messages written since a known sequence number, or only the latest messages of a thread, with a single query.
+
+    Forked threads are copy-on-write: a fork only records its parent thread and the parent's sequence number at the
+    time of the fork, and reads resolve the chain of ancestors. A fork's own messages continue the sequence after the
+    fork point. Stored messages are never modified, so every branch can share them.
+
+    Sequence numbers are allocated per worker under a per-thread lock. Threads are only ever written by one worker at a
+    time (a process only runs one action at a time), and the unique index rejects writes which violate this.
+
+    Documents written before messages were sequenced are migrated before the index is created (see _migrate).
+    """
+
+    collection = "conversation_memory"
+    threads_collection = "conversation_threads"
+
+    def __init__(self, max_cached_ancestries: int = 10_000):
+        self._locks: WeakValueDictionary = WeakValueDictionary()
+        self._indexed = False
+        self._index_lock = asyncio.Lock()
+        # a thread's ancestry never changes once it has been created
+        self._ancestries: LRUCache[Tuple[str, Optional[str]], List[Tuple[Optional[str], Optional[int]]]] = LRUCache(
+            max_cached_ancestries
+        )
+
+    @staticmethod
+    def thread_query(call_context: CallContext) -> Dict[str, Any]:
+        return {"process_id": call_context.process_id, "thread_id": call_context.thread_id}
+
+    async def _ensure_index(self):
+        if self._indexed:
+            return
+        async with self._index_lock:
+            if not self._indexed:
+                await self._migrate()
+                await AgentOS.symbolic_memory.create_index(
+                    self.collection, {"process_id": 1, "thread_id": 1, "seq": 1}, unique=True
+                )
+                await AgentOS.symbolic_memory.create_index(
+                    self.threads_collection, {"process_id": 1, "thread_id": 1}, unique=True
+                )
+                self._indexed = True
+
+    async def _migrate(self):
+        """
+        Sequences the documents written before messages were sequenced, which would otherwise all share a null seq
+        within their thread (and so break the unique index).
+
+        Each thread's legacy documents are numbered in insertion order (the order of their ObjectIds). Legacy summaries
+        are the documents which other documents were archived under, and since they replaced every message written
+        before them, they are marked as summarizing everything up to their own seq. Migrating is idempotent, so workers
+        starting at the same time may each run it.
+        """
+        threads: Dict[Tuple[str, Optional[str]], List[Dict[str, Any]]] = {}
+        projection = {"_id": 1, "process_id": 1, "thread_id": 1, "archive": 1, "is_boot_message": 1}
+        async for doc in AgentOS.symbolic_memory.find(self.collection, {"seq": {"$exists": False}}, projection):
+            threads.setdefault((doc["process_id"], doc.get("thread_id")), []).append(doc)
+        for (process_id, thread_id), documents in threads.items():
+            logger.info(f"Migrating {len(documents)} conversation messages of process {process_id} ({thread_id})")
+            documents.sort(key=lambda d: str(d["_id"]))
+            summary_ids = {d["archive"] for d in documents if d.get("archive")}
+            for seq, document in enumerate(documents, start=1):
+                fields = dict(seq=seq, is_boot_message=bool(document.get("is_boot_message")), is_summary=False)
+                if str(document["_id"]) in summary_ids:
+                    fields.update(is_summary=True, summarized_through=seq - 1)
+                await AgentOS.symbolic_memory.update_many(
+                    self.collection, {"_id": document["_id"], "seq": {"$exists": False}}, {"$set": fields}
+                )
+
+    async def _segments(self, call_context: CallContext) -> List[Tuple[Optional[str], Optional[int]]]:
+        """
+        Returns the threads whose messages make up the thread's history, starting with the thread itself, along with
+        the greatest sequence number visible from each (None for the thread itself).
+        """
+        key = (call_context.process_id, call_context.thread_id)
+        segments = self._ancestries.get(key)
+        if segments is None:
+            segments = [(call_context.thread_id, None)]
+            fork = await AgentOS.symbolic_memory.find_one(self.threads_collection, self.thread_query(call_context))
+            if fork:
+                parent = CallContext(process_id=call_context.process_id, thread_id=fork["parent_thread_id"])
+                for thread_id, bound in await self._segments(parent):
+                    segments.append((thread_id, fork["fork_seq"] if bound is None else bound))
+            self._ancestries.put(key, segments)
+        return segments
+
+    async def fork(self, call_context: CallContext, new_context: CallContext) -> int:
+        """
+        Starts new_context's thread as a branch of call_context's thread, without copying any messages.
+
+        Returns:
+            The sequence number of call_context's latest message, which is where the branch starts.
+        """
+        await self._ensure_index()
+        fork_seq = await self.last_seq(call_context)
+        await AgentOS.symbolic_memory.insert_one(
+            self.threads_collection,
+            {**self.thread_query(new_context), "parent_thread_id": call_context.thread_id, "fork_seq": fork_seq},
+        )
+        return fork_seq
+
+    async def last_seq(self, call_context: CallContext) -> int:
+        """Returns the sequence number of the latest message in the thread, or 0 if the thread is empty."""
+        await self._ensure_index()
+        doc = await AgentOS.symbolic_memory.find_one(self.collection, self.thread_query(call_context), sort={"seq": -1})
+        if doc:
+            return doc.get("seq") or 0
+        # the thread has no messages of its own, so its latest message is the one it was forked at (if any)
+        segments = await self._segments(call_context)
+        return segments[1][1] if len(segments) > 1 else 0
+
+    async def write(self, call_context: CallContext, documents: List[Dict[str, Any]]) -> int:
+        """
+        Inserts documents at the end of the thread, setting their process_id, thread_id and seq fields.
+
+        Returns:
+            The sequence number of the thread's latest message before the write.
+        """
+        key = (call_context.process_id, call_context.thread_id)
+        lock = self._locks.get(key)
+        if not lock:
+            lock = self._locks[key] = asyncio.Lock()
+        async with lock:
+            last_seq = await self.last_seq(call_context)
+            for i, document in enumerate(documents, start=1):
+                document.update(self.thread_query(call_context), seq=last_seq + i)
+            await AgentOS.symbolic_memory.insert(self.collection, documents)
+        return last_seq
+
+    async def find(
+        self,
+        call_context: CallContext,
+        query: Optional[Dict[str, Any]] = None,
+        since_seq: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Returns the documents of the thread (including those inherited from its ancestors) matching query in sequence
+        order.
+
+        Args:
+            call_context: The thread to read.
+            query: Additional criteria the documents must match.
+            since_seq: Only return documents with a greater sequence number.
+            limit: Only return the latest limit documents.
+        """
+        await self._ensure_index()
+        documents = []
+        # read the newest segment first, so that reads with a limit or since_seq can stop early
+        for thread_id, bound in await self._segments(call_context):
+            if since_seq is not None and bound is not None and bound <= since_seq:
+                break
+            segment_query = {"process_id": call_context.process_id, "thread_id": thread_id, **(query or {})}
+            seq = {}
+            if since_seq is not None:
+                seq["$gt"] = since_seq
+            if bound is not None:
+                seq["$lte"] = bound
+            if seq:
+                segment_query["seq"] = seq
+            remaining = limit - len(documents) if limit else None
+            cursor = AgentOS.symbolic_memory.find(self.collection, segment_query, sort={"seq": -1}, limit=remaining)
+            documents.extend([doc async for doc in cursor])
+            if limit and len(documents) >= limit:
+                break
+        documents.reverse()
+        return documents
@@ -1,15 +1,16 @@
-from typing import List, Type, Dict, Any, Union, Literal
+from typing import List, Type, Dict, Any, Union, Literal, AsyncIterator
 
 from fastapi import HTTPException
 
 from eidos_sdk.cpu.agent_cpu import AgentCPU, AgentCPUSpec, Thread
 from eidos_sdk.cpu.agent_io import IOUnit, CPUMessageTypes
 from eidos_sdk.cpu.call_context import CallContext
-from eidos_sdk.cpu.llm_message import LLMMessage, AssistantMessage, ToolResponseMessage
+from eidos_sdk.cpu.llm_message import LLMMessage
 from eidos_sdk.cpu.llm_unit import LLMUnit
 from eidos_sdk.cpu.logic_unit import LogicUnit, LLMToolWrapper
 from eidos_sdk.cpu.memory_unit import MemoryUnit
 from eidos_sdk.cpu.processing_unit import ProcessingUnitLocator, PU_T
+from eidos_sdk.cpu.streaming import StreamEvent
 from eidos_sdk.system.reference_model import Reference, AnnotatedReference, Specable
 
 
@@ -63,12 +64,38 @@ class ConversationalAgentCPU(AgentCPU, Specable[ConversationalAgentCPUSpec], Pro
         prompts: List[CPUMessageTypes],
         output_format: Union[Literal["str"], Dict[str, Any]],
     ) -> Any:
+        result = None
+        async for event in self._process_request(call_context, prompts, output_format, stream=False):
+            if event.event == "result":
+                result = event.data
+        return result
+
+    async def schedule_request_stream(
+        self,
+        call_context: CallContext,
+        prompts: List[CPUMessageTypes],
+        output_format: Union[Literal["str"], Dict[str, Any]],
+    ) -> AsyncIterator[StreamEvent]:
+        async for event in self._process_request(call_context, prompts, output_format, stream=True):
+            yield event
+
+    async def _process_request(
+        self,
+        call_context: CallContext,
+        prompts: List[CPUMessageTypes],
+        output_format: Union[Literal["str"], Dict[str, Any]],
+        stream: bool,
+    ) -> AsyncIterator[StreamEvent]:
         output_format = output_format or dict(type="str")
         try:
             conversation_messages = await self.io_unit.process_request(prompts)
             conversation = await self.memory_unit.storeAndFetch(call_context, conversation_messages)
-            assistant_message = await self._llm_execution_cycle(call_context, conversation, output_format)
-            return await self.io_unit.process_response(call_context, assistant_message.content)
+            async for event in self._llm_execution_cycle(call_context, conversation, output_format, stream):
+                if event.event == "result":
+                    response = await self.io_unit.process_response(call_context, event.data.content)
+                    yield StreamEvent(event="result", thread_id=call_context.thread_id, data=response)
+                else:
+                    yield event
         except HTTPException:
             raise
         except Exception as e:
@@ -79,32 +106,34 @@ class ConversationalAgentCPU(AgentCPU, Specable[ConversationalAgentCPUSpec], Pro
         call_context: CallContext,
         conversation: List[LLMMessage],
         output_format: Union[Literal["str"], Dict[str, Any]],
-    ) -> AssistantMessage:
+        stream: bool = False,
+    ) -> AsyncIterator[StreamEvent]:
+        """
+        Runs the llm until it responds without tool calls. When stream is set, the llm's incremental events are
+        forwarded as they are produced. The final event is a result event carrying the last AssistantMessage.
+        """
         num_iterations = 0
         while num_iterations < self.spec.max_num_function_calls:
             tool_defs = await LLMToolWrapper.from_logic_units(self.logic_units, conversation=conversation)
-            assistant_message = await self.llm_unit.execute_llm(
-                call_context, conversation, [w.llm_message for w in tool_defs.values()], output_format
-            )
+            tools = [w.llm_message for w in tool_defs.values()]
+            if stream:
+                assistant_message = None
+                async for event in self.llm_unit.execute_llm_stream(call_context, conversation, tools, output_format):
+                    if event.event == "result":
+                        assistant_message = event.data
+                    else:
+                        yield event
+            else:
+                assistant_message = await self.llm_unit.execute_llm(call_context, conversation, tools, output_format)
             await self.memory_unit.storeMessages(call_context, [assistant_message])
             if assistant_message.tool_calls:
-                results = []
-                for tool_call in assistant_message.tool_calls:
-                    tool_def = tool_defs[tool_call.name]
-                    tool_result = await tool_def.execute(call_context=call_context, args=tool_call.arguments)
-                    # todo, store tool response result as Any (must be json serializable) so that it can be retrieved symmetrically
-                    message = ToolResponseMessage(
-                        tool_call_id=tool_call.tool_call_id,
-                        result=self._to_json(tool_result),
-                        name=tool_call.name,
-                    )
-                    await self.memory_unit.storeMessages(call_context, [message])
-                    results.append(message)
-
+                results = await self._execute_tool_calls(call_context, assistant_message.tool_calls, tool_defs)
+                await self.memory_unit.storeMessages(call_context, results)
                 conversation = conversation + [assistant_message] + results
                 num_iterations += 1
             else:
-                return assistant_message
+                yield StreamEvent(event="result", thread_id=call_context.thread_id, data=assistant_message)
+                return
 
         raise ValueError(f"Exceeded maximum number of function calls {self.spec.max_num_function_calls}")
 
@@ -116,8 +145,5 @@ class ConversationalAgentCPU(AgentCPU, Specable[ConversationalAgentCPUSpec], Pro
 
     async def clone_thread(self, call_context: CallContext) -> Thread:
         new_context = call_context.derive_call_context()
-        messages = await self.memory_unit.getConversationHistory(call_context)
-        for m in messages:
-            m["thread_id"] = new_context.thread_id
-        await self.memory_unit.storeMessages(new_context, messages)
+        await self.memory_unit.forkThread(call_context, new_context)
         return Thread(call_context=new_context, cpu=self)
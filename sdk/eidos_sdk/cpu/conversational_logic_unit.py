@@ -1,19 +1,34 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
 import json
-from typing import List, Optional, Any
+import time
+import typing
+import weakref
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from typing import List, Optional, Any, Tuple, Dict
 from urllib.parse import urljoin
 
 import aiohttp
 import jsonref as jsonref
-from pydantic import BaseModel, ValidationError
+from pydantic import BaseModel, ValidationError, Field
 
+from eidos_sdk.agent_os import AgentOS
 from eidos_sdk.cpu.llm_message import LLMMessage, ToolResponseMessage
 from eidos_sdk.cpu.logic_unit import LogicUnit
+from eidos_sdk.cpu.streaming import stream_to
 from eidos_sdk.system.agent_contract import SyncStateResponse
 from eidos_sdk.system.eidos_handler import EidosHandler
 from eidos_sdk.system.reference_model import Specable
 from eidos_sdk.util.logger import logger
+from eidos_sdk.util.lru_cache import LRUCache
 from eidos_sdk.util.schema_to_model import schema_to_model
 
+if typing.TYPE_CHECKING:
+    from eidos_sdk.system.agent_controller import AgentController
+
 
 class ConversationalResponse(SyncStateResponse):
     program: str
@@ -23,80 +38,202 @@ class ConversationalSpec(BaseModel):
     location: str = "http://localhost:8080"
     tool_prefix: str = "convo"
     agents: List[str]
+    in_process: bool = Field(
+        default=True,
+        description="Call agents hosted by the same machine directly rather than over http to location.",
+    )
+    openapi_refresh_interval: float = Field(
+        default=300,
+        ge=0,
+        description="How often the openapi schema of remote agents is fetched again, in seconds. Tools are only "
+        "rebuilt when it changed.",
+    )
+
+
+# bounds the tools of processes and the conversation threads remembered by each logic unit
+_MAX_CACHED_TOOLS = 1000
+_MAX_TRACKED_THREADS = 1000
+
+
+@dataclass
+class _ToolTemplate:
+    """The part of a tool definition which comes from the openapi schema, shared by every process of a program."""
+
+    path: str
+    json_schema: dict
+    description: str
+
+
+@dataclass
+class _ThreadProcesses:
+    """The latest state of the processes in a conversation thread, as of its message at index seen - 1."""
+
+    first: Optional[LLMMessage]
+    last: Optional[LLMMessage] = None
+    seen: int = 0
+    processes: Dict[str, ConversationalResponse] = field(default_factory=dict)
 
 
 class ConversationalLogicUnit(LogicUnit, Specable[ConversationalSpec]):
+    """
+    Offers the programs of other agents, and the actions of the processes started earlier in the conversation, as
+    tools.
+
+    build_tools runs before every llm call, so the tools are built from templates taken from the openapi schema once
+    per schema version, and the state of the processes in a conversation thread is tracked incrementally: threads are
+    recognized by their first message, and only the messages added since the last call are parsed.
+
+    Tool calls may run concurrently, but the actions of any one process are called one at a time so that the process
+    never sees interleaved actions.
+    """
+
     _openapi_json: Optional[dict]
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         Specable.__init__(self, **kwargs)
         self._openapi_json = None
+        self._openapi_source: Optional[dict] = None
+        self._schema_version: Optional[str] = None
+        self._fetched_at: Optional[float] = None
+        self._programs: Dict[str, List[Tuple[str, _ToolTemplate]]] = {}
+        self._templates: Dict[str, Optional[_ToolTemplate]] = {}
+        self._tools: LRUCache[Tuple[str, str, str], EidosHandler] = LRUCache(_MAX_CACHED_TOOLS)
+        self._threads: LRUCache[int, _ThreadProcesses] = LRUCache(_MAX_TRACKED_THREADS)
+        # locks are only kept while a call to their process is running or waiting
+        self._process_locks: weakref.WeakValueDictionary[str, asyncio.Lock] = weakref.WeakValueDictionary()
 
     def set_openapi_json(self, openapi_json):
-        self._openapi_json = jsonref.replace_refs(openapi_json)
+        self._openapi_source = openapi_json
+        version = hashlib.sha256(json.dumps(openapi_json, sort_keys=True, default=str).encode()).hexdigest()
+        if version != self._schema_version:
+            self._schema_version = version
+            self._openapi_json = jsonref.replace_refs(openapi_json)
+            self._programs.clear()
+            self._templates.clear()
+            self._tools.clear()
+
+    def tools_depend_on_conversation(self) -> bool:
+        # the actions available on processes started earlier in the conversation are offered as tools
+        return True
 
     async def build_tools(self, conversation: List[LLMMessage]) -> List[EidosHandler]:
-        if not self._openapi_json:
-            self.set_openapi_json(await _get_openapi_schema(urljoin(self.spec.location, "openapi.json")))
+        await self._refresh_openapi_json()
 
         tools = []
-
         for agent in self.spec.agents:
-            prefix = f"/agents/{agent}/programs/"
-            for path in filter(lambda p: p.startswith(prefix), self._openapi_json["paths"].keys()):
-                try:
-                    action = path.removeprefix(prefix)
-                    name = self._name(agent, action=action)
-                    tools.append(await self._build_tool_def(name, path, agent))
-                except ValueError:
-                    logger.warning(f"unable to build tool {path}", exc_info=True)
-
-        # in case new spec removes ability to talk to agents, existing agents should not be able to continue talking to them
-        allowed_agent_prefix = tuple(self._name(agent) for agent in self.spec.agents)
-        processes = {}
-        for message in conversation:
-            if isinstance(message, ToolResponseMessage) and message.name.startswith(allowed_agent_prefix):
-                try:
-                    last = ConversationalResponse.model_validate(json.loads(message.result))
-                    processes[last.process_id] = last
-                except ValidationError:
-                    logger.warning("unable to parse conversation response", exc_info=True)
+            for action, template in self._program_templates(agent):
+                tools.append(self._tool(template, self._name(agent, action=action), agent))
 
         # newer process state should override older process state if there are multiple calls
+        processes = self._thread_processes(conversation).processes
         for action, response in ((a, r) for r in processes.values() for a in r.available_actions):
-            path = f"/agents/{response.program}/processes/{{process_id}}/actions/{action}"
-            try:
+            template = self._template(f"/agents/{response.program}/processes/{{process_id}}/actions/{action}")
+            if template:
                 name = self._name(response.program, action, response.process_id)
-                tools.append(await self._build_tool_def(name, path, response.program, process_id=response.process_id))
-            except ValueError:
-                logger.warning(f"unable to build tool {path}", exc_info=True)
+                tools.append(self._tool(template, name, response.program, process_id=response.process_id))
 
         return tools
 
-    async def _build_tool_def(self, name, path, agent_program, process_id="") -> EidosHandler:
-        path = path.format(process_id="{process_id}")
-        body = self._openapi_json["paths"][path]["post"].get("requestBody")
+    async def _refresh_openapi_json(self):
+        if not self.spec.agents:
+            # no tools to build, and all() would take the in-process path even without a machine
+            return
+        if all(self._local_controller(agent) for agent in self.spec.agents):
+            # the app caches its schema, so a new object means the schema may have changed
+            openapi_json = AgentOS.machine.app.openapi()
+            if openapi_json is not self._openapi_source:
+                self.set_openapi_json(openapi_json)
+        elif not self._openapi_json or (
+            self._fetched_at is not None and time.monotonic() - self._fetched_at > self.spec.openapi_refresh_interval
+        ):
+            self.set_openapi_json(await _get_openapi_schema(urljoin(self.spec.location, "openapi.json")))
+            self._fetched_at = time.monotonic()
+
+    def _program_templates(self, agent: str) -> List[Tuple[str, _ToolTemplate]]:
+        if agent not in self._programs:
+            prefix = f"/agents/{agent}/programs/"
+            # batch endpoints are for bulk clients rather than conversations
+            paths = (p for p in self._openapi_json["paths"] if p.startswith(prefix) and not p.endswith("/batch"))
+            templates = ((path.removeprefix(prefix), self._template(path)) for path in paths)
+            self._programs[agent] = [(action, template) for action, template in templates if template]
+        return self._programs[agent]
+
+    def _template(self, path: str) -> Optional[_ToolTemplate]:
+        if path not in self._templates:
+            try:
+                self._templates[path] = self._build_template(path)
+            except (KeyError, ValueError):
+                logger.warning(f"unable to build tool {path}", exc_info=True)
+                self._templates[path] = None
+        return self._templates[path]
+
+    def _build_template(self, path: str) -> _ToolTemplate:
+        operation = self._openapi_json["paths"][path]["post"]
+        body = operation.get("requestBody")
         if body and "application/json" not in body["content"]:
             raise ValueError(f"Agent action at {path} does not support application/json")
         json_schema = body["content"]["application/json"]["schema"] if body else dict(type="object", properties={})
-        description = self._openapi_json["paths"][path]["post"].get("description", "")
+        description = operation.get("description", "")
         if not description:
             self.logger.warning(f"Agent action at {path} does not have a description. LLM may not use it properly")
-        return EidosHandler(
-            name=name,
-            description=lambda a, b: description,
-            input_model_fn=lambda a, b: schema_to_model(
-                dict(type="object", properties=dict(body=json_schema)),
-                name + "Input",
-            ),
-            output_model_fn=lambda a, b: Any,
-            fn=self._make_tool_fn(
-                path=path.replace("{process_id}", process_id),
-                agent_program=agent_program,
-            ),
-            extra={},
-        )
+        return _ToolTemplate(path=path, json_schema=json_schema, description=description)
+
+    def _tool(self, template: _ToolTemplate, name: str, agent_program: str, process_id="") -> EidosHandler:
+        key = (name, template.path, process_id)
+        tool = self._tools.get(key)
+        if not tool:
+            input_model = None
+
+            def input_model_fn(_unit, _handler):
+                nonlocal input_model
+                if input_model is None:
+                    body = dict(type="object", properties=dict(body=template.json_schema))
+                    input_model = schema_to_model(body, name + "Input")
+                return input_model
+
+            tool = EidosHandler(
+                name=name,
+                description=lambda a, b: template.description,
+                input_model_fn=input_model_fn,
+                output_model_fn=lambda a, b: Any,
+                fn=self._make_tool_fn(
+                    path=template.path.replace("{process_id}", process_id),
+                    agent_program=agent_program,
+                    process_id=process_id,
+                ),
+                extra={},
+            )
+            self._tools.put(key, tool)
+        return tool
+
+    def _thread_processes(self, conversation: List[LLMMessage]) -> _ThreadProcesses:
+        if not conversation:
+            return _ThreadProcesses(first=None)
+        tracked = self._threads.get(id(conversation[0]))
+        # the messages of a thread are only ever appended, so if the last message seen is still in place only the
+        # messages after it are new. Anything else (another thread, a rewritten history) is parsed from scratch.
+        if (
+            not tracked
+            or tracked.first is not conversation[0]
+            or len(conversation) < tracked.seen
+            or conversation[tracked.seen - 1] is not tracked.last
+        ):
+            tracked = _ThreadProcesses(first=conversation[0])
+            self._threads.put(id(conversation[0]), tracked)
+
+        # in case new spec removes ability to talk to agents, existing agents should not be able to continue talking to them
+        allowed_agent_prefix = tuple(self._name(agent) for agent in self.spec.agents)
+        for message in conversation[tracked.seen :]:
+            if isinstance(message, ToolResponseMessage) and message.name.startswith(allowed_agent_prefix):
+                try:
+                    last = ConversationalResponse.model_validate_json(message.result)
+                    tracked.processes[last.process_id] = last
+                except ValidationError:
+                    logger.warning("unable to parse conversation response", exc_info=True)
+        tracked.seen = len(conversation)
+        tracked.last = conversation[-1]
+        return tracked
 
     # needs to be under 64 characters
     def _name(self, agent_program, action="", process_id=""):
@@ -107,25 +244,65 @@ class ConversationalLogicUnit(LogicUnit, Specable[ConversationalSpec]):
         action = "_" + action if action else ""
         return self.spec.tool_prefix + "_" + agent_program + process_id + action
 
-    def _make_tool_fn(self, path, agent_program):
+    def _local_controller(self, agent_program) -> Optional[AgentController]:
+        if not self.spec.in_process or AgentOS.machine is ... or not AgentOS.machine.app:
+            return None
+        return AgentOS.machine.get_controller(agent_program)
+
+    def _process_lock(self, process_id: str):
+        # program calls start new processes, so they need no lock
+        if not process_id:
+            return nullcontext()
+        lock = self._process_locks.get(process_id)
+        if lock is None:
+            lock = self._process_locks[process_id] = asyncio.Lock()
+        return lock
+
+    def _make_tool_fn(self, path, agent_program, process_id=""):
+        handler_name = path.rsplit("/", 1)[-1]
+
         async def fn(_self, body):
-            url = urljoin(self.spec.location, path)
             if isinstance(body, BaseModel):
                 body = body.model_dump()
-            response = await _agent_request(url, body)
+            async with self._process_lock(process_id):
+                controller = self._local_controller(agent_program)
+                if controller:
+                    # the sub agent's events are not part of this agent's stream, just like over http
+                    with stream_to(None):
+                        response, _ = await controller.call(handler_name, body, process_id or None)
+                    response = dict(response)
+                else:
+                    response = await _agent_request(urljoin(self.spec.location, path), body)
             response["program"] = agent_program
             return ConversationalResponse.model_validate(response).model_dump()
 
         return fn
 
 
+# shared by all the remote agent calls made from an event loop, so that connections are kept alive between calls
+_session: Optional[Tuple[aiohttp.ClientSession, asyncio.AbstractEventLoop]] = None
+
+
+def _get_session() -> aiohttp.ClientSession:
+    global _session
+    loop = asyncio.get_running_loop()
+    if not _session or _session[0].closed or _session[1] is not loop:
+        _session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=100, keepalive_timeout=30)), loop
+    return _session[0]
+
+
+async def close_agent_session():
+    global _session
+    if _session and _session[1] is asyncio.get_running_loop():
+        await _session[0].close()
+    _session = None
+
+
 async def _agent_request(url, args):
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, json=args) as resp:
-            return await resp.json()
+    async with _get_session().post(url, json=args) as resp:
+        return await resp.json()
 
 
 async def _get_openapi_schema(url):
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as resp:
-            return await resp.json()
+    async with _get_session().get(url) as resp:
+        return await resp.json()
@@ -1,6 +1,9 @@
+import asyncio
 import hashlib
 import json
-from typing import List, Any, Dict, Literal, Union
+import time
+from dataclasses import dataclass
+from typing import List, Any, Dict, Literal, Union, Optional, Tuple
 
 from pydantic import Field, BaseModel
 from pydantic import ValidationError
@@ -16,23 +19,126 @@ from eidos_sdk.cpu.llm_message import (
 from eidos_sdk.cpu.llm_unit import LLMUnit, LLMCallFunction
 from eidos_sdk.memory.file_memory import FileMemory
 from eidos_sdk.system.reference_model import Specable, AnnotatedReference
+from eidos_sdk.system.task_claims import claim_task
+from eidos_sdk.util.logger import logger
+from eidos_sdk.util.lru_cache import LRUCache
 
 
 class CacheLLMSpec(BaseModel):
     dir: str = Field(default="llm_cache", description="The directory to store the cache in.")
     llm: AnnotatedReference[LLMUnit]
+    ttl: Optional[float] = Field(
+        default=None, gt=0, description="The number of seconds a response stays cached. Responses never expire if None."
+    )
+    max_memory_entries: int = Field(
+        default=1000, gt=0, description="The maximum number of responses to keep in the in-memory tier."
+    )
+    max_memory_bytes: int = Field(
+        default=64 * 1024 * 1024, gt=0, description="The maximum total size of the responses in the in-memory tier."
+    )
+    max_file_bytes: Optional[int] = Field(
+        default=None,
+        gt=0,
+        description="The maximum total size of the responses in file memory. The least recently used are evicted "
+        "beyond it. Unbounded if None.",
+    )
+    sweep_interval: float = Field(
+        default=300,
+        ge=0,
+        description="The number of seconds between sweeps of file memory for expired and evicted responses.",
+    )
+    collection: str = Field(
+        default="llm_cache_entries",
+        description="The symbolic memory collection indexing the responses in file memory, when they have a ttl or "
+        "max_file_bytes.",
+    )
+
+
+class CanonicalHasher:
+    """
+    Hashes json values incrementally, without serializing them as a whole. Object keys are sorted, so equal values
+    always produce the same hash.
+    """
+
+    def __init__(self):
+        self._sha = hashlib.sha256()
+        self.size = 0
+
+    def _write(self, data: bytes):
+        self._sha.update(data)
+        self.size += len(data)
+
+    def update(self, value: Any):
+        if isinstance(value, dict):
+            self._write(b"{")
+            for key in sorted(value):
+                self.update(key)
+                self._write(b":")
+                self.update(value[key])
+                self._write(b",")
+            self._write(b"}")
+        elif isinstance(value, (list, tuple)):
+            self._write(b"[")
+            for item in value:
+                self.update(item)
+                self._write(b",")
+            self._write(b"]")
+        else:
+            self._write(json.dumps(value, default=str).encode())
+
+    def hexdigest(self) -> str:
+        return self._sha.hexdigest()
+
+
+@dataclass
+class CachedResponse:
+    created: Optional[float]
+    tokens: int
+    size: int
+    message: AssistantMessage
+
+
+@dataclass
+class CacheLLMMetrics:
+    hits: int = 0
+    misses: int = 0
+    saved_tokens: int = 0
 
 
 class CacheLLM(LLMUnit, Specable[CacheLLMSpec]):
+    """
+    Wraps another llm and caches its responses by a hash of the request. Images are hashed by the content hash IOUnit
+    records on upload, so building the key does not read them.
+
+    Lookups check an in-memory LRU tier first and then file memory (off the event loop). Concurrent identical requests
+    which miss both tiers share a single call to the wrapped llm. saved_tokens is estimated from the size of the
+    request and response, since llms do not report their usage through AssistantMessage.
+
+    FileMemory can not list files, so when responses have a ttl or max_file_bytes is set, the size, creation and last
+    use of each file is indexed in symbolic memory. Every sweep_interval, one worker (see claim_task) sweeps the index,
+    deleting expired responses and then the least recently used until the rest fit in max_file_bytes. Responses
+    written by earlier versions are not indexed, so they are only removed once they are read after they expire.
+    """
+
     dir: str
     memory: FileMemory
 
-    def __init__(self, spec: CacheLLMSpec, **kwargs):
-        super().__init__(spec, **kwargs)
+    def __init__(self, **kwargs):
+        LLMUnit.__init__(self, **kwargs)
+        Specable.__init__(self, **kwargs)
+        spec = self.spec
         self.dir = spec.dir
         self.memory = AgentOS.file_memory
         self.memory.mkdir(self.dir, exist_ok=True)
         self.llm = spec.llm.instantiate(processing_unit_locator=self.processing_unit_locator)
+        self.cache: LRUCache[str, CachedResponse] = LRUCache(
+            spec.max_memory_entries, max_weight=spec.max_memory_bytes, weigher=lambda response: response.size
+        )
+        self.image_hashes: LRUCache[str, str] = LRUCache(spec.max_memory_entries)
+        self.metrics = CacheLLMMetrics()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._next_sweep = 0.0
+        self._sweep_task: Optional[asyncio.Task] = None
 
     async def execute_llm(
         self,
@@ -42,34 +148,32 @@ class CacheLLM(LLMUnit, Specable[CacheLLMSpec]):
         output_format: Union[Literal["str"], Dict[str, Any]],
     ) -> AssistantMessage:
         try:
-            combined = [json.dumps(output_format)]
-
-            for message in inMessages:
-                if isinstance(message, UserMessage):
-                    for content in message.content:
-                        if isinstance(content, UserMessageImageURL):
-                            combined.append(str(AgentOS.file_memory.read_file(content.image_url)))
-                        else:
-                            combined.append(content.model_dump_json())
-                else:
-                    combined.append(message.model_dump_json())
+            image_hashes = await self._image_hashes(inMessages)
+            hash_hex, request_size = self._hash_request(inMessages, inTools, output_format, image_hashes)
 
-            for tool in inTools:
-                combined.append(tool.model_dump_json())
-
-            hash_object = hashlib.sha256()
-            hash_object.update("|".join(combined).encode())
-            hash_hex = hash_object.hexdigest()
-
-            file_name = f"{self.dir}/{hash_hex}.json"
+            response = self._get_cached(hash_hex)
+            hit = response is not None
+            if not hit:
+                task = self._inflight.get(hash_hex)
+                if task:
+                    hit = True
+                else:
+                    task = asyncio.create_task(
+                        self._load(hash_hex, request_size, call_context, inMessages, inTools, output_format)
+                    )
+                    self._inflight[hash_hex] = task
+                    task.add_done_callback(lambda _: self._inflight.pop(hash_hex, None))
+                # shielded so that a cancelled request does not cancel the call for the requests sharing it
+                response, loaded = await asyncio.shield(task)
+                hit = hit or loaded
 
-            if self.memory.exists(file_name):
-                contents = self.memory.read_file(file_name)
-                return LLMMessage.from_dict(json.loads(contents.decode()))
+            if hit:
+                self.metrics.hits += 1
+                self.metrics.saved_tokens += response.tokens
             else:
-                result = await self.llm.execute_llm(call_context, inMessages, inTools, output_format)
-                self.memory.write_file(file_name, json.dumps(result.dict()).encode())
-                return result
+                self.metrics.misses += 1
+            logger.debug(f"llm cache {'hit' if hit else 'miss'}: {self.metrics}")
+            return response.message.model_copy(deep=True)
         except ValidationError as ve:
             # Handle Pydantic validation errors
             raise ValueError("Input validation error") from ve
@@ -82,3 +186,138 @@ class CacheLLM(LLMUnit, Specable[CacheLLMSpec]):
         except Exception as e:
             # Handle other exceptions
             raise Exception("Unexpected error occurred") from e
+
+    async def _image_hashes(self, inMessages: List[LLMMessage]) -> Dict[str, str]:
+        hashes = {}
+        for message in inMessages:
+            if isinstance(message, UserMessage):
+                for content in message.content:
+                    if isinstance(content, UserMessageImageURL):
+                        content_hash = content.content_hash or self.image_hashes.get(content.image_url)
+                        if content_hash is None:
+                            # uploaded before IOUnit recorded content hashes
+                            content_hash = await asyncio.to_thread(self._hash_file, content.image_url)
+                            self.image_hashes.put(content.image_url, content_hash)
+                        hashes[content.image_url] = content_hash
+        return hashes
+
+    @staticmethod
+    def _hash_file(file_name: str) -> str:
+        return hashlib.sha256(AgentOS.file_memory.read_file(file_name)).hexdigest()
+
+    @staticmethod
+    def _hash_request(
+        inMessages: List[LLMMessage],
+        inTools: List[LLMCallFunction],
+        output_format: Union[Literal["str"], Dict[str, Any]],
+        image_hashes: Dict[str, str],
+    ) -> Tuple[str, int]:
+        hasher = CanonicalHasher()
+        hasher.update(output_format)
+
+        for message in inMessages:
+            dumped = message.model_dump()
+            if isinstance(message, UserMessage):
+                # images are identified by their contents rather than where they were uploaded to
+                dumped["content"] = [
+                    dict(type=content.type, sha256=image_hashes[content.image_url])
+                    if isinstance(content, UserMessageImageURL)
+                    else content.model_dump()
+                    for content in message.content
+                ]
+            hasher.update(dumped)
+
+        for tool in inTools:
+            hasher.update(tool.model_dump())
+
+        return hasher.hexdigest(), hasher.size
+
+    def _get_cached(self, hash_hex: str) -> Optional[CachedResponse]:
+        response = self.cache.get(hash_hex)
+        if response is not None and self._expired(response):
+            self.cache.pop(hash_hex)
+            return None
+        return response
+
+    def _expired(self, response: CachedResponse) -> bool:
+        return (
+            self.spec.ttl is not None and response.created is not None and time.time() - response.created > self.spec.ttl
+        )
+
+    async def _load(
+        self, hash_hex: str, request_size: int, call_context: CallContext, *args
+    ) -> Tuple[CachedResponse, bool]:
+        """Returns the response from file memory, or from the wrapped llm if it is not there, and whether it was cached."""
+        file_name = f"{self.dir}/{hash_hex}.json"
+        response = await asyncio.to_thread(self._read, file_name)
+        if response is not None:
+            self.cache.put(hash_hex, response)
+            if self._indexed():
+                await AgentOS.symbolic_memory.update_many(
+                    self.spec.collection, {"_id": file_name}, {"$set": {"last_used": time.time()}}
+                )
+            return response, True
+
+        message = await self.llm.execute_llm(call_context, *args)
+        entry = dict(created=time.time(), tokens=0, response=message.model_dump())
+        # a rough estimate, ~4 bytes per token, matching the estimate used for rate limiting
+        entry["tokens"] = (request_size + len(json.dumps(entry["response"]))) // 4
+        contents = json.dumps(entry).encode()
+        response = CachedResponse(entry["created"], entry["tokens"], len(contents), message)
+        await asyncio.to_thread(self.memory.write_file, file_name, contents)
+        self.cache.put(hash_hex, response)
+        if self._indexed():
+            entry = dict(dir=self.dir, size=response.size, created=response.created, last_used=response.created)
+            await AgentOS.symbolic_memory.upsert_one(self.spec.collection, entry, {"_id": file_name})
+            self._schedule_sweep()
+        return response, False
+
+    def _read(self, file_name: str) -> Optional[CachedResponse]:
+        if not self.memory.exists(file_name):
+            return None
+        contents = self.memory.read_file(file_name)
+        entry = json.loads(contents.decode())
+        if "response" not in entry:
+            # written before entries recorded when they were created
+            entry = dict(created=None, tokens=len(contents) // 4, response=entry)
+        response = CachedResponse(
+            entry["created"], entry["tokens"], len(contents), LLMMessage.from_dict(entry["response"])
+        )
+        if self._expired(response):
+            self.memory.delete_file(file_name)
+            return None
+        return response
+
+    def _indexed(self) -> bool:
+        return self.spec.ttl is not None or self.spec.max_file_bytes is not None
+
+    def _schedule_sweep(self):
+        if time.monotonic() < self._next_sweep or (self._sweep_task and not self._sweep_task.done()):
+            return
+        self._next_sweep = time.monotonic() + self.spec.sweep_interval
+        self._sweep_task = asyncio.create_task(self._sweep())
+
+    async def _sweep(self):
+        """Deletes expired responses from file memory, then the least recently used beyond max_file_bytes."""
+        try:
+            if not await claim_task(f"llm_cache_sweep:{self.dir}", self.spec.sweep_interval):
+                return
+            now = time.time()
+            kept_bytes = 0
+            evicted = []
+            query = {"dir": self.dir}
+            async for entry in AgentOS.symbolic_memory.find(self.spec.collection, query, sort={"last_used": -1}):
+                expired = self.spec.ttl is not None and now - entry["created"] > self.spec.ttl
+                kept_bytes += 0 if expired else entry["size"]
+                if expired or (self.spec.max_file_bytes is not None and kept_bytes > self.spec.max_file_bytes):
+                    evicted.append(entry["_id"])
+            for file_name in evicted:
+                try:
+                    await asyncio.to_thread(self.memory.delete_file, file_name)
+                except FileNotFoundError:
+                    pass
+                await AgentOS.symbolic_memory.delete(self.spec.collection, {"_id": file_name})
+            if evicted:
+                logger.info(f"llm cache: evicted {len(evicted)} responses from {self.dir}")
+        except Exception:
+            logger.exception("llm cache sweep failed")
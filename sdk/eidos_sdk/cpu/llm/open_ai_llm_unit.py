@@ -1,16 +1,18 @@
+import asyncio
 import base64
 import json
 from io import BytesIO
-from typing import List, Optional, Union, Literal, Dict, Any
+from typing import List, Optional, Union, Literal, Dict, Any, AsyncIterator
 
 from PIL import Image
-from openai import AsyncOpenAI
 from openai.types.chat import ChatCompletionToolParam, ChatCompletionMessageToolCall
+from openai.types.chat.chat_completion_message_tool_call import Function
 from openai.types.chat.completion_create_params import ResponseFormat
 from pydantic import Field, BaseModel
 
 from eidos_sdk.agent_os import AgentOS
 from eidos_sdk.cpu.call_context import CallContext
+from eidos_sdk.cpu.llm.open_ai_scheduler import get_scheduler
 from eidos_sdk.cpu.llm_message import (
     LLMMessage,
     AssistantMessage,
@@ -18,10 +20,16 @@ from eidos_sdk.cpu.llm_message import (
     ToolResponseMessage,
     UserMessage,
     SystemMessage,
+    UserMessageImageURL,
 )
 from eidos_sdk.cpu.llm_unit import LLMUnit, LLMCallFunction
+from eidos_sdk.cpu.streaming import StreamEvent
 from eidos_sdk.system.reference_model import Specable
 from eidos_sdk.util.logger import logger
+from eidos_sdk.util.lru_cache import LRUCache
+
+# the most a scaled image (at most 2048x768, see scale_dimensions) costs: 85 tokens plus 170 per 512px tile
+IMAGE_TOKEN_ESTIMATE = 85 + 170 * 4 * 2
 
 
 def scale_dimensions(width, height, max_size=2048, min_size=768):
@@ -48,7 +56,7 @@ def scale_dimensions(width, height, max_size=2048, min_size=768):
     return width, height
 
 
-def scale_image(image_bytes):
+def scale_image(image_bytes, max_size=2048, min_size=768):
     # Load the image from bytes
     image = Image.open(BytesIO(image_bytes))
 
@@ -56,7 +64,7 @@ def scale_image(image_bytes):
     width, height = image.size
 
     logger.info(f"Original image size: {width}x{height}")
-    new_width, new_height = scale_dimensions(width, height)
+    new_width, new_height = scale_dimensions(width, height, max_size, min_size)
     logger.info(f"New image size: {new_width}x{new_height}")
 
     # Resize and return the image
@@ -66,7 +74,54 @@ def scale_image(image_bytes):
     return output.getvalue()
 
 
-def convert_to_openai(message: LLMMessage):
+class ScaledImageCache:
+    """
+    Caches images scaled for the llm, base64 encoded, by the original image and target size.
+
+    Scaled images are stored in file memory next to the original and the most recently used are kept in memory, so an
+    image is decoded and scaled once rather than on every turn of the conversations it is part of. Scaling and file
+    access run in a worker thread, off the event loop.
+    """
+
+    def __init__(self, max_memory_bytes: int = 64 * 1024 * 1024, max_size: int = 2048, min_size: int = 768):
+        self.max_size = max_size
+        self.min_size = min_size
+        self.cache: LRUCache[str, str] = LRUCache(10_000, max_weight=max_memory_bytes, weigher=len)
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    async def get(self, image: UserMessageImageURL) -> str:
+        """Returns the scaled image as a base64 encoded PNG."""
+        key = f"{image.content_hash or image.image_url}:{self.max_size}x{self.min_size}"
+        encoded = self.cache.get(key)
+        if encoded is None:
+            task = self._inflight.get(key)
+            if not task:
+                task = asyncio.create_task(asyncio.to_thread(self._load, image.image_url))
+                self._inflight[key] = task
+                task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            encoded = await asyncio.shield(task)
+            self.cache.put(key, encoded)
+        return encoded
+
+    def _load(self, image_url: str) -> str:
+        file_memory = AgentOS.file_memory
+        scaled_path = f"{image_url}.{self.max_size}x{self.min_size}.b64"
+        if file_memory.exists(scaled_path):
+            return file_memory.read_file(scaled_path).decode()
+        data = scale_image(file_memory.read_file(image_url), self.max_size, self.min_size)
+        encoded = base64.b64encode(data).decode("utf-8")
+        file_memory.write_file(scaled_path, encoded.encode())
+        return encoded
+
+
+scaled_images = ScaledImageCache()
+
+
+def convert_to_openai(message: LLMMessage, encoded_images: Optional[Dict[str, str]] = None):
+    """
+    Converts a message to the OpenAI format. encoded_images maps image urls to their scaled, base64 encoded images
+    (see ScaledImageCache), images which are not included are scaled in place.
+    """
     if isinstance(message, SystemMessage):
         return {"role": "system", "content": message.content}
     elif isinstance(message, UserMessage):
@@ -77,12 +132,14 @@ def convert_to_openai(message: LLMMessage):
                 if part.type == "text":
                     content.append({"type": "text", "text": part.text})
                 else:
-                    # retrieve the image from the file system
-                    data = AgentOS.file_memory.read_file(part.image_url)
-                    # scale the image such that the max size of the shortest size is at most 768px
-                    data = scale_image(data)
-                    # base64 encode the data
-                    base64_image = base64.b64encode(data).decode("utf-8")
+                    base64_image = (encoded_images or {}).get(part.image_url)
+                    if base64_image is None:
+                        # retrieve the image from the file system
+                        data = AgentOS.file_memory.read_file(part.image_url)
+                        # scale the image such that the max size of the shortest size is at most 768px
+                        data = scale_image(data)
+                        # base64 encode the data
+                        base64_image = base64.b64encode(data).decode("utf-8")
                     content.append(
                         {
                             "type": "image_url",
@@ -127,7 +184,6 @@ class OpenAiGPTSpec(BaseModel):
 class OpenAIGPT(LLMUnit, Specable[OpenAiGPTSpec]):
     model: str
     temperature: float
-    llm: AsyncOpenAI = None
 
     def __init__(self, **kwargs):
         LLMUnit.__init__(self, **kwargs)
@@ -143,9 +199,86 @@ class OpenAIGPT(LLMUnit, Specable[OpenAiGPTSpec]):
         inTools: List[LLMCallFunction],
         output_format: Union[Literal["str"], Dict[str, Any]],
     ) -> AssistantMessage:
-        if not self.llm:
-            self.llm = AsyncOpenAI()
-        messages = [convert_to_openai(message) for message in inMessages]
+        request = await self._build_request(inMessages, inTools, output_format)
+        logger.info("executing open ai llm request", extra=request)
+        try:
+            llm_response = await get_scheduler().execute(
+                lambda client: client.chat.completions.with_raw_response.create(**request),
+                estimated_tokens=self._estimate_tokens(request),
+            )
+        except Exception:
+            logger.exception("error calling open ai llm")
+            raise
+        message = llm_response.choices[0].message
+        return self._to_assistant_message(message.content, message.tool_calls, output_format)
+
+    async def execute_llm_stream(
+        self,
+        call_context: CallContext,
+        inMessages: List[LLMMessage],
+        inTools: List[LLMCallFunction],
+        output_format: Union[Literal["str"], Dict[str, Any]],
+    ) -> AsyncIterator[StreamEvent]:
+        request = await self._build_request(inMessages, inTools, output_format)
+        logger.info("executing streaming open ai llm request", extra=request)
+        thread_id = call_context.thread_id
+        content = []
+        # tool calls arrive as fragments keyed by their index, the id and name come first followed by the arguments
+        tool_calls: Dict[int, Dict[str, Any]] = {}
+        try:
+            # the request counts against the scheduler's concurrency limit until the stream is consumed
+            async with get_scheduler().stream(
+                lambda client: client.chat.completions.with_raw_response.create(**request, stream=True),
+                estimated_tokens=self._estimate_tokens(request),
+            ) as stream:
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta
+                    if delta.content:
+                        content.append(delta.content)
+                        yield StreamEvent(event="delta", thread_id=thread_id, data=delta.content)
+                    for fragment in delta.tool_calls or []:
+                        tool_call = tool_calls.setdefault(fragment.index, dict(id="", name="", arguments=""))
+                        if fragment.id:
+                            tool_call["id"] = fragment.id
+                        if fragment.function and fragment.function.name:
+                            tool_call["name"] += fragment.function.name
+                        if fragment.function and fragment.function.arguments:
+                            tool_call["arguments"] += fragment.function.arguments
+        except Exception:
+            logger.exception("error calling open ai llm")
+            raise
+
+        assembled = [
+            ChatCompletionMessageToolCall(
+                id=tool_call["id"],
+                type="function",
+                function=Function(name=tool_call["name"], arguments=tool_call["arguments"]),
+            )
+            for _, tool_call in sorted(tool_calls.items())
+        ]
+        message = self._to_assistant_message("".join(content) or None, assembled, output_format)
+        for tool_call in message.tool_calls:
+            yield StreamEvent(event="tool_call", thread_id=thread_id, data=tool_call)
+        yield StreamEvent(event="result", thread_id=thread_id, data=message)
+
+    async def _build_request(
+        self,
+        inMessages: List[LLMMessage],
+        inTools: List[LLMCallFunction],
+        output_format: Union[Literal["str"], Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        images = [
+            part
+            for message in inMessages
+            if isinstance(message, UserMessage)
+            for part in message.content
+            if isinstance(part, UserMessageImageURL)
+        ]
+        encoded_images = await asyncio.gather(*[scaled_images.get(image) for image in images])
+        encoded_images = {image.image_url: encoded for image, encoded in zip(images, encoded_images)}
+        messages = [convert_to_openai(message, encoded_images) for message in inMessages]
 
         if not isinstance(output_format, str):
             force_json_msg = (
@@ -190,25 +323,36 @@ class OpenAIGPT(LLMUnit, Specable[OpenAiGPTSpec]):
         if self.spec.max_tokens:
             request["max_tokens"] = self.spec.max_tokens
 
-        logger.info("executing open ai llm request", extra=request)
-        try:
-            llm_response = await self.llm.chat.completions.create(**request)
-        except Exception:
-            logger.exception("error calling open ai llm")
-            raise
-        message = llm_response.choices[0].message
+        return request
 
+    def _estimate_tokens(self, request: Dict[str, Any]) -> int:
+        # roughly 4 characters per token, except for images which are billed by size rather than by their encoding
+        characters, images = 0, 0
+        for message in request["messages"]:
+            content = message.get("content")
+            if isinstance(content, list):
+                images += sum(1 for part in content if part.get("type") == "image_url")
+                content = [part for part in content if part.get("type") != "image_url"]
+            characters += len(json.dumps({**message, "content": content}))
+        return characters // 4 + images * IMAGE_TOKEN_ESTIMATE + (self.spec.max_tokens or 0)
+
+    def _to_assistant_message(
+        self,
+        message_content: Optional[str],
+        tool_calls: Optional[List[ChatCompletionMessageToolCall]],
+        output_format: Union[Literal["str"], Dict[str, Any]],
+    ) -> AssistantMessage:
         logger.info(
-            f"open ai llm response\ntool calls: {len(message.tool_calls or [])}\ncontent:\n{message.content}",
-            extra=dict(content=message.content, tool_calls=message.tool_calls),
+            f"open ai llm response\ntool calls: {len(tool_calls or [])}\ncontent:\n{message_content}",
+            extra=dict(content=message_content, tool_calls=tool_calls),
         )
 
-        tool_response = [_convert_tool_call(tool) for tool in message.tool_calls or []]
+        tool_response = [_convert_tool_call(tool) for tool in tool_calls or []]
         if not self.spec.force_json and output_format != "str":
             # message format looks like json```{...}```, parse content and pull out the json
-            message_text = message.content[message.content.find("{") : message.content.rfind("}") + 1]
+            message_text = message_content[message_content.find("{") : message_content.rfind("}") + 1]
         else:
-            message_text = message.content
+            message_text = message_content
 
         try:
             if output_format == "str":
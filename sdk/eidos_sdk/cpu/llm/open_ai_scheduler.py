@@ -0,0 +1,259 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import heapq
+import itertools
+import random
+import time
+import weakref
+from typing import AsyncIterator, Awaitable, Callable, Optional, TypeVar, Mapping
+
+import httpx
+import openai
+from openai import AsyncOpenAI
+from pydantic import BaseModel, Field
+
+from eidos_sdk.agent_os import AgentOS
+from eidos_sdk.system.reference_model import Specable
+from eidos_sdk.util.logger import logger
+
+T = TypeVar("T")
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+_RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,  # includes APITimeoutError
+    openai.InternalServerError,
+)
+
+
+class TokenBucket:
+    """
+    A token bucket which refills continuously at capacity tokens per minute.
+    """
+
+    def __init__(self, capacity_per_minute: int):
+        self.capacity = capacity_per_minute
+        self.tokens = float(capacity_per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+    def wait_time(self, amount: int) -> float:
+        """The number of seconds until amount tokens are available."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0 if self.tokens >= amount else (amount - self.tokens) * 60 / self.capacity
+
+    def consume(self, amount: int):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def update(self, limit: Optional[int], remaining: Optional[int]):
+        """Adjusts the bucket to match the limits reported by the server."""
+        self._refill()
+        if limit:
+            self.capacity = limit
+        if remaining is not None:
+            self.tokens = min(self.tokens, remaining)
+
+    def drain(self):
+        self._refill()
+        self.tokens = min(self.tokens, 0)
+
+
+class OpenAISchedulerSpec(BaseModel):
+    requests_per_minute: int = Field(default=500, gt=0, description="The initial request per minute budget.")
+    tokens_per_minute: int = Field(default=150_000, gt=0, description="The initial token per minute budget.")
+    max_concurrent_requests: int = Field(default=64, gt=0, description="The maximum number of in flight requests.")
+    max_retries: int = Field(default=6, ge=0, description="The maximum number of retries for retryable errors.")
+    initial_backoff: float = Field(default=0.5, gt=0, description="The initial retry backoff, in seconds.")
+    max_backoff: float = Field(default=30, gt=0, description="The maximum retry backoff, in seconds.")
+    max_connections: int = Field(default=100, gt=0, description="The size of the shared http connection pool.")
+    timeout: float = Field(default=600, gt=0, description="The request timeout, in seconds.")
+
+
+class OpenAIScheduler(Specable[OpenAISchedulerSpec]):
+    """
+    Schedules every OpenAI request made by the machine.
+
+    All requests share one pooled client and pass through request and token per minute buckets, which are adjusted
+    from the x-ratelimit-* response headers. Waiting requests are served in priority order (lower first), and
+    retryable errors (rate limits, connection errors and server errors) are retried with jittered exponential backoff.
+
+    The client is created by client_factory when the first request is made (by default, a pooled AsyncOpenAI client
+    configured from the spec).
+    """
+
+    def __init__(self, spec: OpenAISchedulerSpec = None, client_factory: Callable[[], AsyncOpenAI] = None):
+        super().__init__(spec or OpenAISchedulerSpec())
+        self.client_factory = client_factory or self._create_client
+        self.requests = TokenBucket(self.spec.requests_per_minute)
+        self.tokens = TokenBucket(self.spec.tokens_per_minute)
+        self._client: Optional[AsyncOpenAI] = None
+        self._waiting = []
+        self._counter = itertools.count()
+        self._condition: Optional[asyncio.Condition] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        if not self._client:
+            self._client = self.client_factory()
+        return self._client
+
+    def _create_client(self) -> AsyncOpenAI:
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=self.spec.max_connections,
+                max_keepalive_connections=self.spec.max_connections,
+            ),
+            timeout=self.spec.timeout,
+        )
+        # retries are handled by the scheduler so they are visible to the rate limits
+        return AsyncOpenAI(http_client=http_client, max_retries=0)
+
+    def start(self):
+        pass
+
+    async def stop(self):
+        if self._client:
+            await self._client.close()
+            self._client = None
+
+    async def execute(
+        self,
+        request: Callable[[AsyncOpenAI], Awaitable[T]],
+        estimated_tokens: int = 0,
+        priority: int = PRIORITY_INTERACTIVE,
+    ) -> T:
+        """
+        Executes an OpenAI request once the rate limits allow it.
+
+        Args:
+            request: Called with the shared client to make the request. It should use the client's with_raw_response
+                variant so that the rate limit headers can be read. The parsed response is returned.
+            estimated_tokens: The estimated number of tokens the request will use.
+            priority: Lower priorities are scheduled first.
+
+        Returns:
+            The parsed response.
+        """
+        async with self._request(request, estimated_tokens, priority) as response:
+            return response
+
+    @contextlib.asynccontextmanager
+    async def stream(
+        self,
+        request: Callable[[AsyncOpenAI], Awaitable[T]],
+        estimated_tokens: int = 0,
+        priority: int = PRIORITY_INTERACTIVE,
+    ) -> AsyncIterator[T]:
+        """
+        Executes a streaming OpenAI request like execute, yielding the parsed stream. The request counts against
+        max_concurrent_requests until the block exits, and the stream is closed then.
+        """
+        async with self._request(request, estimated_tokens, priority) as stream:
+            try:
+                yield stream
+            finally:
+                await stream.close()
+
+    @contextlib.asynccontextmanager
+    async def _request(
+        self, request: Callable[[AsyncOpenAI], Awaitable[T]], estimated_tokens: int, priority: int
+    ) -> AsyncIterator[T]:
+        attempt = 0
+        while True:
+            await self._acquire(estimated_tokens, priority)
+            async with self._get_semaphore():
+                try:
+                    response = await request(self.client)
+                except _RETRYABLE_ERRORS as e:
+                    headers = e.response.headers if isinstance(e, openai.APIStatusError) else {}
+                    if isinstance(e, openai.RateLimitError):
+                        self._update_limits(headers)
+                        self.requests.drain()
+                    if attempt >= self.spec.max_retries:
+                        raise
+                    delay = self._backoff(attempt, headers)
+                    logger.warning(f"OpenAI request failed ({e.__class__.__name__}), retrying in {delay:.2f}s")
+                else:
+                    if hasattr(response, "headers") and hasattr(response, "parse"):
+                        self._update_limits(response.headers)
+                        response = response.parse()
+                    # the permit is held while the caller uses the response
+                    yield response
+                    return
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if not self._semaphore:
+            self._semaphore = asyncio.Semaphore(self.spec.max_concurrent_requests)
+        return self._semaphore
+
+    async def _acquire(self, tokens: int, priority: int):
+        if not self._condition:
+            self._condition = asyncio.Condition()
+        entry = (priority, next(self._counter))
+        heapq.heappush(self._waiting, entry)
+        async with self._condition:
+            try:
+                while True:
+                    timeout = None
+                    if self._waiting[0] == entry:
+                        timeout = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+                        if timeout <= 0:
+                            heapq.heappop(self._waiting)
+                            self.requests.consume(1)
+                            self.tokens.consume(tokens)
+                            return
+                    try:
+                        await asyncio.wait_for(self._condition.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                if entry in self._waiting:
+                    self._waiting.remove(entry)
+                    heapq.heapify(self._waiting)
+                self._condition.notify_all()
+
+    def _update_limits(self, headers: Mapping[str, str]):
+        def header(name) -> Optional[int]:
+            try:
+                return int(headers[name])
+            except (KeyError, ValueError):
+                return None
+
+        self.requests.update(header("x-ratelimit-limit-requests"), header("x-ratelimit-remaining-requests"))
+        self.tokens.update(header("x-ratelimit-limit-tokens"), header("x-ratelimit-remaining-tokens"))
+
+    def _backoff(self, attempt: int, headers: Mapping[str, str]) -> float:
+        try:
+            return min(float(headers["retry-after"]), self.spec.max_backoff)
+        except (KeyError, ValueError):
+            delay = min(self.spec.initial_backoff * 2**attempt, self.spec.max_backoff)
+            return delay * random.uniform(0.5, 1.5)
+
+
+# the schedulers' asyncio primitives and clients are bound to the loop they are first used on
+_default_schedulers: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, OpenAIScheduler] = weakref.WeakKeyDictionary()
+
+
+def get_scheduler() -> OpenAIScheduler:
+    """
+    Returns the machine's OpenAI scheduler, or a default for the running event loop when running outside a machine.
+    """
+    if AgentOS.openai_scheduler is not ...:
+        return AgentOS.openai_scheduler
+    loop = asyncio.get_running_loop()
+    if loop not in _default_schedulers:
+        _default_schedulers[loop] = OpenAIScheduler()
+    return _default_schedulers[loop]
@@ -1,8 +1,8 @@
 from typing import Optional, Literal
 
-from openai import AsyncOpenAI
 from pydantic import Field, BaseModel
 
+from eidos_sdk.cpu.llm.open_ai_scheduler import get_scheduler
 from eidos_sdk.system.reference_model import Specable
 
 
@@ -25,7 +25,6 @@ class OpenAiSpeechSpec(BaseModel):
 class OpenAiSpeech(Specable[OpenAiSpeechSpec]):
     model: str
     temperature: float
-    llm: AsyncOpenAI = None
 
     def __init__(self, spec: OpenAiSpeechSpec, **kwargs):
         super().__init__(spec, **kwargs)
@@ -40,13 +39,13 @@ class OpenAiSpeech(Specable[OpenAiSpeechSpec]):
         Returns:
             bytes: The audio data.
         """
-        if not self.llm:
-            self.llm = AsyncOpenAI()
-
-        response = await self.llm.audio.speech.create(
-            model=self.spec.text_to_speech_model,
-            voice=self.spec.text_to_speech_voice,
-            input=text,
+        response = await get_scheduler().execute(
+            lambda client: client.audio.speech.with_raw_response.create(
+                model=self.spec.text_to_speech_model,
+                voice=self.spec.text_to_speech_voice,
+                input=text,
+            ),
+            estimated_tokens=len(text) // 4,
         )
 
         return response.content
@@ -62,9 +61,6 @@ class OpenAiSpeech(Specable[OpenAiSpeechSpec]):
         Returns:
             str: The text.
         """
-        if not self.llm:
-            self.llm = AsyncOpenAI()
-
         request = {
             "file": audio,
             "model": self.spec.speech_to_text_model,
@@ -77,6 +73,8 @@ class OpenAiSpeech(Specable[OpenAiSpeechSpec]):
         if prompt:
             request["prompt"] = prompt
 
-        response = await self.llm.audio.transcriptions.create(**request)
+        response = await get_scheduler().execute(
+            lambda client: client.audio.transcriptions.with_raw_response.create(**request)
+        )
 
         return response.text
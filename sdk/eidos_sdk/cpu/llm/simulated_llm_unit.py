@@ -0,0 +1,226 @@
+import asyncio
+import itertools
+import json
+import math
+import random
+import re
+from typing import List, Any, Dict, Literal, Union, Optional, AsyncIterator
+
+import yaml
+from pydantic import BaseModel, Field
+
+from eidos_sdk.cpu.call_context import CallContext
+from eidos_sdk.cpu.llm_message import (
+    LLMMessage,
+    AssistantMessage,
+    ToolCall,
+    UserMessage,
+    UserMessageText,
+    ToolResponseMessage,
+)
+from eidos_sdk.cpu.llm_unit import LLMUnit, LLMCallFunction
+from eidos_sdk.cpu.streaming import StreamEvent
+from eidos_sdk.system.reference_model import Specable
+
+_WORDS = "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut labore".split()
+
+
+class SimulatedToolCall(BaseModel):
+    name: str = Field(description="The name of the tool to call.")
+    arguments: Optional[Dict[str, Any]] = Field(
+        default=None, description="The arguments to call the tool with. Generated from the tool's schema if None."
+    )
+
+
+class SimulatedResponse(BaseModel):
+    match: Optional[str] = Field(
+        default=None,
+        description="A regular expression searched for in the text of the latest message. Matches any text if None.",
+    )
+    message_type: Optional[Literal["system", "user", "assistant", "tool"]] = Field(
+        default=None, description="The type the latest message must have. Matches any type if None."
+    )
+    content: Any = Field(
+        default=None, description="The content of the response. Generated from the output format if None."
+    )
+    tool_calls: List[SimulatedToolCall] = Field(default=[], description="The tools the response calls.")
+
+
+class SimulatedLLMUnitSpec(BaseModel):
+    model: str = Field(default="simulated", description="The model name reported to other components.")
+    responses: List[SimulatedResponse] = Field(
+        default=[],
+        description="Scripted responses. The first one which matches the latest message is used, otherwise a "
+        "response is generated from the output format.",
+    )
+    fixture_file: Optional[str] = Field(
+        default=None, description="A yaml (or json) file with a list of additional scripted responses."
+    )
+    latency_distribution: Literal["constant", "uniform", "exponential", "lognormal"] = "constant"
+    mean_latency: float = Field(default=0, ge=0, description="The mean time to the first token, in seconds.")
+    latency_sigma: float = Field(default=1, gt=0, description="The sigma of the lognormal latency distribution.")
+    time_per_token: float = Field(default=0, ge=0, description="The time to generate each token, in seconds.")
+    completion_tokens: int = Field(default=16, ge=1, description="The number of words in generated strings.")
+    seed: Optional[int] = Field(default=None, description="Seeds latencies and generated content.")
+
+
+class SimulatedLLMUnit(LLMUnit, Specable[SimulatedLLMUnitSpec]):
+    """
+    An llm which answers from scripted responses, or with content generated from the requested output schema, after a
+    simulated delay. It makes no external calls, so it can be used to measure the overhead of the framework itself.
+
+    Latencies are sampled from latency_distribution (with mean mean_latency) before the first token, and each token
+    then takes time_per_token. A token is a word of string content, or the whole serialized content otherwise.
+    """
+
+    def __init__(self, **kwargs):
+        LLMUnit.__init__(self, **kwargs)
+        Specable.__init__(self, **kwargs)
+        self.responses = list(self.spec.responses)
+        if self.spec.fixture_file:
+            with open(self.spec.fixture_file) as f:
+                self.responses.extend(SimulatedResponse.model_validate(r) for r in yaml.safe_load(f) or [])
+        self.random = random.Random(self.spec.seed)
+        self._tool_call_ids = itertools.count()
+
+    async def execute_llm(
+        self,
+        call_context: CallContext,
+        inMessages: List[LLMMessage],
+        inTools: List[LLMCallFunction],
+        output_format: Union[Literal["str"], Dict[str, Any]],
+    ) -> AssistantMessage:
+        message = self._respond(inMessages, inTools, output_format)
+        await asyncio.sleep(self.sample_latency() + self.spec.time_per_token * len(self._tokens(message.content)))
+        return message
+
+    async def execute_llm_stream(
+        self,
+        call_context: CallContext,
+        inMessages: List[LLMMessage],
+        inTools: List[LLMCallFunction],
+        output_format: Union[Literal["str"], Dict[str, Any]],
+    ) -> AsyncIterator[StreamEvent]:
+        message = self._respond(inMessages, inTools, output_format)
+        thread_id = call_context.thread_id
+        await asyncio.sleep(self.sample_latency())
+        for token in self._tokens(message.content):
+            await asyncio.sleep(self.spec.time_per_token)
+            yield StreamEvent(event="delta", thread_id=thread_id, data=token)
+        for tool_call in message.tool_calls:
+            yield StreamEvent(event="tool_call", thread_id=thread_id, data=tool_call)
+        yield StreamEvent(event="result", thread_id=thread_id, data=message)
+
+    def sample_latency(self) -> float:
+        mean = self.spec.mean_latency
+        if mean == 0 or self.spec.latency_distribution == "constant":
+            return mean
+        elif self.spec.latency_distribution == "uniform":
+            return self.random.uniform(0, 2 * mean)
+        elif self.spec.latency_distribution == "exponential":
+            return self.random.expovariate(1 / mean)
+        else:
+            sigma = self.spec.latency_sigma
+            return self.random.lognormvariate(math.log(mean) - sigma**2 / 2, sigma)
+
+    @staticmethod
+    def _tokens(content: Any) -> List[str]:
+        if not content:
+            return []
+        if not isinstance(content, str):
+            return [json.dumps(content)]
+        words = content.split(" ")
+        return [word if i == 0 else " " + word for i, word in enumerate(words)]
+
+    def _respond(
+        self,
+        inMessages: List[LLMMessage],
+        inTools: List[LLMCallFunction],
+        output_format: Union[Literal["str"], Dict[str, Any]],
+    ) -> AssistantMessage:
+        response = self._match(inMessages[-1] if inMessages else None) or SimulatedResponse()
+        content = response.content
+        if content is None:
+            content = self.generate(output_format) if isinstance(output_format, dict) else self._sentence()
+        elif output_format == "str" and not isinstance(content, str):
+            content = json.dumps(content)
+
+        tools = {tool.name: tool for tool in inTools}
+        tool_calls = []
+        for tool_call in response.tool_calls:
+            if tool_call.name not in tools:
+                raise ValueError(f"Simulated response calls unknown tool {tool_call.name}")
+            arguments = tool_call.arguments
+            if arguments is None:
+                arguments = self.generate(tools[tool_call.name].parameters)
+            tool_calls.append(
+                ToolCall(tool_call_id=f"call_{next(self._tool_call_ids)}", name=tool_call.name, arguments=arguments)
+            )
+        return AssistantMessage(content=content, tool_calls=tool_calls)
+
+    def _match(self, message: Optional[LLMMessage]) -> Optional[SimulatedResponse]:
+        text = _message_text(message) if message else ""
+        for response in self.responses:
+            if response.message_type and (not message or message.type != response.message_type):
+                continue
+            if response.match is None or re.search(response.match, text):
+                return response
+        return None
+
+    def _sentence(self) -> str:
+        return " ".join(self.random.choice(_WORDS) for _ in range(self.spec.completion_tokens))
+
+    def generate(self, schema: Dict[str, Any], root: Optional[Dict[str, Any]] = None) -> Any:
+        """Generates a value which conforms to the json schema."""
+        root = root or schema
+        if "$ref" in schema:
+            path = schema["$ref"].removeprefix("#/").split("/")
+            return self.generate(_resolve(root, path), root)
+        if "const" in schema:
+            return schema["const"]
+        if "enum" in schema:
+            return self.random.choice(schema["enum"])
+        if "default" in schema:
+            return schema["default"]
+        for combinator in ("anyOf", "oneOf", "allOf"):
+            if schema.get(combinator):
+                return self.generate(schema[combinator][0], root)
+
+        schema_type = schema.get("type", "object" if "properties" in schema else "string")
+        if isinstance(schema_type, list):
+            schema_type = next((t for t in schema_type if t != "null"), "null")
+        if schema_type == "object":
+            return {name: self.generate(prop, root) for name, prop in schema.get("properties", {}).items()}
+        elif schema_type == "array":
+            items = schema.get("items", {})
+            return [self.generate(items, root) for _ in range(max(schema.get("minItems", 1), 1))]
+        elif schema_type == "integer":
+            return self.random.randint(schema.get("minimum", 0), schema.get("maximum", 100))
+        elif schema_type == "number":
+            return self.random.uniform(schema.get("minimum", 0), schema.get("maximum", 100))
+        elif schema_type == "boolean":
+            return self.random.choice([True, False])
+        elif schema_type == "null":
+            return None
+        else:
+            text = self._sentence()
+            if "minLength" in schema:
+                text = text.ljust(schema["minLength"], "x")
+            if "maxLength" in schema:
+                text = text[: schema["maxLength"]]
+            return text
+
+
+def _resolve(root: Dict[str, Any], path: List[str]) -> Dict[str, Any]:
+    for part in path:
+        root = root[part]
+    return root
+
+
+def _message_text(message: LLMMessage) -> str:
+    if isinstance(message, UserMessage):
+        return " ".join(part.text for part in message.content if isinstance(part, UserMessageText))
+    if isinstance(message, ToolResponseMessage):
+        return message.result
+    content = getattr(message, "content", "")
+    return content if isinstance(content, str) else json.dumps(content)
@@ -1,4 +1,4 @@
-from typing import List, Dict, Any, Literal
+from typing import List, Dict, Any, Literal, Optional
 
 from pydantic import BaseModel
 
@@ -37,6 +37,8 @@ class UserMessageText(BaseModel):
 class UserMessageImageURL(BaseModel):
     image_url: str
     type: Literal["image_url"] = "image_url"
+    # the sha256 hex digest of the image, recorded on upload
+    content_hash: Optional[str] = None
 
 
 # Derived UserMessage class
@@ -1,11 +1,13 @@
+import json
 from abc import ABC, abstractmethod
-from typing import List, Any, Dict, Literal, Union
+from typing import List, Any, Dict, Literal, Union, AsyncIterator
 
 from pydantic import BaseModel, Field
 
 from eidos_sdk.cpu.call_context import CallContext
 from eidos_sdk.cpu.llm_message import AssistantMessage, LLMMessage
 from eidos_sdk.cpu.processing_unit import ProcessingUnit
+from eidos_sdk.cpu.streaming import StreamEvent
 
 LLM_MAX_TOKENS = {
     "DEFAULT": 8192,
@@ -58,3 +60,25 @@ class LLMUnit(ProcessingUnit, ABC):
         output_format: Union[Literal["str"], Dict[str, Any]],
     ) -> AssistantMessage:
         pass
+
+    async def execute_llm_stream(
+        self,
+        call_context: CallContext,
+        messages: List[LLMMessage],
+        tools: List[LLMCallFunction],
+        output_format: Union[Literal["str"], Dict[str, Any]],
+    ) -> AsyncIterator[StreamEvent]:
+        """
+        Streams the llm response. Yields delta events as content is generated and a tool_call event for each
+        completed tool call, followed by a result event carrying the complete AssistantMessage.
+
+        LLM units which do not support streaming emit the response of execute_llm as a single delta.
+        """
+        message = await self.execute_llm(call_context, messages, tools, output_format)
+        thread_id = call_context.thread_id
+        if message.content:
+            delta = message.content if isinstance(message.content, str) else json.dumps(message.content)
+            yield StreamEvent(event="delta", thread_id=thread_id, data=delta)
+        for tool_call in message.tool_calls or []:
+            yield StreamEvent(event="tool_call", thread_id=thread_id, data=tool_call)
+        yield StreamEvent(event="result", thread_id=thread_id, data=message)
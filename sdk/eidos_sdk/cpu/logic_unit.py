@@ -5,6 +5,7 @@ import typing
 from abc import ABC
 from dataclasses import dataclass
 from typing import Dict, Any, List
+from weakref import WeakKeyDictionary
 
 from pydantic import BaseModel
 
@@ -30,8 +31,7 @@ class LLMToolWrapper:
         try:
             # if this is a sync tool call just call execute, if it is not we need to store the state of the conversation and call in memory
             if self.logic_unit.is_sync():
-                input_model = self.eidos_handler.input_model_fn(self.logic_unit, self.eidos_handler)
-                result = await self.eidos_handler.fn(self.logic_unit, **dict(input_model.model_validate(args)))
+                result = await self.eidos_handler.fn(self.logic_unit, **dict(self.input_model.model_validate(args)))
                 # if result is a base model, call model_dump on it. If it is a string wrap it in an object with a "text" key
                 if isinstance(result, BaseModel):
                     result = result.model_dump()
@@ -51,26 +51,67 @@ class LLMToolWrapper:
     async def from_logic_units(cls, logic_units: List[LogicUnit], conversation) -> Dict[str, LLMToolWrapper]:
         acc = {}
         for logic_unit in logic_units:
-            for handler in await logic_unit.build_tools(conversation):
+            for definition in await _tool_definitions(logic_unit, conversation):
+                handler = definition.handler
                 new_name = logic_unit.__class__.__name__ + "_" + handler.name
                 i = 0
                 while new_name in acc:
                     new_name = logic_unit.__class__.__name__ + "_" + handler.name + "_" + str(i)
                     i += 1
-                input_model = handler.input_model_fn(logic_unit, handler)
                 acc[new_name] = LLMToolWrapper(
                     logic_unit=logic_unit,
-                    llm_message=LLMCallFunction(
+                    # the definition has already been validated, so skip validating the (potentially large) schema again
+                    llm_message=LLMCallFunction.model_construct(
                         name=new_name,
-                        description=handler.description(logic_unit, handler),
-                        parameters=input_model.model_json_schema(),
+                        description=definition.description,
+                        parameters=definition.parameters,
                     ),
                     eidos_handler=handler,
-                    input_model=input_model,
+                    input_model=definition.input_model,
                 )
         return acc
 
 
+@dataclass
+class _ToolDefinition:
+    handler: EidosHandler
+    description: str
+    input_model: typing.Type[BaseModel]
+    parameters: Dict[str, object]
+
+    @classmethod
+    def build(cls, logic_unit: LogicUnit, handler: EidosHandler) -> _ToolDefinition:
+        input_model = handler.input_model_fn(logic_unit, handler)
+        parameters = _parameters.get(input_model)
+        if parameters is None:
+            parameters = _parameters[input_model] = input_model.model_json_schema()
+        return cls(
+            handler=handler,
+            description=handler.description(logic_unit, handler),
+            input_model=input_model,
+            parameters=parameters,
+        )
+
+
+# the json schema of input models, which logic units building their tools per request often reuse
+_parameters: WeakKeyDictionary[typing.Type[BaseModel], Dict[str, object]] = WeakKeyDictionary()
+
+
+# tool definitions of logic units whose tools do not depend on the conversation, built on first use
+_static_tool_definitions: WeakKeyDictionary[LogicUnit, List[_ToolDefinition]] = WeakKeyDictionary()
+
+
+async def _tool_definitions(logic_unit: LogicUnit, conversation: List[LLMMessage]) -> List[_ToolDefinition]:
+    if logic_unit.tools_depend_on_conversation():
+        return [_ToolDefinition.build(logic_unit, handler) for handler in await logic_unit.build_tools(conversation)]
+    definitions = _static_tool_definitions.get(logic_unit)
+    if definitions is None:
+        handlers = await logic_unit.build_tools(conversation)
+        definitions = [_ToolDefinition.build(logic_unit, handler) for handler in handlers]
+        _static_tool_definitions[logic_unit] = definitions
+    return definitions
+
+
 def llm_function(
     name: str = None,
     description: typing.Optional[typing.Callable[[object, EidosHandler], str]] = None,
@@ -86,3 +127,19 @@ class LogicUnit(ProcessingUnit, ABC):
 
     def is_sync(self):
         return True
+
+    def tools_depend_on_conversation(self) -> bool:
+        """
+        Whether build_tools returns different tools depending on the conversation. The tools of logic units which do
+        not are built once and reused for every request.
+
+        Defaults to True for logic units which override build_tools.
+        """
+        return type(self).build_tools is not LogicUnit.build_tools
+
+    def allow_parallel_tool_calls(self) -> bool:
+        """
+        Whether several tool calls to this logic unit may be executed concurrently. Logic units which need their tool
+        calls executed one at a time should return False.
+        """
+        return True
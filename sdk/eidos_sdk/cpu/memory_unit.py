@@ -1,22 +1,33 @@
 from abc import ABC, abstractmethod
-from typing import List
+from typing import List, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from eidos_sdk.cpu.call_context import CallContext
+from eidos_sdk.cpu.conversation_cache import ConversationCache
+from eidos_sdk.cpu.conversation_store import ConversationStore
 from eidos_sdk.cpu.llm_message import LLMMessage
 from eidos_sdk.cpu.processing_unit import ProcessingUnit
 from eidos_sdk.system.reference_model import Specable
 
 
 class MemoryUnitConfig(BaseModel):
-    pass
+    max_cached_threads: int = Field(
+        default=1000,
+        ge=0,
+        description="The maximum number of conversation threads to cache in memory. 0 disables the cache.",
+    )
 
 
 class MemoryUnit(ProcessingUnit, Specable[MemoryUnitConfig], ABC):
+    conversation_cache: ConversationCache
+    conversation_store: ConversationStore
+
     def __init__(self, spec: MemoryUnitConfig = None, **kwargs):
         super().__init__(**kwargs)
         self.spec = spec
+        self.conversation_cache = ConversationCache(spec.max_cached_threads if spec else 0)
+        self.conversation_store = ConversationStore()
 
     async def storeMessages(self, call_context: CallContext, messages: List[LLMMessage]):
         """
@@ -48,6 +59,15 @@ class MemoryUnit(ProcessingUnit, Specable[MemoryUnitConfig], ABC):
         conversation = await self.getConversationHistory(call_context)
         return conversation
 
+    async def forkThread(self, call_context: CallContext, new_context: CallContext):
+        """
+        Start the conversation of new_context with the conversation of call_context
+        :param call_context: The call context of the conversation to fork
+        :param new_context: The call context of the new conversation
+        :return: None
+        """
+        await self.writeMessages(new_context, await self.getConversationHistory(call_context))
+
     @abstractmethod
     async def writeBootMessages(self, call_context: CallContext, messages: List[LLMMessage]):
         """
@@ -69,10 +89,14 @@ class MemoryUnit(ProcessingUnit, Specable[MemoryUnitConfig], ABC):
         raise NotImplementedError("writeMessages not implemented")
 
     @abstractmethod
-    async def getConversationHistory(self, call_context: CallContext) -> List[LLMMessage]:
+    async def getConversationHistory(
+        self, call_context: CallContext, since_seq: Optional[int] = None, limit: Optional[int] = None
+    ) -> List[LLMMessage]:
         """
-        Get the full conversation history for the given call context
+        Get the conversation history for the given call context
         :param call_context: The call context for the current conversation
-        :return: The full conversation history for the given call context
+        :param since_seq: Only return messages stored after the message with this sequence number
+        :param limit: Only return the latest limit messages
+        :return: The conversation history for the given call context, the full history if no bounds are given
         """
         raise NotImplementedError("getConversationHistory not implemented")
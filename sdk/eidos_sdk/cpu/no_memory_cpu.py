@@ -4,7 +4,7 @@ from typing import List, Type, Dict, Any, Union, Literal
 from eidos_sdk.cpu.agent_cpu import AgentCPU, AgentCPUSpec, Thread
 from eidos_sdk.cpu.agent_io import IOUnit, CPUMessageTypes
 from eidos_sdk.cpu.call_context import CallContext
-from eidos_sdk.cpu.llm_message import LLMMessage, AssistantMessage, ToolResponseMessage
+from eidos_sdk.cpu.llm_message import LLMMessage, AssistantMessage
 from eidos_sdk.cpu.llm_unit import LLMUnit
 from eidos_sdk.cpu.logic_unit import LogicUnit, LLMToolWrapper
 from eidos_sdk.cpu.processing_unit import ProcessingUnitLocator, PU_T
@@ -77,17 +77,7 @@ class NoMemoryCPU(AgentCPU, Specable[NoMemoryCPUSpec], ProcessingUnitLocator):
                 call_context, conversation, [w.llm_message for w in tool_defs.values()], output_format
             )
             if assistant_message.tool_calls:
-                results = []
-                for tool_call in assistant_message.tool_calls:
-                    tool_def = tool_defs[tool_call.name]
-                    tool_result = await tool_def.execute(call_context=call_context, args=tool_call.arguments)
-                    message = ToolResponseMessage(
-                        tool_call_id=tool_call.tool_call_id,
-                        result=self._to_json(tool_result),
-                        name=tool_call.name,
-                    )
-                    results.append(message)
-
+                results = await self._execute_tool_calls(call_context, assistant_message.tool_calls, tool_defs)
                 conversation = conversation + [assistant_message] + results
                 num_iterations += 1
             else:
@@ -4,7 +4,6 @@ import time
 from io import IOBase
 from typing import List, Dict, Any, Type, Optional, Literal, Union
 
-from openai import AsyncOpenAI
 from openai.types.beta import Assistant
 from openai.types.beta.assistant_create_params import ToolAssistantToolsFunction
 from openai.types.beta.threads import ThreadMessage
@@ -15,6 +14,7 @@ from eidos_sdk.agent_os import AgentOS
 from eidos_sdk.cpu.agent_cpu import AgentCPUSpec, AgentCPU, Thread
 from eidos_sdk.cpu.agent_io import CPUMessageTypes
 from eidos_sdk.cpu.call_context import CallContext
+from eidos_sdk.cpu.llm.open_ai_scheduler import get_scheduler
 from eidos_sdk.cpu.llm_message import ToolResponseMessage, LLMMessage
 from eidos_sdk.cpu.logic_unit import LogicUnit, LLMToolWrapper
 from eidos_sdk.cpu.processing_unit import ProcessingUnitLocator, PU_T
@@ -33,7 +33,6 @@ class OpenAIAssistantsCPUSpec(AgentCPUSpec):
 
 
 class OpenAIAssistantsCPU(AgentCPU, Specable[OpenAIAssistantsCPUSpec], ProcessingUnitLocator):
-    llm: AsyncOpenAI = None
     logic_units: List[LogicUnit] = None
 
     def __init__(self, spec: OpenAIAssistantsCPUSpec = None):
@@ -48,19 +47,15 @@ class OpenAIAssistantsCPU(AgentCPU, Specable[OpenAIAssistantsCPUSpec], Processin
                 return unit
         raise ValueError(f"Could not locate {unit_type}")
 
-    def _getLLM(self):
-        if not self.llm:
-            self.llm = AsyncOpenAI()
-        return self.llm
-
     async def processFile(self, prompt: CPUMessageTypes) -> str:
         # rip out the image messages, store them in the file system, and replace them file Ids
         # collect the user messages
-        llm = self._getLLM()
         image_file: IOBase = prompt.image
         # read the prompt.image file into memory
         image_data = image_file.read()
-        file = await llm.files.create(file=image_data, purpose="assistants")
+        file = await get_scheduler().execute(
+            lambda client: client.files.with_raw_response.create(file=image_data, purpose="assistants")
+        )
         return file.id
 
     async def get_or_create_assistant(
@@ -75,10 +70,12 @@ class OpenAIAssistantsCPU(AgentCPU, Specable[OpenAIAssistantsCPUSpec], Processin
             },
         )
 
-        llm = self._getLLM()
+        scheduler = get_scheduler()
         if existingConversation:
             assistant_thread_id = existingConversation["assistant_thread_id"]
-            assistant = await llm.beta.assistants.retrieve(existingConversation["assistant_id"])
+            assistant = await scheduler.execute(
+                lambda client: client.beta.assistants.with_raw_response.retrieve(existingConversation["assistant_id"])
+            )
             return assistant, assistant_thread_id
 
         request = {"model": self.spec.model}
@@ -89,8 +86,8 @@ class OpenAIAssistantsCPU(AgentCPU, Specable[OpenAIAssistantsCPUSpec], Processin
             request["file_ids"] = file_ids
 
         logger.info("creating assistant with request " + str(request))
-        assistant = await llm.beta.assistants.create(**request)
-        thread = await llm.beta.threads.create()
+        assistant = await scheduler.execute(lambda client: client.beta.assistants.with_raw_response.create(**request))
+        thread = await scheduler.execute(lambda client: client.beta.threads.with_raw_response.create())
 
         await AgentOS.symbolic_memory.insert_one(
             "open_ai_conversations",
@@ -131,9 +128,13 @@ class OpenAIAssistantsCPU(AgentCPU, Specable[OpenAIAssistantsCPUSpec], Processin
             system_message += "\nALWAYS reply with json in the following format:\njson```<insert json here>```\n"
 
         assistant, thread_id = await self.get_or_create_assistant(call_context, system_message, file_ids)
-        llm = self._getLLM()
         for user_message in user_messages:
-            await llm.beta.threads.messages.create(thread_id=thread_id, content=user_message, role="user")
+            await get_scheduler().execute(
+                lambda client: client.beta.threads.messages.with_raw_response.create(
+                    thread_id=thread_id, content=user_message, role="user"
+                ),
+                estimated_tokens=len(user_message) // 4,
+            )
 
     async def schedule_request(
         self,
@@ -153,7 +154,6 @@ class OpenAIAssistantsCPU(AgentCPU, Specable[OpenAIAssistantsCPUSpec], Processin
                 raise ValueError(f"Unknown message type {message.type}")
 
         assistant, thread_id = await self.get_or_create_assistant(call_context)
-        llm = self._getLLM()
         if len(user_messages) == 0:
             user_messages.append("")
 
@@ -162,7 +162,10 @@ class OpenAIAssistantsCPU(AgentCPU, Specable[OpenAIAssistantsCPUSpec], Processin
             request = {"thread_id": thread_id, "content": user_message, "role": "user"}
             if idx == len(user_messages) - 1:
                 request["file_ids"] = file_ids
-            last_message = await llm.beta.threads.messages.create(**request)
+            last_message = await get_scheduler().execute(
+                lambda client: client.beta.threads.messages.with_raw_response.create(**request),
+                estimated_tokens=len(user_message) // 4,
+            )
             last_message_id = last_message.id
 
         # start the run
@@ -189,7 +192,7 @@ class OpenAIAssistantsCPU(AgentCPU, Specable[OpenAIAssistantsCPUSpec], Processin
         assistant_thread_id: str,
         last_message_id: str,
     ):
-        llm = self._getLLM()
+        scheduler = get_scheduler()
         tool_defs = await self._get_tools_defs(call_context)
         tools = []
         logger.info("tool defs are " + str(tool_defs.keys()))
@@ -215,7 +218,7 @@ class OpenAIAssistantsCPU(AgentCPU, Specable[OpenAIAssistantsCPUSpec], Processin
         if len(tools) > 0:
             request["tools"] = tools
 
-        run = await llm.beta.threads.runs.create(**request)
+        run = await scheduler.execute(lambda client: client.beta.threads.runs.with_raw_response.create(**request))
         num_iterations = 0
         while num_iterations < self.spec.max_num_function_calls:
             run = await self.run_llm(run.id, assistant_thread_id)
@@ -250,12 +253,18 @@ class OpenAIAssistantsCPU(AgentCPU, Specable[OpenAIAssistantsCPUSpec], Processin
                     )
                     results.append(message)
 
-                run = await llm.beta.threads.runs.submit_tool_outputs(
-                    thread_id=assistant_thread_id, run_id=run.id, tool_outputs=results
+                run = await scheduler.execute(
+                    lambda client: client.beta.threads.runs.with_raw_response.submit_tool_outputs(
+                        thread_id=assistant_thread_id, run_id=run.id, tool_outputs=results
+                    )
                 )
                 num_iterations += 1
             else:
-                messages = await llm.beta.threads.messages.list(thread_id=assistant_thread_id, before=last_message_id)
+                messages = await scheduler.execute(
+                    lambda client: client.beta.threads.messages.with_raw_response.list(
+                        thread_id=assistant_thread_id, before=last_message_id
+                    )
+                )
                 first_item: ThreadMessage = None
                 async for item in messages:
                     first_item = item
@@ -272,7 +281,11 @@ class OpenAIAssistantsCPU(AgentCPU, Specable[OpenAIAssistantsCPUSpec], Processin
         raise ValueError(f"Exceeded maximum number of function calls {self.spec.max_num_function_calls}")
 
     async def run_llm(self, run_id: str, thread_id: str):
-        llm = self._getLLM()
+        scheduler = get_scheduler()
+
+        def retrieve(client):
+            return client.beta.threads.runs.with_raw_response.retrieve(thread_id=thread_id, run_id=run_id)
+
         finished_states = [
             "completed",
             "requires_action",
@@ -281,12 +294,12 @@ class OpenAIAssistantsCPU(AgentCPU, Specable[OpenAIAssistantsCPUSpec], Processin
             "expired",
         ]
         start_time = time.time()
-        run = await llm.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run_id)
+        run = await scheduler.execute(retrieve)
         while (time.time() - start_time) < self.spec.max_wait_time_secs:
             if run.status in finished_states:
                 break
             await asyncio.sleep(self.spec.llm_poll_interval_ms / 1000)
-            run = await llm.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run_id)
+            run = await scheduler.execute(retrieve)
 
         if run.status not in finished_states or run.status == "expired":
             raise RuntimeError("Timeout while waiting for LLM to finish")
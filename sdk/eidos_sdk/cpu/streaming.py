@@ -0,0 +1,41 @@
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Literal, Optional
+
+from pydantic import BaseModel, Field
+
+
+class StreamEvent(BaseModel):
+    """
+    An incremental update produced while a request is processed.
+
+    delta events carry newly generated text and tool_call events carry a fully assembled ToolCall. The final event of
+    a stream is always a result event, which carries the output of whatever produced the stream.
+    """
+
+    event: Literal["delta", "tool_call", "result"]
+    thread_id: Optional[str] = Field(None, description="The thread which produced the event, None for the main thread.")
+    data: Any = None
+
+
+_stream_sink: ContextVar[Optional[asyncio.Queue]] = ContextVar("stream_sink", default=None)
+
+
+def get_stream_sink() -> Optional[asyncio.Queue]:
+    """
+    Returns the queue which incremental events should be published to, or None if the current request is not streamed.
+    """
+    return _stream_sink.get()
+
+
+@contextmanager
+def stream_to(queue: Optional[asyncio.Queue]):
+    """
+    Publishes the incremental events of threads scheduled within the context to queue. Passing None disables streaming.
+    """
+    token = _stream_sink.set(queue)
+    try:
+        yield
+    finally:
+        _stream_sink.reset(token)
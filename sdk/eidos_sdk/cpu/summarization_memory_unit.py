@@ -1,118 +1,231 @@
+import asyncio
 import logging
-from typing import List, Annotated
+from typing import List, Annotated, Dict, Tuple, Optional, Any
 
 import tiktoken
-from bson import ObjectId
 from pydantic import Field
 
-from eidos_sdk.agent_os import AgentOS
 from eidos_sdk.cpu.call_context import CallContext
-from eidos_sdk.cpu.llm_message import LLMMessage
+from eidos_sdk.cpu.conversation_cache import CachedConversation
+from eidos_sdk.cpu.llm_message import LLMMessage, ToolResponseMessage, AssistantMessage
 from eidos_sdk.cpu.llm_unit import LLM_MAX_TOKENS, LLMUnit
 from eidos_sdk.cpu.memory_unit import MemoryUnit, MemoryUnitConfig
 from eidos_sdk.cpu.message_summarizer import MessageSummarizer
 from eidos_sdk.system.reference_model import Specable, AnnotatedReference
 
+logger = logging.getLogger("eidolon")
+
 
 class SummarizationMemoryUnitConfig(MemoryUnitConfig):
     max_token_fraction: Annotated[float, Field(strict=True, gt=0, le=1)] = 0.75
     summarizer: AnnotatedReference[MessageSummarizer]
+    background_summarization: bool = Field(
+        default=False,
+        description="Summarize in the background once a conversation reaches soft_token_fraction of the llm's "
+        "context, rather than within the request which reaches max_token_fraction.",
+    )
+    soft_token_fraction: Annotated[float, Field(strict=True, gt=0, le=1)] = 0.5
 
 
 class SummarizationMemoryUnit(MemoryUnit, Specable[SummarizationMemoryUnitConfig]):
+    """
+    Stores conversations verbatim until they near the llm's context window, at which point older messages are
+    replaced by a summary. Boot messages are never summarized.
+
+    Stored messages are never modified: a summary records the sequence number of the last message it summarizes, and
+    only the latest summary and the messages after it are part of the conversation. This keeps forked threads, which
+    share their parent's messages, unaffected by summaries written to the parent after the fork.
+
+    The token count of each message is stored alongside it, so the size of a conversation is tracked incrementally.
+    With background_summarization, summarization starts early (at soft_token_fraction) and runs outside the request.
+    Requests only wait for it if the conversation reaches max_token_fraction before it completes.
+    """
+
     def __init__(self, spec: SummarizationMemoryUnitConfig, **kwargs):
         super().__init__(spec, **kwargs)
         self.max_token_frac = spec.max_token_fraction
         self.summarizer = spec.summarizer.instantiate()
+        self._encoding = None
+        self._summarizations: Dict[Tuple[str, Optional[str]], asyncio.Task] = {}
+
+    def count_tokens(self, message: LLMMessage) -> int:
+        if not self._encoding:
+            # cl100k_base encodings only work for gpt-3.5-turbo and up models
+            self._encoding = tiktoken.get_encoding("cl100k_base")
+        return len(self._encoding.encode(message.model_dump_json()))
 
     async def writeMessages(self, call_context: CallContext, messages: List[LLMMessage]):
+        await self._write(call_context, messages, is_boot_message=False)
+
+    async def writeBootMessages(self, call_context: CallContext, messages: List[LLMMessage]):
+        await self._write(call_context, messages, is_boot_message=True)
+
+    async def _write(self, call_context: CallContext, messages: List[LLMMessage], is_boot_message: bool):
+        tokens = [self.count_tokens(message) for message in messages]
         conversationItems = [
             {
-                "process_id": call_context.process_id,
-                "thread_id": call_context.thread_id,
                 "message": message.model_dump(),
+                "is_boot_message": is_boot_message,
+                "is_summary": False,
+                "tokens": message_tokens,
             }
-            for message in messages
+            for message, message_tokens in zip(messages, tokens)
         ]
 
         logging.debug(str(messages))
         logging.debug(conversationItems)
 
-        await AgentOS.symbolic_memory.insert("conversation_memory", conversationItems)
-
-    async def getConversationHistory(self, call_context: CallContext) -> List[LLMMessage]:
-        existingMessages = []
-        async for message in AgentOS.symbolic_memory.find(
-            "conversation_memory",
-            {
-                "process_id": call_context.process_id,
-                "thread_id": call_context.thread_id,
-                "archive": None,
-                "is_boot_message": False,
-            },
-            {"is_boot_message": 0},
-        ):
-            existingMessages.append(LLMMessage.from_dict(message["message"]))
+        last_seq = await self.conversation_store.write(call_context, conversationItems)
+        self.conversation_cache.append(call_context, last_seq, messages, is_boot_message, tokens=sum(tokens))
+
+    async def forkThread(self, call_context: CallContext, new_context: CallContext):
+        fork_seq = await self.conversation_store.fork(call_context, new_context)
+        self.conversation_cache.fork(call_context, new_context, fork_seq)
+
+    async def getConversationHistory(
+        self, call_context: CallContext, since_seq: Optional[int] = None, limit: Optional[int] = None
+    ) -> List[LLMMessage]:
+        if since_seq is None and limit is None:
+            conversation = await self._get_conversation(call_context)
+        else:
+            conversation = CachedConversation(version=0)
+            docs = await self._active_documents(call_context, since_seq=since_seq, limit=limit)
+            self._add_documents(conversation, docs)
+        return conversation.history()
+
+    async def _get_conversation(self, call_context: CallContext) -> CachedConversation:
+        last_seq = await self.conversation_store.last_seq(call_context)
+        conversation = self.conversation_cache.get(call_context)
+        if conversation and conversation.version == last_seq:
+            return conversation
+
+        docs = None
+        if conversation and conversation.version < last_seq:
+            docs = await self.conversation_store.find(call_context, since_seq=conversation.version)
+            if any(doc.get("is_summary") for doc in docs):
+                # the conversation has been summarized elsewhere, so earlier messages may have been replaced
+                docs = None
+        if docs is None:
+            conversation = CachedConversation(version=0)
+            docs = await self._active_documents(call_context)
+        self._add_documents(conversation, docs)
+        self.conversation_cache.put(call_context, conversation)
+
+        logging.debug("existingMessages = " + str(conversation.history()))
+        return conversation
 
-        logging.debug("existingMessages = " + str(existingMessages))
-        return existingMessages
+    async def _active_documents(
+        self, call_context: CallContext, since_seq: Optional[int] = None, limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Returns the documents which make up the conversation in sequence order: the boot messages, the latest summary
+        and the messages after the last message it summarizes.
+        """
+        summaries = await self.conversation_store.find(call_context, {"is_summary": True}, limit=1)
+        boot_docs = await self.conversation_store.find(
+            call_context, {"is_boot_message": True}, since_seq=since_seq, limit=limit
+        )
+        after = since_seq
+        if summaries:
+            after = max(summaries[0]["summarized_through"], since_seq or 0)
+            summaries = [doc for doc in summaries if since_seq is None or doc["seq"] > since_seq]
+        docs = await self.conversation_store.find(
+            call_context, {"is_boot_message": False, "is_summary": False}, since_seq=after, limit=limit
+        )
+        docs = sorted(boot_docs + summaries + docs, key=lambda d: d["seq"])
+        return docs[-limit:] if limit else docs
+
+    def _add_documents(self, conversation: CachedConversation, docs: List[Dict[str, Any]]):
+        # a summary replaces the messages before it, so it comes first even though it is written after the messages
+        # which were kept
+        docs = [doc for doc in docs if not conversation.reflects(doc.get("seq"))]
+        for doc in sorted(docs, key=lambda d: not d.get("is_summary")):
+            message = LLMMessage.from_dict(doc["message"])
+            tokens = doc.get("tokens") or self.count_tokens(message)
+            conversation.add(doc.get("seq"), message, doc.get("is_boot_message"), tokens)
 
     async def storeAndFetch(self, call_context: CallContext, messages: List[LLMMessage]):
-        conversation = await super().storeAndFetch(call_context, messages)
+        if messages:
+            await self.writeMessages(call_context, messages)
+        conversation = await self._get_conversation(call_context)
+        max_tokens = self._max_tokens()
+
+        logger.debug(f"num_tokens = {conversation.tokens}, tokens limit = {max_tokens * self.max_token_frac}")
+
+        if conversation.tokens >= max_tokens * self.max_token_frac:
+            running = self._summarizations.get(self._key(call_context))
+            if running:
+                await asyncio.wait([running])
+            else:
+                # keep the messages of this request, they are what the llm needs to respond to
+                await self._summarize(call_context, keep=len(messages or []))
+            conversation = await self._get_conversation(call_context)
+        elif self.spec.background_summarization and conversation.tokens >= max_tokens * self.spec.soft_token_fraction:
+            self._summarize_in_background(call_context)
+
+        return conversation.history()
+
+    def _max_tokens(self) -> int:
         llm_unit = self.locate_unit(LLMUnit)
+        model = getattr(getattr(llm_unit, "spec", None), "model", None)
+        return LLM_MAX_TOKENS.get(model, LLM_MAX_TOKENS["DEFAULT"])
+
+    @staticmethod
+    def _key(call_context: CallContext) -> Tuple[str, Optional[str]]:
+        return call_context.process_id, call_context.thread_id
+
+    def _summarize_in_background(self, call_context: CallContext):
+        key = self._key(call_context)
+        if key in self._summarizations:
+            return
+
+        def done(task: asyncio.Task):
+            del self._summarizations[key]
+            if not task.cancelled() and task.exception():
+                logger.error("background summarization failed", exc_info=task.exception())
+
+        task = asyncio.create_task(self._summarize(call_context))
+        self._summarizations[key] = task
+        task.add_done_callback(done)
+
+    async def _summarize(self, call_context: CallContext, keep: int = 0):
+        """
+        Replaces the conversation's messages, except for the latest keep messages and any messages written meanwhile,
+        with a summary.
+        """
+        docs = [doc for doc in await self._active_documents(call_context) if not doc["is_boot_message"]]
+        # the earlier summary comes first, just like in the conversation history
+        docs.sort(key=lambda d: not d.get("is_summary"))
+        messages = [LLMMessage.from_dict(doc["message"]) for doc in docs]
+
+        end = len(messages) - keep
+        # never separate tool calls from their responses
+        while end > 0 and (
+            isinstance(messages[end - 1], ToolResponseMessage)
+            or (isinstance(messages[end - 1], AssistantMessage) and messages[end - 1].tool_calls)
+        ):
+            end -= 1
+        if end <= 0:
+            return
 
-        num_tokens = sum(
-            [len(tiktoken.get_encoding("cl100k_base").encode(message.model_dump_json())) for message in conversation]
+        # call the summarize_messages function on the MessageSummarizer logic unit
+        assistant_message = await self.summarizer.summarize_messages(
+            call_context, messages[:end], self.locate_unit(LLMUnit)
         )
 
-        logger = logging.getLogger("eidolon")
-
-        logger.debug(
-            "num_tokens = "
-            + str(num_tokens)
-            + ", tokens limit = "
-            + str(LLM_MAX_TOKENS.get(llm_unit.spec.model) * self.max_token_frac)
+        summarized_through = max(
+            doc["summarized_through"] if doc.get("is_summary") else doc["seq"] for doc in docs[:end]
         )
-
-        # cl100k_base encodings only work for gpt-3.5-turbo and up models
-        if num_tokens >= LLM_MAX_TOKENS.get(llm_unit.spec.model) * self.max_token_frac:
-            existingMessages = []
-            async for message in AgentOS.symbolic_memory.find(
-                "conversation_memory",
-                {
-                    "process_id": call_context.process_id,
-                    "thread_id": call_context.thread_id,
-                    "archive": None,
-                    "is_boot_message": False,
-                },
-                {"is_boot_message": 0},
-            ):
-                existingMessages.append(LLMMessage.from_dict(message["message"]))
-
-            # call the summarize_messages function on the MessageSummarizer logic unit
-            assistant_message = await self.summarizer.summarize_messages(call_context, existingMessages, llm_unit)
-
-            # create a new object id for the summary message
-            summary_id = str(ObjectId())
-            # update existing messages and set the archive column to the new object id and insert the new message into the database with the object id all using an upsert in the db
-            await AgentOS.symbolic_memory.update_many(
-                "conversation_memory",
+        await self.conversation_store.write(
+            call_context,
+            [
                 {
-                    "process_id": call_context.process_id,
-                    "thread_id": call_context.thread_id,
-                },
-                {"$set": {"archive": summary_id}},
-            )
-
-            await AgentOS.symbolic_memory.insert_one(
-                "conversation_memory",
-                {
-                    "_id": summary_id,
-                    "process_id": call_context.process_id,
-                    "thread_id": call_context.thread_id,
                     "message": assistant_message.model_dump(),
-                },
-            )
-
-        # return getConversationHistory
-        return conversation
+                    "is_boot_message": False,
+                    "is_summary": True,
+                    "summarized_through": summarized_through,
+                    "tokens": self.count_tokens(assistant_message),
+                }
+            ],
+        )
+        self.conversation_cache.invalidate(call_context)
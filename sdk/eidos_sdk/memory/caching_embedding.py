@@ -0,0 +1,102 @@
+import hashlib
+import json
+from typing import Any, List, Sequence, Dict
+
+from pydantic import Field
+from pymongo.errors import PyMongoError
+
+from eidos_sdk.agent_os import AgentOS
+from eidos_sdk.memory.embeddings import Embedding, EmbeddingSpec
+from eidos_sdk.system.reference_model import Specable, AnnotatedReference
+from eidos_sdk.util.class_utils import fqn
+from eidos_sdk.util.logger import logger
+from eidos_sdk.util.lru_cache import LRUCache
+
+
+class CachingEmbeddingSpec(EmbeddingSpec):
+    embedder: AnnotatedReference[Embedding] = Field(description="The embedder to cache the results of.")
+    max_memory_entries: int = Field(
+        default=10_000, gt=0, description="The maximum number of embeddings to keep in the in-memory tier."
+    )
+    persist: bool = Field(default=True, description="Whether to persist embeddings to symbolic memory.")
+    collection: str = Field(
+        default="embedding_cache", description="The symbolic memory collection used to persist embeddings."
+    )
+
+
+class CachingEmbedding(Embedding, Specable[CachingEmbeddingSpec]):
+    """
+    Wraps another embedder and caches its vectors by (embedder, sha256(text)), where the embedder is identified by
+    its class and a hash of its spec (less the EmbeddingSpec batching fields), so that embedders configured differently
+    (another model, dimensions, seed...) never share vectors.
+
+    Lookups check an in-memory LRU tier first, then symbolic memory, and only the remaining misses are sent to the
+    wrapped embedder (as a single batch).
+    """
+
+    embedder: Embedding
+    cache: LRUCache[str, List[float]]
+
+    def __init__(self, spec: CachingEmbeddingSpec):
+        super().__init__(spec)
+        self.spec = spec
+        self.embedder = spec.embedder.instantiate()
+        self.model = getattr(self.embedder.spec, "model", None) or fqn(self.embedder.__class__)
+        # the batching fields only change how texts are sent, not the vectors they get
+        vector_spec = self.embedder.spec.model_dump(mode="json", exclude=set(EmbeddingSpec.model_fields))
+        spec_json = json.dumps(vector_spec, sort_keys=True)
+        self.key_prefix = f"{fqn(self.embedder.__class__)}:{hashlib.sha256(spec_json.encode()).hexdigest()[:16]}"
+        self.cache = LRUCache(spec.max_memory_entries)
+
+    def start(self):
+        super().start()
+        self.embedder.start()
+
+    def stop(self):
+        super().stop()
+        self.embedder.stop()
+        self.cache.clear()
+
+    def cache_key(self, text: str) -> str:
+        return f"{self.key_prefix}:{hashlib.sha256(text.encode()).hexdigest()}"
+
+    async def embed_text(self, text: str, **kwargs: Any) -> List[float]:
+        return (await self.embed_batch([text], **kwargs))[0]
+
+    async def embed_batch(self, texts: Sequence[str], **kwargs: Any) -> List[List[float]]:
+        keys = [self.cache_key(text) for text in texts]
+        found: Dict[str, List[float]] = {}
+        for key in keys:
+            embedding = self.cache.get(key)
+            if embedding is not None:
+                found[key] = embedding
+
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        if missing and self.spec.persist:
+            async for doc in AgentOS.symbolic_memory.find(self.spec.collection, {"_id": {"$in": list(missing)}}):
+                found[doc["_id"]] = doc["embedding"]
+                self.cache.put(doc["_id"], doc["embedding"])
+                del missing[doc["_id"]]
+
+        if missing:
+            embeddings = await self.embedder.embed_batch(list(missing.values()), **kwargs)
+            for key, embedding in zip(missing, embeddings):
+                found[key] = embedding
+                self.cache.put(key, embedding)
+            if self.spec.persist:
+                await self._persist(dict(zip(missing, embeddings)))
+
+        logger.debug(f"embedding cache: {len(texts) - len(missing)} hits, {len(missing)} misses")
+        return [found[key] for key in keys]
+
+    async def _persist(self, embeddings: Dict[str, List[float]]):
+        try:
+            # unordered, so that embeddings stored meanwhile by a concurrent request do not stop the rest of the batch
+            await AgentOS.symbolic_memory.insert(
+                self.spec.collection,
+                [dict(_id=key, model=self.model, embedding=embedding) for key, embedding in embeddings.items()],
+                ordered=False,
+            )
+        except PyMongoError:
+            # the embeddings which were already stored are equal to ours
+            logger.debug("unable to persist embeddings", exc_info=True)
@@ -1,15 +1,24 @@
+import asyncio
+import re
+import zlib
 from abc import ABC, abstractmethod
-from typing import Sequence, Any, Literal, AsyncGenerator, Optional, List
+from typing import Sequence, Any, Literal, AsyncGenerator, List
 
-from openai import AsyncOpenAI
+import numpy as np
+import tiktoken
 from pydantic import BaseModel, Field
 
+from eidos_sdk.cpu.llm.open_ai_scheduler import get_scheduler, PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE
 from eidos_sdk.system.reference_model import Specable
 from eidos_sdk.memory.document import Document, EmbeddedDocument
 
 
 class EmbeddingSpec(BaseModel):
-    pass
+    max_batch_size: int = Field(default=256, gt=0, description="The maximum number of texts to embed in one batch.")
+    max_batch_tokens: int = Field(
+        default=8000, gt=0, description="The (approximate) maximum number of tokens to embed in one batch."
+    )
+    max_concurrency: int = Field(default=4, gt=0, description="The maximum number of batches to embed concurrently.")
 
 
 class Embedding(ABC, Specable[EmbeddingSpec]):
@@ -28,6 +37,47 @@ class Embedding(ABC, Specable[EmbeddingSpec]):
             An embedding for the text.
         """
 
+    async def embed_batch(self, texts: Sequence[str], **kwargs: Any) -> List[List[float]]:
+        """Create embeddings for many pieces of text.
+
+        The texts are split into batches bounded by `max_batch_size` and `max_batch_tokens` which are embedded
+        concurrently (at most `max_concurrency` at a time).
+
+        Args:
+            texts: The texts to be encoded.
+
+        Returns:
+            The embeddings for the texts, in the same order as the texts.
+        """
+        semaphore = asyncio.Semaphore(self.spec.max_concurrency)
+
+        async def run(batch: List[str]) -> List[List[float]]:
+            async with semaphore:
+                return await self._embed_batch(batch, **kwargs)
+
+        results = await asyncio.gather(*(run(batch) for batch in self._batches(texts)))
+        return [embedding for batch in results for embedding in batch]
+
+    async def _embed_batch(self, texts: List[str], **kwargs: Any) -> List[List[float]]:
+        """Embeds a single batch of text. Implementations which support batched requests should override this."""
+        return [await self.embed_text(text, **kwargs) for text in texts]
+
+    def count_tokens(self, text: str) -> int:
+        """Approximates the number of tokens in a piece of text, used to size batches."""
+        return len(text) // 4 + 1
+
+    def _batches(self, texts: Sequence[str]):
+        batch, batch_tokens = [], 0
+        for text in texts:
+            tokens = self.count_tokens(text)
+            if batch and (len(batch) >= self.spec.max_batch_size or batch_tokens + tokens > self.spec.max_batch_tokens):
+                yield batch
+                batch, batch_tokens = [], 0
+            batch.append(text)
+            batch_tokens += tokens
+        if batch:
+            yield batch
+
     async def embed(self, documents: Sequence[Document], **kwargs: Any) -> AsyncGenerator[EmbeddedDocument, None]:
         """Create embeddings for a list of documents.
 
@@ -37,11 +87,11 @@ class Embedding(ABC, Specable[EmbeddingSpec]):
         Returns:
             A sequence of EmbeddedDocuments.
         """
-        for document in documents:
-            text = await self.embed_text(document.page_content, **kwargs)
+        embeddings = await self.embed_batch([document.page_content for document in documents], **kwargs)
+        for document, embedding in zip(documents, embeddings):
             yield EmbeddedDocument(
                 id=document.id,
-                embedding=text,
+                embedding=embedding,
                 metadata=document.metadata,
             )
 
@@ -57,6 +107,85 @@ class NoopEmbedding(Embedding, Specable[EmbeddingSpec]):
         return []
 
 
+class HashingEmbeddingSpec(EmbeddingSpec):
+    dimensions: int = Field(default=384, gt=0, description="The dimension of the produced embeddings.")
+    char_ngram_size: int = Field(
+        default=4, ge=0, description="The size of the character n-grams to hash. 0 disables character n-grams."
+    )
+    word_ngram_size: int = Field(
+        default=2, ge=0, description="The largest word n-gram to hash. 0 disables word n-grams."
+    )
+    projections_per_feature: int = Field(
+        default=4, gt=0, description="The number of (signed) dimensions each hashed feature is projected onto."
+    )
+    seed: int = Field(default=0, description="Seeds the projection. Embeddings are only comparable with equal seeds.")
+
+
+_WORD_RE = re.compile(r"\w+")
+_CHAR_NGRAM_SALT = np.uint32(0x5BD1E995)
+
+
+class HashingEmbedding(Embedding, Specable[HashingEmbeddingSpec]):
+    """
+    A deterministic, CPU only embedder which does not need network access.
+
+    Character and word n-grams are hashed and each hash is projected onto a few signed dimensions (a sparse random
+    projection), then the vectors are l2 normalized. This captures lexical similarity well enough for offline
+    operation, tests and benchmarks, but it is not a replacement for a trained embedding model.
+    """
+
+    def __init__(self, spec: HashingEmbeddingSpec):
+        super().__init__(spec)
+        self.spec = spec
+        rng = np.random.default_rng(spec.seed)
+        self.multipliers = rng.integers(1, 2**32, size=spec.projections_per_feature, dtype=np.uint64).astype(
+            np.uint32
+        ) | np.uint32(1)
+        n = max(spec.char_ngram_size, 1)
+        self.char_powers = np.array([pow(16777619, n - 1 - i, 2**32) for i in range(n)], dtype=np.uint32)
+
+    async def embed_text(self, text: str, **kwargs: Any) -> List[float]:
+        return self.embed_array([text])[0].tolist()
+
+    async def _embed_batch(self, texts: List[str], **kwargs: Any) -> List[List[float]]:
+        return self.embed_array(texts).tolist()
+
+    def embed_array(self, texts: Sequence[str]) -> np.ndarray:
+        """Embeds the texts into a (len(texts), dimensions) float32 array."""
+        dims = self.spec.dimensions
+        features = [self._features(text) for text in texts]
+        rows = np.repeat(np.arange(len(texts)), [len(f) for f in features])
+        hashes = np.concatenate(features) if features else np.empty(0, dtype=np.uint32)
+
+        mixed = hashes[:, None] * self.multipliers[None, :]
+        mixed ^= mixed >> np.uint32(15)
+        columns = ((mixed.astype(np.uint64) * np.uint64(dims)) >> np.uint64(32)).astype(np.int64)
+        signs = np.where(mixed & np.uint32(1 << 7), -1.0, 1.0)
+        flat = (rows[:, None] * dims + columns).ravel()
+
+        vectors = np.bincount(flat, weights=signs.ravel(), minlength=len(texts) * dims).reshape(len(texts), dims)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return (vectors / np.where(norms == 0, 1, norms)).astype(np.float32)
+
+    def _features(self, text: str) -> np.ndarray:
+        text = text.lower()
+        acc = []
+        n = self.spec.char_ngram_size
+        data = np.frombuffer(text.encode(), dtype=np.uint8).astype(np.uint32)
+        if n and len(data):
+            n = min(n, len(data))
+            windows = np.lib.stride_tricks.sliding_window_view(data, n)
+            acc.append((windows * self.char_powers[-n:]).sum(axis=1, dtype=np.uint32) ^ _CHAR_NGRAM_SALT)
+        words = _WORD_RE.findall(text)
+        word_hashes = [
+            zlib.crc32(" ".join(words[i : i + size]).encode())
+            for size in range(1, self.spec.word_ngram_size + 1)
+            for i in range(len(words) - size + 1)
+        ]
+        acc.append(np.array(word_hashes, dtype=np.uint32))
+        return np.concatenate(acc)
+
+
 class OpenAIEmbeddingSpec(EmbeddingSpec):
     model: Literal[
         "text-embedding-davinci-001",
@@ -64,29 +193,30 @@ class OpenAIEmbeddingSpec(EmbeddingSpec):
         "text-embedding-curie-001",
         "text-embedding-ada-002",
     ] = Field(default="text-embedding-ada-002", description="The name of the model to use.")
+    max_batch_tokens: int = Field(
+        default=100_000, gt=0, description="The maximum number of tokens to send in a single embeddings request."
+    )
 
 
 class OpenAIEmbedding(Embedding, Specable[OpenAIEmbeddingSpec]):
-    llm: Optional[AsyncOpenAI] = None
-
     def __init__(self, spec: OpenAIEmbeddingSpec):
         super().__init__(spec)
         self.spec = spec
-
-    def start(self):
-        super().start()
-        self.llm = AsyncOpenAI()
-
-    def stop(self):
-        super().stop()
-        self.llm.close()
-        self.llm = None
+        self.encoding = None
 
     async def embed_text(self, text: str, **kwargs: Any) -> Sequence[float]:
-        response = await self.llm.embeddings.create(
-            input=text,
-            model=self.spec.model,  # Choose the model as per your requirement
+        return (await self._embed_batch([text], **kwargs))[0]
+
+    async def _embed_batch(self, texts: List[str], **kwargs: Any) -> List[List[float]]:
+        response = await get_scheduler().execute(
+            lambda client: client.embeddings.with_raw_response.create(input=texts, model=self.spec.model),
+            estimated_tokens=sum(self.count_tokens(text) for text in texts),
+            # large batches are almost always document ingestion, which should not starve interactive requests
+            priority=PRIORITY_BACKGROUND if len(texts) > 1 else PRIORITY_INTERACTIVE,
         )
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
 
-        embedding_vector = response.data[0].embedding
-        return embedding_vector
+    def count_tokens(self, text: str) -> int:
+        if not self.encoding:
+            self.encoding = tiktoken.encoding_for_model(self.spec.model)
+        return len(self.encoding.encode(text, disallowed_special=()))
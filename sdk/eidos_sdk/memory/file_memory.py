@@ -15,6 +15,9 @@ class FileMemory(ABC):
     agent's memory.
     """
 
+    # whether the files are only visible to the process that wrote them, so that workers of a server can not share them
+    process_local: bool = False
+
     @abstractmethod
     def start(self):
         """
@@ -1,6 +1,7 @@
-from pathlib import Path
+import posixpath
+from typing import Dict, Set
 
-from pydantic import Field, BaseModel
+from pydantic import BaseModel
 
 from eidos_sdk.memory.file_memory import FileMemory
 from eidos_sdk.system.reference_model import Specable
@@ -11,101 +12,50 @@ class InMemoryFileMemoryConfig(BaseModel):
 
 
 class InMemoryFileMemory(FileMemory, Specable[InMemoryFileMemoryConfig]):
-    def __init__(self, spec: InMemoryFileMemoryConfig):
-        super().__init__(spec)
-        self.root_dir = Path("/").resolve()
-        self.files = {}
-        self.spec = spec
-
     """
-    A FileMemory implementation that stores files on the local filesystem.
+    A FileMemory implementation that keeps files in a dictionary. Files do not outlive the process, so this is only
+    suitable for tests and benchmarks.
     """
-    root_dir: Path = Field(..., description="The root directory to store files in.")
-
-    def resolve(self, *paths):
-        """
-        Resolves file paths relative to the root directory and ensures that they do not escape the root directory.
 
-        Args:
-            *paths (str): A variable number of path components to be joined and resolved.
+    process_local = True
 
-        Returns:
-            Path: The resolved path as a Path object.
+    def __init__(self, **kwargs):
+        Specable.__init__(self, **kwargs)
+        self.files: Dict[str, bytes] = {}
+        self.directories: Set[str] = set()
 
-        Raises:
-            ValueError: If the resulting path is outside the root directory.
+    @staticmethod
+    def resolve(path: str) -> str:
         """
-        # Resolve the combined path
-        resolved_path = self.root_dir.joinpath(*paths).resolve()
-
-        # Check that the resolved path is a subpath of root_dir
-        if not resolved_path.is_relative_to(self.root_dir):
-            raise ValueError("Attempted to access a path outside the root directory")
-
-        return resolved_path
-
-    def read_file(self, file_path: str) -> bytes:
+        Normalizes a path so that equivalent paths refer to the same file. Like LocalFileMemory, paths can not escape
+        the root directory.
         """
-        Reads and returns the contents of the file specified by the file_path within the root directory.
-
-        Args:
-            file_path (str): The path to the file to be read, relative to the root directory.
+        return posixpath.normpath("/" + path).lstrip("/")
 
-        Returns:
-            bytes: The contents of the file as a bytes object.
-        """
-        # Resolve the safe path
-        safe_file_path = self.resolve(file_path)
-
-        # Read the file and return its contents
-        return self.files[safe_file_path]
+    def read_file(self, file_path: str) -> bytes:
+        try:
+            return self.files[self.resolve(file_path)]
+        except KeyError:
+            raise FileNotFoundError(file_path)
 
     def write_file(self, file_path: str, file_contents: bytes) -> None:
-        """
-        Writes the given file_contents to the file specified by the file_path within the root directory.
-
-        Args:
-            file_path (str): The path to the file where contents are to be written, relative to the root directory.
-            file_contents (bytes): The contents to write to the file.
-
-        Returns:
-            None
-        """
-        # Resolve the safe path
-        safe_file_path = self.resolve(file_path)
-
-        # Write the contents to the file
-        self.files[safe_file_path] = file_contents
+        self.files[self.resolve(file_path)] = file_contents
 
     def delete_file(self, file_path: str) -> None:
-        # Resolve the safe path
-        safe_file_path = self.resolve(file_path)
-
-        # Delete the file
-        del self.files[safe_file_path]
+        try:
+            del self.files[self.resolve(file_path)]
+        except KeyError:
+            raise FileNotFoundError(file_path)
 
     def mkdir(self, directory: str, exist_ok: bool = False):
-        safe_file_path = self.resolve(directory)
-        self.files[safe_file_path] = {}
-        print(f"Created directory {safe_file_path}")
+        directory = self.resolve(directory)
+        if directory in self.directories and not exist_ok:
+            raise FileExistsError(directory)
+        self.directories.add(directory)
 
     def exists(self, file_name: str):
-        """
-        Checks if a file exists at the specified path relative to the root directory.
-
-        Args:
-            file_name (str): The path to the file to check, relative to the root directory.
-
-        Returns:
-            bool: True if the file exists, False otherwise.
-        """
-        # Resolve the safe path
-        safe_file_path = self.resolve(file_name)
-
-        print(f"Checking if {safe_file_path} exists")
-        print(f"Files: {self.files}")
-        # Check if the file exists
-        return self.files.get(safe_file_path) is not None
+        file_name = self.resolve(file_name)
+        return file_name in self.files or file_name in self.directories
 
     def start(self):
         """
@@ -1,3 +1,4 @@
+import operator
 from copy import deepcopy
 from typing import Any, Union, List, Dict, AsyncIterable, Optional
 
@@ -6,8 +7,16 @@ from pymongo.errors import DuplicateKeyError
 
 from eidos_sdk.memory.semantic_memory import SymbolicMemory
 
+_COMPARISONS = {
+    "$gt": operator.gt,
+    "$gte": operator.ge,
+    "$lt": operator.lt,
+    "$lte": operator.le,
+}
+
 
 class LocalSymbolicMemory(SymbolicMemory):
+    process_local = True
     db = {}
 
     def start(self):
@@ -24,14 +33,35 @@ class LocalSymbolicMemory(SymbolicMemory):
     def _matches_query(self, doc: dict, query: dict) -> bool:
         for key, value in query.items():
             if key not in doc:
+                if isinstance(value, dict) and value.get("$exists") is False:
+                    continue
                 return False
-            if isinstance(value, dict):
+            if isinstance(value, dict) and value and all(k.startswith("$") for k in value):
+                if not self._matches_operators(doc[key], value):
+                    return False
+            elif isinstance(value, dict):
                 if not self._matches_query(doc[key], value):
                     return False
             elif doc[key] != value:
                 return False
         return True
 
+    @staticmethod
+    def _matches_operators(field_value, operators: dict) -> bool:
+        for op, arg in operators.items():
+            if op == "$exists":
+                if not arg:
+                    return False
+            elif op == "$in":
+                if field_value not in arg:
+                    return False
+            elif op in _COMPARISONS:
+                if field_value is None or not _COMPARISONS[op](field_value, arg):
+                    return False
+            else:
+                raise ValueError(f"Unsupported query operator {op}")
+        return True
+
     @staticmethod
     def _apply_projection(doc: dict, projection: dict) -> dict:
         rtn = {field: doc[field] for field in doc if field in projection and projection[field] == 1}
@@ -46,6 +76,7 @@ class LocalSymbolicMemory(SymbolicMemory):
         projection: Union[List[str], Dict[str, int]] = None,
         sort: dict = None,
         skip: int = None,
+        limit: int = None,
     ) -> AsyncIterable[dict[str, Any]]:
         if symbol_collection not in self.db:
             return
@@ -55,6 +86,8 @@ class LocalSymbolicMemory(SymbolicMemory):
                 matching_docs = sorted(matching_docs, key=lambda doc: doc.get(field, None), reverse=direction == -1)
         if skip:
             matching_docs = matching_docs[skip:]
+        if limit:
+            matching_docs = matching_docs[:limit]
         for doc in matching_docs:
             yield deepcopy(self._apply_projection(doc, projection) if projection else doc)
 
@@ -74,15 +107,20 @@ class LocalSymbolicMemory(SymbolicMemory):
             copied["_id"] = str(ObjectId())
         self.db[symbol_collection].append(copied)
 
-    async def insert(self, symbol_collection: str, documents: list[dict[str, Any]]) -> None:
+    async def insert(self, symbol_collection: str, documents: list[dict[str, Any]], ordered: bool = True) -> None:
         if symbol_collection not in self.db:
             self.db[symbol_collection] = []
+        duplicates = []
         for document in documents:
             if "_id" not in document:
                 document["_id"] = str(ObjectId())
             if any(doc.get("_id") == document.get("_id") for doc in self.db[symbol_collection]):
-                raise DuplicateKeyError(f"Duplicate key error: _id {document.get('_id')} already exists.")
-        self.db[symbol_collection].extend(deepcopy(documents))
+                if ordered:
+                    raise DuplicateKeyError(f"Duplicate key error: _id {document.get('_id')} already exists.")
+                duplicates.append(document["_id"])
+        self.db[symbol_collection].extend(deepcopy([doc for doc in documents if doc["_id"] not in duplicates]))
+        if duplicates:
+            raise DuplicateKeyError(f"Duplicate key error: _ids {duplicates} already exist.")
 
     async def upsert_one(self, symbol_collection: str, document: dict[str, Any], query: dict[str, Any]) -> None:
         if symbol_collection not in self.db:
@@ -91,6 +129,11 @@ class LocalSymbolicMemory(SymbolicMemory):
             if self._matches_query(doc, query):
                 doc.update(deepcopy(document))
                 return
+        # like mongo, an inserted document takes the equality conditions of the query
+        document = {
+            **{k: v for k, v in query.items() if not (isinstance(v, dict) and any(op.startswith("$") for op in v))},
+            **document,
+        }
         if any(doc.get("_id") == document.get("_id") for doc in self.db[symbol_collection]):
             raise DuplicateKeyError(f"Duplicate key error: _id {document.get('_id')} already exists.")
         self.db[symbol_collection].append(deepcopy(document))
@@ -98,6 +141,11 @@ class LocalSymbolicMemory(SymbolicMemory):
     async def update_many(self, symbol_collection: str, query: dict[str, Any], document: dict[str, Any]) -> None:
         if symbol_collection not in self.db:
             return
+        if document and all(k.startswith("$") for k in document):
+            unsupported = set(document) - {"$set"}
+            if unsupported:
+                raise ValueError(f"Unsupported update operators {unsupported}")
+            document = document["$set"]
         for doc in self.db[symbol_collection]:
             if self._matches_query(doc, query):
                 doc.update(deepcopy(document))
@@ -36,12 +36,15 @@ class MongoSymbolicMemory(SymbolicMemory, Specable[MongoSymbolicMemoryConfig]):
         projection: Union[List[str], Dict[str, int]] = None,
         sort: dict = None,
         skip: int = None,
+        limit: int = None,
     ) -> AsyncIterable[dict[str, Any]]:
         cursor = self.database[symbol_collection].find(query, projection=projection)
         if sort:
             cursor = cursor.sort(sort)
         if skip:
             cursor = cursor.skip(skip)
+        if limit:
+            cursor = cursor.limit(limit)
         async for document in cursor:
             yield document
 
@@ -53,8 +56,11 @@ class MongoSymbolicMemory(SymbolicMemory, Specable[MongoSymbolicMemoryConfig]):
             kwargs["sort"] = sort
         return await self.database[symbol_collection].find_one(**kwargs)
 
-    async def insert(self, symbol_collection: str, documents: list[dict[str, Any]]) -> None:
-        return await self.database[symbol_collection].insert_many(documents)
+    async def create_index(self, symbol_collection: str, keys: Dict[str, int], unique: bool = False) -> None:
+        await self.database[symbol_collection].create_index(list(keys.items()), unique=unique)
+
+    async def insert(self, symbol_collection: str, documents: list[dict[str, Any]], ordered: bool = True) -> None:
+        return await self.database[symbol_collection].insert_many(documents, ordered=ordered)
 
     async def insert_one(self, symbol_collection: str, document: dict[str, Any]) -> None:
         return await self.database[symbol_collection].insert_one(document)
@@ -54,7 +54,7 @@ class NoopSymbolicMemory(SymbolicMemory):
     ) -> Optional[dict[str, Any]]:
         pass
 
-    async def insert(self, symbol_collection: str, documents: list[dict[str, Any]]) -> None:
+    async def insert(self, symbol_collection: str, documents: list[dict[str, Any]], ordered: bool = True) -> None:
         pass
 
     async def insert_one(self, symbol_collection: str, document: dict[str, Any]) -> None:
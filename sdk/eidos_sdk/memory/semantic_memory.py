@@ -13,6 +13,9 @@ class SymbolicMemory(ABC):
     of symbols, providing a high-level interface to store and retrieve symbolic information.
     """
 
+    # whether the contents are only visible to the process that wrote them, so that workers of a server can not share it
+    process_local: bool = False
+
     @abstractmethod
     def start(self):
         """
@@ -51,6 +54,7 @@ class SymbolicMemory(ABC):
         projection: Union[List[str], Dict[str, int]] = None,
         sort: dict = None,
         skip: int = None,
+        limit: int = None,
     ) -> AsyncIterable[dict[str, Any]]:
         """
         Searches for symbols within a specified collection that match the given query.
@@ -64,6 +68,7 @@ class SymbolicMemory(ABC):
             sort (dict): The fields to sort the results by. The key is the field to sort by, and the value is the direction
                 to sort by. A value of 1 will sort in ascending order, and a value of -1 will sort in descending order.
             skip (int): The number of results to skip.
+            limit (int): The maximum number of results to return.
 
         Returns:
             Iterable[dict[str, Any]]: A list of symbols that match the query, each represented as a dictionary.
@@ -88,14 +93,29 @@ class SymbolicMemory(ABC):
         """
         pass
 
+    async def create_index(self, symbol_collection: str, keys: Dict[str, int], unique: bool = False) -> None:
+        """
+        Creates an index on the specified collection if it does not already exist. Implementations which do not
+        support indexes may ignore this.
+
+        Args:
+            symbol_collection (str): The name of the collection to index.
+            keys (Dict[str, int]): The fields to index, in order. A value of 1 indexes the field in ascending order,
+                and a value of -1 in descending order.
+            unique (bool): Whether the index should reject documents with duplicate keys.
+        """
+        pass
+
     @abstractmethod
-    async def insert(self, symbol_collection: str, documents: list[dict[str, Any]]) -> None:
+    async def insert(self, symbol_collection: str, documents: list[dict[str, Any]], ordered: bool = True) -> None:
         """
         Inserts multiple symbols into the specified collection.
 
         Args:
             symbol_collection (str): The name of the collection where symbols will be inserted.
             documents (list[dict[str, Any]]): A list of symbols to insert, each represented as a dictionary.
+            ordered (bool): Whether to stop at the first document which can not be inserted (e.g. a duplicate key).
+                Otherwise the remaining documents are still inserted before the error is raised.
 
         Returns:
             None
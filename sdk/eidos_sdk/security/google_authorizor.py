@@ -1,14 +1,13 @@
 from typing import List
 
-import httpx
 import os
-from pydantic import BaseModel, Field
+from pydantic import Field
 
-from eidos_sdk.security.jwt_middleware import BaseJWTMiddleware
+from eidos_sdk.security.jwt_middleware import BaseJWTMiddleware, BaseJWTMiddlewareSpec
 from eidos_sdk.system.reference_model import Specable
 
 
-class GoogleJWTMiddlewareSpec(BaseModel):
+class GoogleJWTMiddlewareSpec(BaseJWTMiddlewareSpec):
     jwks_url: str = Field("https://www.googleapis.com/oauth2/v3/certs", description="The URL to fetch the JWKS from. Defaults to https://www.googleapis.com/oauth2/v3/certs")
     audience: str = Field(os.environ.get("GOOGLE_CLIENT_ID"), description="Your google client ID. Defaults to the environment variable GOOGLE_CLIENT_ID")
     issuer: str = Field(default="https://accounts.google.com", description="The issuer of the JWT. Defaults to https://accounts.google.com")
@@ -16,10 +15,8 @@ class GoogleJWTMiddlewareSpec(BaseModel):
 
 class GoogleJWTMiddleware(BaseJWTMiddleware, Specable[GoogleJWTMiddlewareSpec]):
 
-    async def get_signing_keys(self):
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(self.spec.jwks_url)
-            return resp.json()["keys"]
+    def get_jwks_url(self) -> str:
+        return self.spec.jwks_url
 
     async def get_audience_and_issuer(self):
         return self.spec.audience, self.spec.issuer
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from email.utils import parsedate_to_datetime
+from typing import List, Optional
+
+import httpx
+
+from eidos_sdk.util.logger import logger
+
+
+class JWKSCache:
+    """
+    The signing keys published at a JWKS url.
+
+    Keys are kept for as long as the response's Cache-Control max-age (less its Age) or Expires header allows, or for
+    default_ttl if it has neither, bounded by min_ttl and max_ttl. Once refresh_ahead of that time has passed, the next
+    lookup refreshes the keys in the background and is answered with the current ones, so lookups only wait for the
+    provider on the first fetch or once the keys have fully expired. Concurrent lookups share a single fetch.
+
+    Providers publish new keys before they sign with them, so a lookup for an unknown kid fetches the keys again, at
+    most once every refetch_interval so that tokens with made up kids cannot be used to flood the provider. When a
+    refresh fails the keys already fetched keep being used.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        default_ttl: float = 3600,
+        min_ttl: float = 60,
+        max_ttl: float = 86400,
+        refresh_ahead: float = 0.8,
+        refetch_interval: float = 60,
+        timeout: float = 10,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.url = url
+        self.default_ttl = default_ttl
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.refresh_ahead = refresh_ahead
+        self.refetch_interval = refetch_interval
+        self.timeout = timeout
+        self.transport = transport
+        self._keys: Optional[List[dict]] = None
+        self._fetched_at = 0.0
+        self._refresh_at = 0.0
+        self._expires_at = 0.0
+        self._fetch_task: Optional[asyncio.Task] = None
+
+    async def get_keys(self, kid: Optional[str] = None) -> List[dict]:
+        """Returns the keys with the given kid, or all keys if kid is None."""
+        now = time.monotonic()
+        if self._keys is None or now >= self._expires_at:
+            await self._refresh()
+        elif now >= self._refresh_at:
+            self._start_fetch()
+        if kid is not None and not self._find(kid) and now - self._fetched_at >= self.refetch_interval:
+            await self._refresh()
+        return self._find(kid) if kid is not None else list(self._keys)
+
+    def _find(self, kid: str) -> List[dict]:
+        return [key for key in self._keys if key.get("kid") == kid]
+
+    def _start_fetch(self) -> asyncio.Task:
+        if not self._fetch_task or self._fetch_task.done():
+            self._fetch_task = asyncio.create_task(self._fetch())
+            # failures are logged by _fetch, and background refreshes are not awaited
+            self._fetch_task.add_done_callback(lambda task: task.cancelled() or task.exception())
+        return self._fetch_task
+
+    async def _refresh(self):
+        try:
+            await self._start_fetch()
+        except Exception:
+            if self._keys is None:
+                raise
+
+    async def _fetch(self):
+        try:
+            async with httpx.AsyncClient(timeout=self.timeout, transport=self.transport) as client:
+                response = await client.get(self.url)
+                response.raise_for_status()
+                keys = response.json()["keys"]
+        except Exception:
+            logger.warning(f"Failed to fetch signing keys from {self.url}", exc_info=True)
+            # try again later, with the keys we have until then
+            now = time.monotonic()
+            self._fetched_at = now
+            self._refresh_at = now + self.refetch_interval
+            self._expires_at = max(self._expires_at, self._refresh_at)
+            raise
+        ttl = self._ttl(response.headers)
+        now = time.monotonic()
+        self._keys = keys
+        self._fetched_at = now
+        self._refresh_at = now + ttl * self.refresh_ahead
+        self._expires_at = now + ttl
+
+    def _ttl(self, headers: httpx.Headers) -> float:
+        directives = {}
+        for directive in headers.get("cache-control", "").split(","):
+            name, _, value = directive.strip().partition("=")
+            directives[name.lower()] = value.strip('"')
+        ttl = self.default_ttl
+        try:
+            if "no-store" in directives or "no-cache" in directives:
+                ttl = 0
+            elif "max-age" in directives:
+                ttl = float(directives["max-age"]) - float(headers.get("age", 0))
+            elif "expires" in headers:
+                date = parsedate_to_datetime(headers["date"]).timestamp() if "date" in headers else time.time()
+                ttl = parsedate_to_datetime(headers["expires"]).timestamp() - date
+        except (TypeError, ValueError):
+            logger.debug(f"Ignoring invalid cache headers from {self.url}")
+        return min(max(ttl, self.min_ttl), self.max_ttl)
@@ -1,25 +1,55 @@
+import hashlib
+import time
+
 from authlib.integrations.starlette_client import OAuth
 from pydantic import BaseModel, Field
 from starlette.config import Config
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
 from abc import ABC, abstractmethod
 from fastapi import Request, Response, FastAPI
 from jose import jwt, JWTError
 from starlette.responses import JSONResponse
 
+from eidos_sdk.security.jwks_cache import JWKSCache
 from eidos_sdk.security.security_manager import BaseTokenProcessor
 from eidos_sdk.system.reference_model import Specable
+from eidos_sdk.util.lru_cache import LRUCache
 
 
 class BaseJWTMiddlewareSpec(BaseModel):
     register_login_route: bool = Field(default=True, description="Whether or not to register the login route. Defaults to True")
+    jwks_cache_ttl: float = Field(
+        default=3600,
+        gt=0,
+        description="How long signing keys are kept when the JWKS response has no cache headers, in seconds.",
+    )
+    jwks_refetch_interval: float = Field(
+        default=60,
+        ge=0,
+        description="The minimum time between fetches of the JWKS for tokens with an unknown kid, in seconds.",
+    )
+    max_verified_tokens: int = Field(
+        default=10_000, ge=0, description="How many verified tokens are remembered until they expire. 0 turns this off."
+    )
 
 
 class BaseJWTMiddleware(BaseTokenProcessor, ABC, Specable[BaseJWTMiddlewareSpec]):
+    """
+    Verifies the bearer token of each request against the provider's signing keys.
+
+    Signing keys are cached (see JWKSCache), and the claims of verified tokens are remembered by the token's hash until
+    the token expires, so a token is only verified the first time it is seen.
+    """
+
+    _jwks: Optional[JWKSCache] = None
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.register_login_route = self.spec.register_login_route
+        self._verified_tokens: Optional[LRUCache[str, Tuple[dict, float]]] = (
+            LRUCache(self.spec.max_verified_tokens) if self.spec.max_verified_tokens > 0 else None
+        )
 
     def start(self, app: FastAPI):
         if self.register_login_route:
@@ -42,9 +72,19 @@ class BaseJWTMiddleware(BaseTokenProcessor, ABC, Specable[BaseJWTMiddlewareSpec]
         pass
 
     @abstractmethod
-    async def get_signing_keys(self):
+    def get_jwks_url(self) -> str:
+        """The url the provider publishes its signing keys at, which get_signing_keys fetches and caches them from."""
         pass
 
+    async def get_signing_keys(self, kid: Optional[str] = None):
+        if not self._jwks:
+            self._jwks = JWKSCache(
+                self.get_jwks_url(),
+                default_ttl=self.spec.jwks_cache_ttl,
+                refetch_interval=self.spec.jwks_refetch_interval,
+            )
+        return await self._jwks.get_keys(kid)
+
     @abstractmethod
     async def get_audience_and_issuer(self) -> tuple[str, str]:
         pass
@@ -59,11 +99,20 @@ class BaseJWTMiddleware(BaseTokenProcessor, ABC, Specable[BaseJWTMiddlewareSpec]
             return JSONResponse(status_code=401, content={"detail": "Authorization header missing"})
 
         token = auth_header.split(" ")[1]
+        token_hash = hashlib.sha256(token.encode()).hexdigest()
+        verified = self._verified_tokens.get(token_hash) if self._verified_tokens is not None else None
+        if verified and verified[1] > time.time():
+            request.state.payload = dict(verified[0])
+            return None
+
         try:
-            jwks = await self.get_signing_keys()
+            kid = jwt.get_unverified_header(token).get("kid")
+            jwks = await self.get_signing_keys(kid)
             audience, issuer = await self.get_audience_and_issuer()
             payload = jwt.decode(token, jwks, algorithms=self.get_algorithms(), audience=audience, issuer=issuer)
             request.state.payload = payload
+            if self._verified_tokens is not None and isinstance(payload.get("exp"), (int, float)):
+                self._verified_tokens.put(token_hash, (dict(payload), payload["exp"]))
 
             return None
         except JWTError as e:
@@ -1,5 +1,3 @@
-import httpx
-
 from eidos_sdk.security.jwt_middleware import BaseJWTMiddleware
 
 
@@ -9,10 +7,8 @@ class OKTAAuth(BaseJWTMiddleware):
     AUDIENCE = "your_api_audience"
     ISSUER = f"https://{OKTA_DOMAIN}/oauth2/default"
 
-    async def get_signing_keys(self):
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(self.JWKS_URL)
-            return resp.json()["keys"]
+    def get_jwks_url(self) -> str:
+        return self.JWKS_URL
 
     async def get_audience_and_issuer(self):
         return self.AUDIENCE, self.ISSUER
@@ -3,7 +3,6 @@ from typing import Optional
 from abc import ABC, abstractmethod
 from fastapi import Request, Response, FastAPI
 from pydantic import BaseModel
-from starlette.middleware.base import BaseHTTPMiddleware
 
 from eidos_sdk.system.reference_model import Specable, AnnotatedReference
 
@@ -31,7 +30,7 @@ class SecurityManagerSpec(BaseModel):
 
 
 class SecurityManager(Specable[SecurityManagerSpec]):
-    authorization_processor: BaseHTTPMiddleware
+    authorization_processor: BaseTokenProcessor
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
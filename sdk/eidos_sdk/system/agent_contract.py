@@ -9,6 +9,10 @@ class AsyncStateResponse(BaseModel):
     process_id: str = Field(..., description="The ID of the conversation.")
 
 
+class BatchResponse(BaseModel):
+    process_ids: typing.List[str] = Field(..., description="The IDs of the conversations, in the order of the inputs.")
+
+
 class StateSummary(BaseModel):
     process_id: str = Field(..., description="The ID of the conversation.")
     state: str = Field(..., description="The state of the conversation.")
@@ -1,35 +1,57 @@
 from __future__ import annotations
 
+import asyncio
+import functools
 import inspect
+import json
 import logging
+import math
+import time
 import typing
 from inspect import Parameter
 
-from fastapi import FastAPI, Request, BackgroundTasks, HTTPException
+import httpx
+from fastapi import FastAPI, Request, HTTPException, Query
 from fastapi.params import Body, Param
-from pydantic import BaseModel, Field, create_model
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel, Field, create_model, TypeAdapter, ValidationError
 from pydantic_core import PydanticUndefined
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, StreamingResponse
 
 from eidos_sdk.agent.agent import AgentState
 from eidos_sdk.agent_os import AgentOS
-from eidos_sdk.system.agent_contract import SyncStateResponse, AsyncStateResponse, ListProcessesResponse, StateSummary
+from eidos_sdk.cpu.streaming import stream_to
+from eidos_sdk.system.agent_contract import (
+    SyncStateResponse,
+    AsyncStateResponse,
+    ListProcessesResponse,
+    StateSummary,
+    BatchResponse,
+)
 from eidos_sdk.system.eidos_handler import EidosHandler, get_handlers
-from eidos_sdk.system.processes import ProcessDoc
+from eidos_sdk.system.job_executor import BatchTooLargeError, QueueFullError, PRIORITY_DEFAULT
+from eidos_sdk.system.processes import ProcessDoc, doc_events
 from eidos_sdk.util.json_util import model_to_json
 from eidos_sdk.util.logger import logger
 
+MAX_STATUS_WAIT = 60
+# how often a waiting status request re-reads the process, to see updates made by other workers
+STATUS_POLL_INTERVAL = 1
+
 
 class AgentController:
     name: str
     agent: object
     programs: typing.Dict[str, EidosHandler]
     actions: typing.Dict[str, EidosHandler]
+    _streaming_tasks: typing.Set[asyncio.Task]
 
     def __init__(self, name, agent):
         self.name = name
         self.programs = {}
         self.actions = {}
+        self._streaming_tasks = set()
+        self._body_adapters = {}
         self.agent = agent
         for handler in get_handlers(self.agent):
             if handler.extra["type"] == "program":
@@ -58,6 +80,18 @@ class AgentController:
                 },
                 description=handler.description(self.agent, handler),
             )
+            if handler.extra["type"] == "program":
+                app.add_api_route(
+                    f"{path}/batch",
+                    endpoint=self.process_batch(handler),
+                    methods=["POST"],
+                    tags=[self.name],
+                    responses={202: {"model": BatchResponse}},
+                    description=f"Starts a {handler_name} process for each input, with the body the {handler_name} "
+                    "program takes. The processes run in the background and their ids are returned in the order of "
+                    "the inputs. With the execution-mode header set to stream, the final state of each process is "
+                    "streamed as a line of NDJSON (with its index and status_code) as soon as it completes.",
+                )
 
         app.add_api_route(
             f"/agents/{self.name}/processes",
@@ -86,74 +120,37 @@ class AgentController:
     def process_action(self, handler: EidosHandler):
         async def run_program(
             request: Request,
-            background_tasks: BackgroundTasks,
             process_id: typing.Optional[str] = None,
             **kwargs,
         ):
-            callback = request.headers.get("callback-url")
+            callback = _callback_url(request)
             execution_mode = request.headers.get("execution-mode", "async" if callback else "sync").lower()
+            admitted = execution_mode not in ("sync", "stream")
+            if admitted:
+                priority = self._admit(request)
 
-            if not process_id:
-                if not handler.extra["type"] == "program":
-                    raise HTTPException(
-                        status_code=400,
-                        detail=f'Action "{handler.name}" is not an initializer, but no process_id was provided',
-                    )
-                process = await ProcessDoc.create(agent=self.name, state="processing", data=dict(action=handler.name))
-                process_id = process.record_id
-            else:
-                process = await self.get_latest_process_event(process_id)
-                if not process:
-                    raise HTTPException(status_code=404, detail="Process not found")
-                if process.state not in handler.extra["allowed_states"]:
-                    raise HTTPException(
-                        status_code=409,
-                        detail=f'Action "{handler.name}" cannot process state "{process.state}"',
-                    )
-                process = await process.update(
-                    agent=self.name, record_id=process_id, state="processing", data=dict(action=handler.name)
-                )
+            try:
+                process = await self.start_process(handler, process_id)
+            except BaseException:
+                if admitted:
+                    AgentOS.job_executor.release(self.name)
+                raise
+            process_id = process.record_id
 
             async def run_and_store_response():
-                try:
-                    sig = inspect.signature(handler.fn)
-                    if "process_id" in dict(sig.parameters):
-                        kwargs["process_id"] = process_id
-                    response = await handler.fn(self.agent, **kwargs)
-                    if isinstance(response, AgentState):
-                        state = response.name
-                        data = model_to_json(response.data)
-                    else:
-                        state = "terminated"
-                        data = model_to_json(response)
-                    doc = await process.update(
-                        state=state,
-                        data=data,
-                    )
-                except HTTPException as e:
-                    doc = await process.update(
-                        state="http_error",
-                        data=dict(detail=e.detail, status_code=e.status_code),
-                    )
-                    if e.status_code >= 500:
-                        logging.exception("Unhandled error raised by handler")
-                    else:
-                        logging.debug(f"Handler {handler.name} raised a http error", exc_info=True)
-                except Exception as e:
-                    doc = await process.update(
-                        state="unhandled_error",
-                        data=dict(error=str(e)),
-                    )
-                    logging.exception("Unhandled error raised by handler")
-                if callback:
-                    raise Exception("Not implemented")
-                return doc
+                return await self.run_handler(handler, process, kwargs, callback)
 
             if execution_mode == "sync":
                 state = await run_and_store_response()
                 return self.doc_to_response(state)
+            elif execution_mode == "stream":
+                return StreamingResponse(
+                    self.stream_response(run_and_store_response),
+                    media_type="text/event-stream",
+                    headers={"Cache-Control": "no-cache"},
+                )
             else:
-                background_tasks.add_task(run_and_store_response)
+                AgentOS.job_executor.submit(self.name, run_and_store_response, priority)
                 return JSONResponse(AsyncStateResponse(process_id=process_id).model_dump(), 202)
 
         logger.debug(f"Registering action {handler.name} for program {self.name}")
@@ -177,9 +174,225 @@ class AgentController:
         run_program.__signature__ = sig.replace(parameters=params.values())
         return run_program
 
-    async def get_process_info(self, process_id: str):
-        latest_record = await self.get_latest_process_event(process_id)
-        return self.doc_to_response(latest_record)
+    async def start_process(self, handler: EidosHandler, process_id: typing.Optional[str] = None) -> ProcessDoc:
+        """Creates the process a program runs in, or moves an existing process into processing for an action."""
+        if not process_id:
+            if not handler.extra["type"] == "program":
+                raise HTTPException(
+                    status_code=400,
+                    detail=f'Action "{handler.name}" is not an initializer, but no process_id was provided',
+                )
+            return await ProcessDoc.create(agent=self.name, state="processing", data=dict(action=handler.name))
+        else:
+            process = await self.get_latest_process_event(process_id)
+            if not process:
+                raise HTTPException(status_code=404, detail="Process not found")
+            if process.state not in handler.extra["allowed_states"]:
+                raise HTTPException(
+                    status_code=409,
+                    detail=f'Action "{handler.name}" cannot process state "{process.state}"',
+                )
+            return await process.update(
+                agent=self.name, record_id=process_id, state="processing", data=dict(action=handler.name)
+            )
+
+    def _body_type(self, handler: EidosHandler) -> typing.Tuple[typing.Any, typing.Callable[[typing.Any], dict]]:
+        """
+        Returns the type of the handler's request body and a function which turns a validated body into the handler's
+        keyword arguments. Like FastAPI, a lone body field which is not embedded is the body itself.
+        """
+        model: typing.Type[BaseModel] = handler.input_model_fn(self.agent, handler)
+        fields = model.model_fields
+        if len(fields) == 1 and not getattr(next(iter(fields.values())), "embed", False):
+            [field] = fields
+            return fields[field].annotation, lambda body: {field: body}
+        else:
+            return model, lambda body: {name: getattr(body, name) for name in fields}
+
+    async def call(
+        self, handler_name: str, body: typing.Any, process_id: typing.Optional[str] = None
+    ) -> typing.Tuple[typing.Any, int]:
+        """
+        Runs a program, or an action of the process if process_id is given, as a synchronous request to its endpoint
+        would, and returns the response body and status code. Lets agents on the same machine call each other without
+        going through http.
+        """
+        handler = (self.actions if process_id else self.programs).get(handler_name)
+        if not handler:
+            return dict(detail="Not Found"), 404
+        key = handler.extra["type"], handler_name
+        if key not in self._body_adapters:
+            body_type, to_kwargs = self._body_type(handler)
+            self._body_adapters[key] = TypeAdapter(body_type), to_kwargs
+        adapter, to_kwargs = self._body_adapters[key]
+        try:
+            kwargs = to_kwargs(adapter.validate_python(body))
+        except ValidationError as e:
+            return dict(detail=jsonable_encoder(e.errors(include_url=False))), 422
+        try:
+            process = await self.start_process(handler, process_id)
+        except HTTPException as e:
+            return dict(detail=e.detail), e.status_code
+        return self._doc_to_content(await self.run_handler(handler, process, kwargs))
+
+    def process_batch(self, handler: EidosHandler):
+        # each input is the body the program's own endpoint takes
+        item_type, to_kwargs = self._body_type(handler)
+
+        async def run_batch(request: Request, inputs: list):
+            callback = _callback_url(request)
+            execution_mode = request.headers.get("execution-mode", "async").lower()
+            priority = self._admit(request, len(inputs))
+            try:
+                processes = await ProcessDoc.create_many(
+                    [dict(agent=self.name, state="processing", data=dict(action=handler.name)) for _ in inputs]
+                )
+            except BaseException:
+                AgentOS.job_executor.release(self.name, len(inputs))
+                raise
+            completed = asyncio.Queue() if execution_mode in ("sync", "stream") else None
+            for index, (process, item) in enumerate(zip(processes, inputs)):
+                job = functools.partial(
+                    self._run_batch_item, completed, index, handler, process, to_kwargs(item), callback
+                )
+                AgentOS.job_executor.submit(self.name, job, priority)
+
+            if execution_mode == "stream":
+                return StreamingResponse(
+                    _ndjson(self._batch_results(completed, len(processes))), media_type="application/x-ndjson"
+                )
+            elif execution_mode == "sync":
+                results = [result async for result in self._batch_results(completed, len(processes))]
+                return JSONResponse(sorted(results, key=lambda result: result["index"]), 200)
+            else:
+                process_ids = [process.record_id for process in processes]
+                return JSONResponse(BatchResponse(process_ids=process_ids).model_dump(), 202)
+
+        sig = inspect.signature(run_batch)
+        params = dict(sig.parameters)
+        params["inputs"] = params["inputs"].replace(annotation=typing.Annotated[typing.List[item_type], Body()])
+        run_batch.__signature__ = sig.replace(parameters=params.values())
+        return run_batch
+
+    async def _run_batch_item(
+        self, completed: typing.Optional[asyncio.Queue], index: int, handler: EidosHandler, process: ProcessDoc, *args
+    ):
+        doc = None
+        try:
+            doc = await self.run_handler(handler, process, *args)
+        finally:
+            if completed:
+                completed.put_nowait((index, process, doc))
+
+    async def _batch_results(self, completed: asyncio.Queue, count: int):
+        for _ in range(count):
+            index, process, doc = await completed.get()
+            if doc:
+                content, status_code = self._doc_to_content(doc)
+            else:
+                content, status_code = dict(detail="Cancelled"), 503
+            yield {**content, "index": index, "status_code": status_code, "process_id": process.record_id}
+
+    async def run_handler(
+        self,
+        handler: EidosHandler,
+        process: ProcessDoc,
+        kwargs: typing.Dict[str, typing.Any],
+        callback: typing.Optional[str] = None,
+    ) -> ProcessDoc:
+        """Runs the handler for the process, records the resulting state and queues its callback, if any."""
+        try:
+            sig = inspect.signature(handler.fn)
+            if "process_id" in dict(sig.parameters):
+                kwargs["process_id"] = process.record_id
+            response = await handler.fn(self.agent, **kwargs)
+            if isinstance(response, AgentState):
+                state = response.name
+                data = model_to_json(response.data)
+            else:
+                state = "terminated"
+                data = model_to_json(response)
+            doc = await process.update(
+                state=state,
+                data=data,
+            )
+        except HTTPException as e:
+            doc = await process.update(
+                state="http_error",
+                data=dict(detail=e.detail, status_code=e.status_code),
+            )
+            if e.status_code >= 500:
+                logging.exception("Unhandled error raised by handler")
+            else:
+                logging.debug(f"Handler {handler.name} raised a http error", exc_info=True)
+        except Exception as e:
+            doc = await process.update(
+                state="unhandled_error",
+                data=dict(error=str(e)),
+            )
+            logging.exception("Unhandled error raised by handler")
+        if callback:
+            content, status_code = self._doc_to_content(doc)
+            payload = content if status_code == 200 else dict(status_code=status_code, **content)
+            await AgentOS.callback_dispatcher.enqueue(callback, self.name, process.record_id, payload)
+        return doc
+
+    def _admit(self, request: Request, count: int = 1) -> int:
+        """
+        Returns the job priority of the request, or raises if the job executor can not take count more jobs (413 if it
+        never could, 429 if it can not right now). Checked before the process is touched so that a rejected request
+        leaves no trace. The jobs are reserved, so they must be submitted or released.
+        """
+        try:
+            priority = int(request.headers.get("job-priority", PRIORITY_DEFAULT))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="job-priority must be an integer")
+        try:
+            AgentOS.job_executor.check_capacity(self.name, count)
+        except BatchTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except QueueFullError as e:
+            headers = {"Retry-After": str(e.retry_after)} if e.retry_after is not None else None
+            raise HTTPException(status_code=429 if e.retry_after is not None else 503, detail=str(e), headers=headers)
+        return priority
+
+    async def get_process_info(
+        self,
+        process_id: str,
+        wait: typing.Annotated[
+            typing.Optional[str],
+            Query(
+                description="If the process is processing, wait up to this long (e.g. 30s, 500ms or 30, in seconds, "
+                f"at most {MAX_STATUS_WAIT}s) for it to reach its next state before responding."
+            ),
+        ] = None,
+    ):
+        if not wait:
+            return self.doc_to_response(await self.get_latest_process_event(process_id))
+        return self.doc_to_response(await self.wait_for_state(process_id, _parse_duration(wait)))
+
+    async def wait_for_state(self, process_id: str, timeout: float) -> typing.Optional[ProcessDoc]:
+        """
+        Returns the process once it is no longer processing, or as it is after timeout seconds.
+
+        Writes made by this worker wake the request immediately, writes made by other workers are seen when the
+        process is re-read, every STATUS_POLL_INTERVAL seconds.
+        """
+        deadline = time.monotonic() + min(timeout, MAX_STATUS_WAIT)
+        # subscribed before reading so that an update between the read and the wait is not missed
+        with doc_events.subscribe(ProcessDoc.collection, process_id) as changed:
+            latest_record = await self.get_latest_process_event(process_id)
+            while latest_record and latest_record.state == "processing":
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(changed.wait(), min(remaining, STATUS_POLL_INTERVAL))
+                except asyncio.TimeoutError:
+                    pass
+                changed.clear()
+                latest_record = await self.get_latest_process_event(process_id)
+        return latest_record
 
     async def list_processes(
         self,
@@ -218,18 +431,46 @@ class AgentController:
             200,
         )
 
+    async def stream_response(self, run_and_store_response: typing.Callable[[], typing.Awaitable[ProcessDoc]]):
+        """
+        Runs the handler while relaying the incremental events of its threads as server-sent events. The stream ends
+        with a "state" event carrying the same body a synchronous request would return, or an "error" event.
+
+        The handler runs in its own task so that its final state is still persisted if the client disconnects.
+        """
+        queue = asyncio.Queue()
+
+        async def run_with_sink():
+            with stream_to(queue):
+                try:
+                    return await run_and_store_response()
+                finally:
+                    queue.put_nowait(None)
+
+        task = asyncio.create_task(run_with_sink())
+        self._streaming_tasks.add(task)
+        task.add_done_callback(self._streaming_tasks.discard)
+
+        while (event := await queue.get()) is not None:
+            yield _sse(event.event, event.model_dump_json(exclude={"event"}))
+        content, status_code = self._doc_to_content(await task)
+        if status_code == 200:
+            yield _sse("state", json.dumps(content))
+        else:
+            yield _sse("error", json.dumps(dict(status_code=status_code, **content)))
+
     def doc_to_response(self, latest_record: ProcessDoc):
+        return JSONResponse(*self._doc_to_content(latest_record))
+
+    def _doc_to_content(self, latest_record: ProcessDoc) -> typing.Tuple[dict, int]:
         if not latest_record:
-            return JSONResponse(dict(detail="Process not found"), 404)
+            return dict(detail="Process not found"), 404
         elif latest_record.state == "unhandled_error":
-            return JSONResponse(latest_record.data, 500)
+            return latest_record.data, 500
         elif latest_record.state == "http_error":
-            return JSONResponse(
-                dict(detail=latest_record.data["detail"]),
-                latest_record.data["status_code"],
-            )
+            return dict(detail=latest_record.data["detail"]), latest_record.data["status_code"]
         else:
-            return JSONResponse(
+            return (
                 SyncStateResponse(
                     process_id=latest_record.record_id,
                     state=latest_record.state,
@@ -257,3 +498,33 @@ class AgentController:
             Field(..., description=fields["data"][1].description),
         )
         return create_model(f"{handler.name.capitalize()}ResponseModel", **fields)
+
+
+def _callback_url(request: Request) -> typing.Optional[str]:
+    callback = request.headers.get("callback-url")
+    if callback and httpx.URL(callback).scheme not in ("http", "https"):
+        raise HTTPException(status_code=400, detail="callback-url must be an http(s) url")
+    return callback
+
+
+def _parse_duration(duration: str) -> float:
+    try:
+        if duration.endswith("ms"):
+            seconds = float(duration[:-2]) / 1000
+        else:
+            seconds = float(duration.removesuffix("s"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f'Invalid duration "{duration}"')
+    # nan and inf would slip past the MAX_STATUS_WAIT cap
+    if not math.isfinite(seconds) or seconds < 0:
+        raise HTTPException(status_code=400, detail=f'Invalid duration "{duration}"')
+    return seconds
+
+
+async def _ndjson(results: typing.AsyncIterator[dict]):
+    async for result in results:
+        yield json.dumps(result) + "\n"
+
+
+def _sse(event: str, data: str) -> str:
+    return f"event: {event}\ndata: {data}\n\n"
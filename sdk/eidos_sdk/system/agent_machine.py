@@ -5,10 +5,15 @@ from typing import List, Optional
 
 from eidos_sdk.memory.agent_memory import AgentMemory
 from .agent_controller import AgentController
+from .callback_dispatcher import CallbackDispatcher
+from .job_executor import JobExecutor
 from .reference_model import AnnotatedReference, Specable
 from .resources.agent_resource import AgentResource
 from .resources.resources_base import Resource
+from .task_claims import release_stale_claims
 from ..agent_os import AgentOS
+from ..cpu.conversational_logic_unit import close_agent_session
+from ..cpu.llm.open_ai_scheduler import OpenAIScheduler
 from ..memory.file_memory import FileMemory
 from ..memory.semantic_memory import SymbolicMemory
 from ..memory.similarity_memory import SimilarityMemory
@@ -20,6 +25,15 @@ class MachineSpec(BaseModel):
     file_memory: AnnotatedReference[FileMemory] = Field(desciption="The File Memory implementation.")
     similarity_memory: AnnotatedReference[SimilarityMemory] = Field(description="The Vector Memory implementation.")
     security_manager: AnnotatedReference[SecurityManager] = Field(description="The Security Manager implementation.")
+    openai_scheduler: AnnotatedReference[OpenAIScheduler] = Field(
+        description="Schedules and rate limits the OpenAI requests made by the machine's agents."
+    )
+    job_executor: AnnotatedReference[JobExecutor] = Field(
+        description="Runs the programs and actions which agents execute in the background (async execution mode)."
+    )
+    callback_dispatcher: AnnotatedReference[CallbackDispatcher] = Field(
+        description="Delivers the final state of processes to their callback-url."
+    )
 
     def get_agent_memory(self):
         file_memory = self.file_memory.instantiate()
@@ -35,6 +49,9 @@ class MachineSpec(BaseModel):
 class AgentMachine(Specable[MachineSpec]):
     memory: AgentMemory
     security_manager: SecurityManager
+    openai_scheduler: OpenAIScheduler
+    job_executor: JobExecutor
+    callback_dispatcher: CallbackDispatcher
     agent_controllers: List[AgentController]
     app: Optional[FastAPI]
 
@@ -49,6 +66,13 @@ class AgentMachine(Specable[MachineSpec]):
         self.agent_controllers = [AgentController(name, agent) for name, agent in agents.items()]
         self.app = None
         self.security_manager = self.spec.security_manager.instantiate()
+        self.openai_scheduler = self.spec.openai_scheduler.instantiate()
+        self.job_executor = self.spec.job_executor.instantiate()
+        self.callback_dispatcher = self.spec.callback_dispatcher.instantiate()
+
+    def get_controller(self, agent: str) -> Optional[AgentController]:
+        """Returns the controller of the agent, if this machine hosts it."""
+        return next((controller for controller in self.agent_controllers if controller.name == agent), None)
 
     async def start(self, app):
         if self.app:
@@ -56,13 +80,23 @@ class AgentMachine(Specable[MachineSpec]):
         for program in self.agent_controllers:
             await program.start(app)
         self.memory.start()
+        await release_stale_claims()
+        self.openai_scheduler.start()
+        self.job_executor.start()
+        self.callback_dispatcher.start()
+        app.add_api_route("/system/jobs", endpoint=self.job_executor.get_metrics, methods=["GET"], tags=["system"])
         self.app = app
 
-    def stop(self):
+    async def stop(self):
         if self.app:
+            # drain background jobs while the agents and memory they use are still available
+            await self.job_executor.stop()
+            await self.callback_dispatcher.stop()
+            await close_agent_session()
             for program in self.agent_controllers:
                 program.stop(self.app)
             self.memory.stop()
+            await self.openai_scheduler.stop()
             self.app = None
 
 
@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+from typing import Literal, Optional, Set
+
+import httpx
+from pydantic import BaseModel, Field
+
+from eidos_sdk.agent_os import AgentOS
+from eidos_sdk.system.processes import MongoDoc
+from eidos_sdk.system.reference_model import Specable
+from eidos_sdk.system.task_claims import claim_task
+from eidos_sdk.util.logger import logger
+
+_RETRYABLE_STATUS_CODES = {408, 425, 429}
+
+
+class CallbackDoc(MongoDoc):
+    """A callback in the outbox. Failed callbacks are kept for inspection, delivered ones until retention expires."""
+
+    collection = "callback_outbox"
+    url: str
+    agent: str
+    process_id: str
+    payload: dict
+    state: Literal["pending", "delivering", "delivered", "failed"] = "pending"
+    attempts: int = 0
+    next_attempt: float = 0
+    lease_until: float = 0
+    last_error: Optional[str] = None
+
+
+class CallbackDispatcherSpec(BaseModel):
+    max_connections: int = Field(default=20, gt=0, description="The size of the shared http connection pool.")
+    max_concurrent_deliveries: int = Field(default=20, gt=0, description="The maximum number of in flight callbacks.")
+    max_attempts: int = Field(default=8, gt=0, description="The number of attempts before a callback is abandoned.")
+    initial_backoff: float = Field(default=1, gt=0, description="The initial retry backoff, in seconds.")
+    max_backoff: float = Field(default=300, gt=0, description="The maximum retry backoff, in seconds.")
+    timeout: float = Field(default=10, gt=0, description="The timeout of each delivery attempt, in seconds.")
+    poll_interval: float = Field(
+        default=5, gt=0, description="How often the outbox is checked for callbacks left by other or previous workers."
+    )
+    retention: float = Field(
+        default=3600, ge=0, description="How long delivered callbacks are kept in the outbox, in seconds."
+    )
+
+
+class CallbackDispatcher(Specable[CallbackDispatcherSpec]):
+    """
+    Delivers the final state of processes started with a callback-url header.
+
+    Callbacks are written to an outbox in symbolic memory before they are attempted, so they survive restarts. They
+    are POSTed over a shared keep-alive connection pool with the same body a synchronous request would return (errors
+    also carry their status_code, as in the stream's error event) and an eidolon-delivery-id header receivers can
+    use to ignore duplicates, since delivery is at least once. Connection errors, timeouts, 408, 425, 429 and 5xx
+    responses are retried with jittered exponential backoff (honoring Retry-After), other responses are final.
+
+    A worker claims a callback by leasing it with an optimistic update, so callbacks found by the periodic outbox scan
+    (after a restart, or left behind by another worker) are only delivered by one worker at a time. The scan itself is
+    run by one worker per poll_interval (see claim_task). Delivered callbacks are marked rather than removed so that a
+    late claim conflicts instead of recreating them, and are pruned by the scan once they are older than retention.
+    """
+
+    def __init__(self, spec: CallbackDispatcherSpec = None):
+        super().__init__(spec or CallbackDispatcherSpec())
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._poller: Optional[asyncio.Task] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if not self._client:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.spec.max_connections,
+                    max_keepalive_connections=self.spec.max_connections,
+                ),
+                timeout=self.spec.timeout,
+            )
+        return self._client
+
+    def start(self):
+        self._poller = asyncio.create_task(self._poll())
+
+    async def stop(self):
+        if self._poller:
+            self._poller.cancel()
+            self._poller = None
+        # callbacks which are waiting to be retried stay in the outbox and are picked up by the next worker to start
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+
+    async def enqueue(self, url: str, agent: str, process_id: str, payload: dict) -> CallbackDoc:
+        """Writes a callback to the outbox and starts delivering it."""
+        doc = await CallbackDoc.create(
+            url=url, agent=agent, process_id=process_id, payload=payload, next_attempt=time.time()
+        )
+        self._schedule(doc, 0)
+        return doc
+
+    async def deliver_due(self):
+        """Delivers the callbacks in the outbox which are due, including those whose delivery lease has expired."""
+        now = time.time()
+        expired = dict(state="delivered", next_attempt={"$lte": now - self.spec.retention})
+        async for doc in AgentOS.symbolic_memory.find(CallbackDoc.collection, expired, projection=dict(_id=1)):
+            await AgentOS.symbolic_memory.delete(CallbackDoc.collection, {"_id": doc["_id"]})
+        for query in (
+            dict(state="pending", next_attempt={"$lte": now}),
+            dict(state="delivering", lease_until={"$lte": now}),
+        ):
+            async for doc in AgentOS.symbolic_memory.find(CallbackDoc.collection, query):
+                self._schedule(CallbackDoc.model_validate(doc), 0)
+
+    def _schedule(self, doc: CallbackDoc, delay: float):
+        task = asyncio.create_task(self._deliver(doc, delay))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _poll(self):
+        while True:
+            try:
+                # workers sharing the outbox take turns scanning it
+                if await claim_task("callback_outbox_scan", self.spec.poll_interval):
+                    await self.deliver_due()
+            except Exception:
+                logger.exception("Failed to scan the callback outbox")
+            await asyncio.sleep(self.spec.poll_interval)
+
+    async def _deliver(self, doc: CallbackDoc, delay: float):
+        if delay:
+            await asyncio.sleep(delay)
+        if not self._semaphore:
+            self._semaphore = asyncio.Semaphore(self.spec.max_concurrent_deliveries)
+        async with self._semaphore:
+            try:
+                # the lease covers the attempt and the time spent updating the outbox afterwards
+                doc = await doc.update(state="delivering", lease_until=time.time() + 2 * self.spec.timeout)
+            except ValueError:
+                logger.debug(f"Callback {doc.record_id} was claimed by another worker")
+                return
+
+            retry_after = None
+            try:
+                response = await self.client.post(
+                    doc.url,
+                    json=doc.payload,
+                    headers={"eidolon-delivery-id": doc.record_id, "eidolon-process-id": doc.process_id},
+                )
+                if response.is_success:
+                    await doc.update(state="delivered", attempts=doc.attempts + 1, next_attempt=time.time())
+                    logger.debug(f"Delivered callback for process {doc.process_id} to {doc.url}")
+                    return
+                error = f"{response.status_code} response"
+                retryable = response.status_code in _RETRYABLE_STATUS_CODES or response.status_code >= 500
+                retry_after = response.headers.get("retry-after")
+            except httpx.TransportError as e:
+                error = f"{e.__class__.__name__}: {e}"
+                retryable = True
+
+            attempts = doc.attempts + 1
+            if not retryable or attempts >= self.spec.max_attempts:
+                logger.warning(f"Giving up on callback for process {doc.process_id} to {doc.url} ({error})")
+                await doc.update(state="failed", attempts=attempts, last_error=error)
+                return
+            backoff = self._backoff(doc.attempts, retry_after)
+            logger.info(f"Callback for process {doc.process_id} failed ({error}), retrying in {backoff:.2f}s")
+            doc = await doc.update(
+                state="pending", attempts=attempts, last_error=error, next_attempt=time.time() + backoff
+            )
+        self._schedule(doc, backoff)
+
+    def _backoff(self, attempt: int, retry_after: Optional[str]) -> float:
+        try:
+            return min(float(retry_after), self.spec.max_backoff)
+        except (TypeError, ValueError):
+            delay = min(self.spec.initial_backoff * 2**attempt, self.spec.max_backoff)
+            return delay * random.uniform(0.5, 1.5)
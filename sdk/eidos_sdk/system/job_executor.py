@@ -0,0 +1,262 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import statistics
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from pydantic import BaseModel, Field
+
+from eidos_sdk.system.reference_model import Specable
+from eidos_sdk.util.logger import logger
+
+PRIORITY_DEFAULT = 0
+
+
+class QueueFullError(Exception):
+    """Raised when a job is rejected because the executor's queue is full or it is shutting down."""
+
+    def __init__(self, message: str, retry_after: Optional[int] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class BatchTooLargeError(Exception):
+    """Raised when a batch has more jobs than the executor could ever admit at once, so retrying will not help."""
+
+    def __init__(self, message: str, limit: int):
+        super().__init__(message)
+        self.limit = limit
+
+
+class JobExecutorSpec(BaseModel):
+    max_workers: int = Field(default=32, gt=0, description="The maximum number of jobs running at once.")
+    max_queue_size: int = Field(
+        default=1000, ge=0, description="The maximum number of jobs waiting for a worker. Further jobs are rejected."
+    )
+    max_batch_size: int = Field(
+        default=100, gt=0, description="The maximum number of inputs in one batch request. Larger batches are rejected."
+    )
+    agent_concurrency: Dict[str, int] = Field(
+        default={}, description="The maximum number of jobs running at once for specific agents."
+    )
+    default_agent_concurrency: Optional[int] = Field(
+        default=None, gt=0, description="The maximum number of jobs running at once for other agents, if any."
+    )
+    drain_timeout: float = Field(
+        default=30, ge=0, description="The number of seconds to wait for jobs to finish when the machine stops."
+    )
+    retry_after: int = Field(default=1, ge=0, description="The Retry-After sent with rejected requests, in seconds.")
+
+
+@dataclass(order=True)
+class _Job:
+    priority: int
+    seq: int
+    agent: str = field(compare=False)
+    fn: Callable[[], Awaitable] = field(compare=False)
+    submitted: float = field(compare=False)
+
+
+@dataclass
+class JobExecutorMetrics:
+    submitted: int = 0
+    rejected: int = 0
+    completed: int = 0
+    failed: int = 0
+    cancelled: int = 0
+    max_wait: float = 0
+    wait_times: Deque[float] = field(default_factory=lambda: deque(maxlen=1000))
+
+
+class JobExecutor(Specable[JobExecutorSpec]):
+    """
+    Runs the machine's background jobs (async mode program and action executions) on a bounded pool of workers.
+
+    Waiting jobs are kept in a queue per agent and each free worker takes the waiting job with the lowest priority
+    (then the oldest) among the agents which are under their concurrency quota. Admission is checked separately with
+    check_capacity, before a request touches its process, so a rejected request leaves no trace. check_capacity
+    reserves room for the jobs until they are submitted (or released, if the request fails before submitting them), so
+    a burst of requests can not all be admitted against the same free capacity while their processes are created.
+
+    When the machine stops the executor stops admitting jobs and drains its queue for up to drain_timeout seconds
+    before cancelling whatever is left.
+    """
+
+    def __init__(self, spec: JobExecutorSpec = None):
+        super().__init__(spec or JobExecutorSpec())
+        self.metrics = JobExecutorMetrics()
+        self._queues: Dict[str, List[_Job]] = {}
+        self._running: Dict[str, int] = {}
+        self._reserved: Dict[str, int] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._counter = itertools.count()
+        self._accepting = True
+        self._idle: Optional[asyncio.Event] = None
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    @property
+    def reserved(self) -> int:
+        return sum(self._reserved.values())
+
+    @property
+    def running(self) -> int:
+        return len(self._tasks)
+
+    def start(self):
+        self._accepting = True
+
+    async def stop(self):
+        """Stops admitting jobs and waits for the queued and running jobs, cancelling any left after drain_timeout."""
+        self._accepting = False
+        if self.queue_depth or self._tasks:
+            logger.info(f"Draining {self.queue_depth} queued and {self.running} running jobs")
+            try:
+                await asyncio.wait_for(self._get_idle().wait(), self.spec.drain_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(
+                    f"Cancelling {self.queue_depth} queued and {self.running} running jobs after "
+                    f"{self.spec.drain_timeout}s"
+                )
+        self.metrics.cancelled += self.queue_depth
+        self._queues.clear()
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def check_capacity(self, agent: str, count: int = 1):
+        """
+        Reserves room for count jobs for the agent, or raises QueueFullError if they would be rejected. The reservation
+        is used by submit, call release for jobs which will not be submitted after all. Raises BatchTooLargeError if
+        count is more than max_batch_size or than the executor could hold for the agent even when idle.
+        """
+        limit = min(self.spec.max_batch_size, self.capacity(agent))
+        if count > limit:
+            self.metrics.rejected += count
+            raise BatchTooLargeError(f"Batch of {count} jobs is larger than the limit of {limit}", limit)
+        if not self._accepting:
+            self.metrics.rejected += count
+            raise QueueFullError("Server is shutting down")
+        # the jobs which can start right away do not need room in the queue
+        free = self.spec.max_workers - self.running
+        quota = self.quota(agent)
+        if quota is not None:
+            free = min(free, quota - self._running.get(agent, 0))
+        if self.queue_depth + self.reserved + count - max(free, 0) > self.spec.max_queue_size:
+            self.metrics.rejected += count
+            raise QueueFullError("Too many queued jobs", retry_after=self.spec.retry_after)
+        self._reserved[agent] = self._reserved.get(agent, 0) + count
+
+    def release(self, agent: str, count: int = 1):
+        """Releases room reserved by check_capacity for jobs which will not be submitted."""
+        reserved = self._reserved.get(agent, 0) - count
+        if reserved > 0:
+            self._reserved[agent] = reserved
+        else:
+            self._reserved.pop(agent, None)
+
+    def submit(self, agent: str, fn: Callable[[], Awaitable], priority: int = PRIORITY_DEFAULT):
+        """
+        Queues fn to run once a worker is free and the agent is under its quota. Lower priorities run first.
+
+        Capacity is not checked here, call check_capacity first. The job takes the place of one of the agent's
+        reserved jobs, if any.
+        """
+        self.release(agent)
+        job = _Job(priority, next(self._counter), agent, fn, time.monotonic())
+        heapq.heappush(self._queues.setdefault(agent, []), job)
+        self.metrics.submitted += 1
+        self._dispatch()
+
+    def quota(self, agent: str) -> Optional[int]:
+        return self.spec.agent_concurrency.get(agent, self.spec.default_agent_concurrency)
+
+    def capacity(self, agent: str) -> int:
+        """The most jobs the agent can have running and queued at once."""
+        quota = self.quota(agent)
+        workers = self.spec.max_workers if quota is None else min(self.spec.max_workers, quota)
+        return workers + self.spec.max_queue_size
+
+    def get_metrics(self) -> dict:
+        waits = list(self.metrics.wait_times)
+        return dict(
+            queue_depth=self.queue_depth,
+            reserved=self.reserved,
+            running=self.running,
+            submitted=self.metrics.submitted,
+            rejected=self.metrics.rejected,
+            completed=self.metrics.completed,
+            failed=self.metrics.failed,
+            cancelled=self.metrics.cancelled,
+            wait_time=dict(
+                mean=statistics.mean(waits) if waits else 0,
+                p95=statistics.quantiles(waits, n=20)[-1] if len(waits) > 1 else sum(waits),
+                max=self.metrics.max_wait,
+            ),
+            agents={
+                agent: dict(queued=len(self._queues.get(agent, [])), running=self._running.get(agent, 0))
+                for agent in self._queues.keys() | self._running.keys()
+            },
+        )
+
+    def _next_job(self) -> Optional[_Job]:
+        best: Optional[Tuple[_Job, str]] = None
+        for agent, queue in self._queues.items():
+            if not queue:
+                continue
+            quota = self.quota(agent)
+            if quota is not None and self._running.get(agent, 0) >= quota:
+                continue
+            if best is None or queue[0] < best[0]:
+                best = queue[0], agent
+        if best is None:
+            return None
+        job = heapq.heappop(self._queues[best[1]])
+        if not self._queues[best[1]]:
+            del self._queues[best[1]]
+        return job
+
+    def _dispatch(self):
+        while self.running < self.spec.max_workers and (job := self._next_job()):
+            wait = time.monotonic() - job.submitted
+            self.metrics.wait_times.append(wait)
+            self.metrics.max_wait = max(self.metrics.max_wait, wait)
+            self._running[job.agent] = self._running.get(job.agent, 0) + 1
+            task = asyncio.create_task(self._run(job))
+            self._tasks.add(task)
+            if self._idle:
+                self._idle.clear()
+
+    async def _run(self, job: _Job):
+        try:
+            await job.fn()
+            self.metrics.completed += 1
+        except asyncio.CancelledError:
+            self.metrics.cancelled += 1
+            raise
+        except Exception:
+            self.metrics.failed += 1
+            logger.exception(f"Background job for agent {job.agent} failed")
+        finally:
+            self._tasks.discard(asyncio.current_task())
+            self._running[job.agent] -= 1
+            if not self._running[job.agent]:
+                del self._running[job.agent]
+            self._dispatch()
+            if not self._tasks and not self.queue_depth and self._idle:
+                self._idle.set()
+
+    def _get_idle(self) -> asyncio.Event:
+        if not self._idle:
+            self._idle = asyncio.Event()
+        if not self._tasks and not self.queue_depth:
+            self._idle.set()
+        return self._idle
@@ -1,5 +1,7 @@
+import asyncio
+from contextlib import contextmanager
 from datetime import datetime
-from typing import ClassVar, Any
+from typing import ClassVar, Any, Dict, Set, Tuple, Iterator, List
 
 import bson
 from pydantic import BaseModel
@@ -8,6 +10,38 @@ from pymongo.errors import DuplicateKeyError
 from eidos_sdk.agent_os import AgentOS
 
 
+class DocEvents:
+    """
+    In-process notifications of MongoDoc writes, so that readers can wait for a document to change rather than poll.
+
+    Only writes made by this process are published. Readers which need to see writes from other workers should also
+    re-read the document periodically.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[Tuple[str, str], Set[asyncio.Event]] = {}
+
+    @contextmanager
+    def subscribe(self, collection: str, record_id: str) -> Iterator[asyncio.Event]:
+        """Yields an event which is set whenever the document is written. Clear it once the change is handled."""
+        key = collection, record_id
+        event = asyncio.Event()
+        self._subscribers.setdefault(key, set()).add(event)
+        try:
+            yield event
+        finally:
+            self._subscribers[key].discard(event)
+            if not self._subscribers[key]:
+                del self._subscribers[key]
+
+    def publish(self, collection: str, record_id: str):
+        for event in self._subscribers.get((collection, record_id), ()):
+            event.set()
+
+
+doc_events = DocEvents()
+
+
 class MongoDoc(BaseModel, extra="allow"):
     collection: ClassVar[str]
     created: str = None
@@ -26,7 +60,7 @@ class MongoDoc(BaseModel, extra="allow"):
             return None
 
     @classmethod
-    async def create(cls, **data):
+    def _new(cls, data: dict):
         t = datetime.now().isoformat()
         if "created" not in data:
             data["created"] = t
@@ -34,10 +68,25 @@ class MongoDoc(BaseModel, extra="allow"):
             data["updated"] = t
         if "_id" not in data:
             data["_id"] = str(bson.ObjectId())
-        doc = cls(**data)
+        return cls(**data)
+
+    @classmethod
+    async def create(cls, **data):
+        doc = cls._new(data)
         await AgentOS.symbolic_memory.insert_one(cls.collection, doc.model_dump())
+        doc_events.publish(cls.collection, doc.record_id)
         return doc
 
+    @classmethod
+    async def create_many(cls, data: List[dict]):
+        """Creates a document for each dict of fields with a single insert."""
+        docs = [cls._new(dict(d)) for d in data]
+        if docs:
+            await AgentOS.symbolic_memory.insert(cls.collection, [doc.model_dump() for doc in docs])
+        for doc in docs:
+            doc_events.publish(cls.collection, doc.record_id)
+        return docs
+
     async def update(self, **data):
         data = dict(**data, updated=datetime.now().isoformat())
         query = {"_id": self.record_id, "updated": self.updated}
@@ -45,6 +94,7 @@ class MongoDoc(BaseModel, extra="allow"):
             await AgentOS.symbolic_memory.upsert_one(self.collection, query=query, document=data)
         except DuplicateKeyError:
             raise ValueError(f"{self.__class__.__name__} record {self.record_id} has been updated since last read")
+        doc_events.publish(self.collection, self.record_id)
         dump = self.model_dump()
         dump.update(**data)
         return self.__class__.model_validate(dump)
@@ -0,0 +1,103 @@
+import asyncio
+import os
+import socket
+import time
+from typing import Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from eidos_sdk.agent_os import AgentOS
+from eidos_sdk.system.processes import MongoDoc
+
+# claims expire a little before the period ends, so the worker which ran a task can claim it again on its next tick
+_EXPIRY_FACTOR = 0.9
+
+
+class TaskClaim(MongoDoc):
+    """Which worker runs a periodic background task until the claim expires. Its _id is the name of the task."""
+
+    collection = "task_claims"
+    worker: str
+    expires: float
+    completed: Optional[float] = None
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+async def claim_task(task: str, period: float) -> bool:
+    """
+    Claims a periodic background task for the current period. Returns whether this worker should run the task now.
+
+    Every worker sharing the symbolic memory (forked workers of a server, or servers on other hosts) may try to claim a
+    task each period, and exactly one succeeds, since claims are written with the same optimistic concurrency as any
+    other MongoDoc. Workers with process-local symbolic memory each get their own claims, which is what they need
+    since they do not share the state the task maintains either.
+    """
+    now = time.time()
+    claim = await TaskClaim.find(query={"_id": task})
+    try:
+        if not claim:
+            await TaskClaim.create(_id=task, worker=worker_id(), expires=now + period * _EXPIRY_FACTOR)
+        elif claim.expires <= now:
+            await claim.update(worker=worker_id(), expires=now + period * _EXPIRY_FACTOR)
+        else:
+            return False
+    except (DuplicateKeyError, ValueError):
+        # another worker claimed it first
+        return False
+    return True
+
+
+async def complete_task(task: str):
+    """Records that a run of the task finished, for the workers waiting on it with wait_for_task."""
+    claim = await TaskClaim.find(query={"_id": task})
+    if claim:
+        try:
+            await claim.update(completed=time.time())
+        except ValueError:
+            # claimed again in the meantime, which keeps the previous completion
+            pass
+
+
+async def wait_for_task(task: str, poll_interval: float = 1) -> bool:
+    """
+    Waits until a task claimed by another worker has completed at least once, so that a worker losing the claim on a
+    cold start does not go on with the state the task has yet to build. Returns False, without waiting for completion,
+    if the task is unclaimed or its claim expires first (so the caller should try to claim it again).
+    """
+    while True:
+        claim = await TaskClaim.find(query={"_id": task})
+        if claim and claim.completed is not None:
+            return True
+        if not claim or claim.expires <= time.time():
+            return False
+        await asyncio.sleep(poll_interval)
+
+
+async def release_stale_claims():
+    """
+    Expires the claims held by workers of this host which are no longer running, so that a restarted server runs its
+    tasks right away instead of waiting out its previous run's claims. Claims held by other hosts expire as usual.
+    """
+    host = socket.gethostname()
+    async for doc in AgentOS.symbolic_memory.find(TaskClaim.collection, {}):
+        claim = TaskClaim.model_validate(doc)
+        claim_host, _, pid = claim.worker.rpartition(":")
+        if claim_host == host and claim.expires > time.time() and not _is_running(int(pid)):
+            try:
+                await claim.update(expires=0)
+            except ValueError:
+                # another worker updated it first
+                pass
+
+
+def _is_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
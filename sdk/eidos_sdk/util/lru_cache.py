@@ -0,0 +1,59 @@
+from collections import OrderedDict
+from typing import Callable, Generic, TypeVar, Optional, Hashable
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class LRUCache(Generic[K, V]):
+    """
+    A minimal least-recently-used cache. Reading or writing a key marks it as most recently used, and the least
+    recently used entries are evicted once the cache grows past max_size entries, or past max_weight if a weigher is
+    given (in which case the weight of the cache is the sum of the weights of its values).
+    """
+
+    def __init__(self, max_size: int, max_weight: Optional[int] = None, weigher: Optional[Callable[[V], int]] = None):
+        if max_size <= 0:
+            raise ValueError("max_size must be positive")
+        if (max_weight is None) != (weigher is None):
+            raise ValueError("max_weight and weigher must be given together")
+        self.max_size = max_size
+        self.max_weight = max_weight
+        self.weigher = weigher
+        self.weight = 0
+        self._data: OrderedDict[K, V] = OrderedDict()
+
+    def get(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        try:
+            self._data.move_to_end(key)
+        except KeyError:
+            return default
+        return self._data[key]
+
+    def put(self, key: K, value: V):
+        self.pop(key)
+        self._data[key] = value
+        self.weight += self._weigh(value)
+        while len(self._data) > self.max_size or (self.max_weight is not None and self.weight > self.max_weight):
+            _, evicted = self._data.popitem(last=False)
+            self.weight -= self._weigh(evicted)
+
+    def pop(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        if key not in self._data:
+            return default
+        value = self._data.pop(key)
+        self.weight -= self._weigh(value)
+        return value
+
+    def clear(self):
+        self._data.clear()
+        self.weight = 0
+
+    def _weigh(self, value: V) -> int:
+        return self.weigher(value) if self.weigher else 0
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
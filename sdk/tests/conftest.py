@@ -5,6 +5,7 @@ from typing import Iterable
 from unittest.mock import patch
 
 import pytest
+import pytest_asyncio
 from bson import ObjectId
 from fastapi import FastAPI
 from fastapi.testclient import TestClient
@@ -14,6 +15,7 @@ from vcr.request import Request as VcrRequest
 from vcr.stubs import httpx_stubs
 
 import eidos_sdk.system.processes as processes
+from eidos_sdk.agent_os import AgentOS
 from eidos_sdk.bin.agent_http_server import start_os
 from eidos_sdk.cpu.llm.open_ai_llm_unit import OpenAIGPT
 from eidos_sdk.memory.local_file_memory import LocalFileMemory
@@ -169,6 +171,21 @@ def symbolic_memory(mongo_symbolic_memory, local_symbolic_memory, pytestconfig):
         return mongo_symbolic_memory
 
 
+@pytest_asyncio.fixture
+async def os_symbolic_memory(symbolic_memory):
+    """
+    A fresh instance of the configured symbolic memory, set as AgentOS.symbolic_memory for tests which use components
+    directly rather than through a machine.
+    """
+    async with symbolic_memory() as ref:
+        memory = ref.instantiate()
+        memory.start()
+        AgentOS.symbolic_memory = memory
+        yield memory
+        memory.stop()
+        AgentOS.symbolic_memory = ...
+
+
 @pytest.fixture(scope="module")
 def file_memory(tmp_path_factory, module_identifier):
     storage_loc = tmp_path_factory.mktemp(f"file_memory_{module_identifier}")
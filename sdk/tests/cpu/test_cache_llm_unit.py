@@ -0,0 +1,156 @@
+import asyncio
+from io import BytesIO
+from typing import List, Dict, Any, Literal, Union
+from unittest.mock import patch
+
+import pytest
+
+from eidos_sdk.agent_os import AgentOS
+from eidos_sdk.cpu.agent_io import IOUnit, ImageCPUMessage
+from eidos_sdk.cpu.call_context import CallContext
+from eidos_sdk.cpu.llm.cache_llm_unit import CacheLLM, CacheLLMSpec
+from eidos_sdk.cpu.llm_message import LLMMessage, AssistantMessage, SystemMessage, UserMessage, UserMessageImageURL
+from eidos_sdk.cpu.llm_unit import LLMUnit, LLMCallFunction
+from eidos_sdk.memory.local_file_memory import LocalFileMemory, LocalFileMemoryConfig
+from eidos_sdk.system.reference_model import Reference
+from eidos_sdk.util.class_utils import fqn
+
+
+class CountingLLM(LLMUnit):
+    calls = 0
+    gate: asyncio.Event = None
+
+    async def execute_llm(
+        self,
+        call_context: CallContext,
+        messages: List[LLMMessage],
+        tools: List[LLMCallFunction],
+        output_format: Union[Literal["str"], Dict[str, Any]],
+    ) -> AssistantMessage:
+        CountingLLM.calls += 1
+        if CountingLLM.gate:
+            await CountingLLM.gate.wait()
+        return AssistantMessage(content=f"response to {messages[-1].content}", tool_calls=[])
+
+
+@pytest.fixture(autouse=True)
+def file_memory(tmp_path):
+    memory = LocalFileMemory(LocalFileMemoryConfig(root_dir=str(tmp_path)))
+    memory.start()
+    AgentOS.file_memory = memory
+    CountingLLM.calls = 0
+    CountingLLM.gate = None
+    yield memory
+    AgentOS.file_memory = ...
+
+
+def make_llm(**kwargs) -> CacheLLM:
+    spec = CacheLLMSpec(llm=Reference(implementation=fqn(CountingLLM)), **kwargs)
+    return CacheLLM(spec=spec, processing_unit_locator=None)
+
+
+async def ask(llm: CacheLLM, text: str) -> AssistantMessage:
+    return await llm.execute_llm(CallContext(process_id="p"), [SystemMessage(content=text)], [], "str")
+
+
+@pytest.mark.asyncio
+async def test_responses_are_cached_in_memory_and_on_disk():
+    llm = make_llm()
+    assert (await ask(llm, "a")).content == "response to a"
+    assert (await ask(llm, "a")).content == "response to a"
+    assert CountingLLM.calls == 1
+    assert (llm.metrics.hits, llm.metrics.misses) == (1, 1)
+    assert llm.metrics.saved_tokens > 0
+
+    restarted = make_llm()
+    assert (await ask(restarted, "a")).content == "response to a"
+    assert CountingLLM.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_requests_share_one_call():
+    llm = make_llm()
+    CountingLLM.gate = asyncio.Event()
+    requests = asyncio.gather(*[ask(llm, "a") for _ in range(5)])
+    await asyncio.sleep(0.1)
+    CountingLLM.gate.set()
+    assert [r.content for r in await requests] == ["response to a"] * 5
+    assert CountingLLM.calls == 1
+    assert (llm.metrics.hits, llm.metrics.misses) == (4, 1)
+
+
+@pytest.mark.asyncio
+async def test_responses_expire(os_symbolic_memory):
+    llm = make_llm(ttl=60)
+    await ask(llm, "a")
+    with patch("eidos_sdk.cpu.llm.cache_llm_unit.time.time", return_value=10**12):
+        await ask(llm, "a")
+        await ask(make_llm(ttl=60), "a")
+    assert CountingLLM.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_memory_tier_is_bounded_by_size():
+    llm = make_llm(max_memory_bytes=300)
+    for text in "abc":
+        await ask(llm, text)
+    assert len(llm.cache) < 3
+    assert llm.cache.weight <= 300
+
+
+@pytest.mark.asyncio
+async def test_images_are_keyed_by_content_hash(file_memory):
+    io_unit = IOUnit(processing_unit_locator=None)
+    first = await io_unit.process_request([ImageCPUMessage(prompt="", image=BytesIO(b"image"))])
+    second = await io_unit.process_request([ImageCPUMessage(prompt="", image=BytesIO(b"image"))])
+    assert first[0].content[0].image_url != second[0].content[0].image_url
+
+    llm = make_llm()
+    with patch.object(file_memory, "read_file", side_effect=AssertionError("images should not be read")):
+        await llm.execute_llm(CallContext(process_id="p"), first, [], "str")
+        await llm.execute_llm(CallContext(process_id="p"), second, [], "str")
+    assert CountingLLM.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_images_without_content_hash_are_hashed_once(file_memory):
+    file_memory.write_file("image", b"image")
+    messages = [UserMessage(content=[UserMessageImageURL(image_url="image")])]
+    llm = make_llm()
+    with patch.object(file_memory, "read_file", wraps=file_memory.read_file) as read_file:
+        await llm.execute_llm(CallContext(process_id="p"), messages, [], "str")
+        await llm.execute_llm(CallContext(process_id="p"), messages, [], "str")
+    assert read_file.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_file_tier_evicts_least_recently_used(os_symbolic_memory):
+    llm = make_llm(max_file_bytes=10**6, sweep_interval=0)
+    for text in "abc":
+        await ask(llm, text)
+    sizes = [entry["size"] async for entry in os_symbolic_memory.find("llm_cache_entries", {})]
+    # a is used again (from file memory), so b is the least recently used
+    await ask(make_llm(max_file_bytes=10**6), "a")
+
+    llm.spec.max_file_bytes = sum(sizes) - min(sizes)
+    await llm._sweep()
+
+    restarted = make_llm()
+    await ask(restarted, "a")
+    await ask(restarted, "c")
+    assert CountingLLM.calls == 3
+    await ask(restarted, "b")
+    assert CountingLLM.calls == 4
+
+
+@pytest.mark.asyncio
+async def test_file_tier_sweeps_expired_responses(os_symbolic_memory, file_memory):
+    llm = make_llm(ttl=60, sweep_interval=0)
+    await ask(llm, "a")
+    [entry] = [entry async for entry in os_symbolic_memory.find("llm_cache_entries", {})]
+    assert file_memory.exists(entry["_id"])
+
+    with patch("eidos_sdk.cpu.llm.cache_llm_unit.time.time", return_value=10**12):
+        await llm._sweep()
+    assert not file_memory.exists(entry["_id"])
+    assert await os_symbolic_memory.count("llm_cache_entries", {}) == 0
@@ -0,0 +1,150 @@
+from unittest.mock import patch
+
+import pytest
+
+from eidos_sdk.cpu.call_context import CallContext
+from eidos_sdk.cpu.conversation_memory_unit import RawMemoryUnit
+from eidos_sdk.cpu.conversation_store import ConversationStore
+from eidos_sdk.cpu.llm_message import SystemMessage, AssistantMessage
+from eidos_sdk.cpu.memory_unit import MemoryUnitConfig
+
+
+@pytest.fixture
+def call_context():
+    return CallContext(process_id="process", thread_id="thread")
+
+
+def make_unit(**kwargs) -> RawMemoryUnit:
+    return RawMemoryUnit(MemoryUnitConfig(**kwargs), processing_unit_locator=None)
+
+
+def message(text):
+    return AssistantMessage(content=text, tool_calls=[])
+
+
+@pytest.mark.asyncio
+async def test_history_keeps_boot_messages_first(os_symbolic_memory, call_context):
+    unit = make_unit()
+    await unit.writeMessages(call_context, [message("a")])
+    await unit.writeBootMessages(call_context, [SystemMessage(content="boot")])
+    await unit.writeMessages(call_context, [message("b")])
+    expected = [SystemMessage(content="boot"), message("a"), message("b")]
+    assert await unit.getConversationHistory(call_context) == expected
+    assert await make_unit(max_cached_threads=0).getConversationHistory(call_context) == expected
+
+
+@pytest.mark.asyncio
+async def test_steady_state_turns_do_not_reread_history(os_symbolic_memory, call_context):
+    unit = make_unit()
+    await unit.storeAndFetch(call_context, [message("a")])
+    with patch.object(unit.conversation_store, "find", wraps=unit.conversation_store.find) as find:
+        for text in "bcd":
+            conversation = await unit.storeAndFetch(call_context, [message(text)])
+        assert find.call_count == 0
+    assert [m.content for m in conversation] == list("abcd")
+
+
+@pytest.mark.asyncio
+async def test_writes_from_other_workers_are_detected(os_symbolic_memory, call_context):
+    unit = make_unit()
+    other_worker = make_unit()
+    await unit.storeAndFetch(call_context, [message("a")])
+    await other_worker.storeAndFetch(call_context, [message("b")])
+    conversation = await unit.storeAndFetch(call_context, [message("c")])
+    assert [m.content for m in conversation] == list("abc")
+
+
+@pytest.mark.asyncio
+async def test_threads_are_evicted(os_symbolic_memory):
+    unit = make_unit(max_cached_threads=1)
+    first, second = CallContext(process_id="p", thread_id="1"), CallContext(process_id="p", thread_id="2")
+    await unit.storeAndFetch(first, [message("a")])
+    await unit.storeAndFetch(second, [message("b")])
+    assert unit.conversation_cache.get(first) is None
+    assert [m.content for m in await unit.getConversationHistory(first)] == ["a"]
+
+
+@pytest.mark.asyncio
+async def test_messages_are_sequenced(os_symbolic_memory, call_context):
+    unit = make_unit()
+    await unit.writeMessages(call_context, [message("a"), message("b")])
+    await unit.writeMessages(call_context, [message("c")])
+    docs = [doc async for doc in os_symbolic_memory.find("conversation_memory", {})]
+    assert [(doc["seq"], doc["message"]["content"]) for doc in docs] == [(1, "a"), (2, "b"), (3, "c")]
+
+
+@pytest.mark.asyncio
+async def test_bounded_history(os_symbolic_memory, call_context):
+    unit = make_unit()
+    await unit.writeBootMessages(call_context, [SystemMessage(content="boot")])
+    await unit.writeMessages(call_context, [message(text) for text in "abcd"])
+    assert await unit.getConversationHistory(call_context, since_seq=3) == [message("c"), message("d")]
+    assert await unit.getConversationHistory(call_context, limit=2) == [message("c"), message("d")]
+    assert await unit.getConversationHistory(call_context, since_seq=0, limit=10) == [
+        SystemMessage(content="boot"),
+        *[message(text) for text in "abcd"],
+    ]
+
+
+@pytest.mark.asyncio
+async def test_other_workers_writes_are_fetched_incrementally(os_symbolic_memory, call_context):
+    unit = make_unit()
+    other_worker = make_unit()
+    await unit.storeAndFetch(call_context, [message("a")])
+    await other_worker.storeAndFetch(call_context, [message("b")])
+    with patch.object(unit.conversation_store, "find", wraps=unit.conversation_store.find) as find:
+        conversation = await unit.getConversationHistory(call_context)
+    assert find.call_args.kwargs["since_seq"] == 1
+    assert [m.content for m in conversation] == list("ab")
+
+
+@pytest.mark.asyncio
+async def test_forks_share_history_without_copying(os_symbolic_memory, call_context):
+    unit = make_unit()
+    await unit.writeBootMessages(call_context, [SystemMessage(content="boot")])
+    await unit.writeMessages(call_context, [message("a")])
+    fork = call_context.derive_call_context()
+    await unit.forkThread(call_context, fork)
+    assert len([doc async for doc in os_symbolic_memory.find("conversation_memory", {})]) == 2
+
+    await unit.writeMessages(fork, [message("fork")])
+    await unit.writeMessages(call_context, [message("parent")])
+    nested = fork.derive_call_context()
+    await unit.forkThread(fork, nested)
+    await unit.writeMessages(nested, [message("nested")])
+
+    for worker in (unit, make_unit()):
+        assert await worker.getConversationHistory(call_context) == [
+            SystemMessage(content="boot"),
+            message("a"),
+            message("parent"),
+        ]
+        assert await worker.getConversationHistory(fork) == [
+            SystemMessage(content="boot"),
+            message("a"),
+            message("fork"),
+        ]
+        assert [m.content for m in (await worker.getConversationHistory(nested))[1:]] == ["a", "fork", "nested"]
+        assert await worker.getConversationHistory(nested, limit=2) == [message("fork"), message("nested")]
+
+
+@pytest.mark.asyncio
+async def test_legacy_messages_are_sequenced(os_symbolic_memory, call_context):
+    # written before messages had a seq, one at a time so they are inserted in order
+    for text, is_boot_message in (("boot", True), ("a", False), ("b", False)):
+        content = SystemMessage(content=text) if is_boot_message else message(text)
+        await os_symbolic_memory.insert(
+            "conversation_memory",
+            [
+                dict(
+                    **ConversationStore.thread_query(call_context),
+                    message=content.model_dump(),
+                    is_boot_message=is_boot_message,
+                )
+            ],
+        )
+
+    unit = make_unit()
+    await unit.writeMessages(call_context, [message("c")])
+    assert await unit.getConversationHistory(call_context) == [SystemMessage(content="boot"), *map(message, "abc")]
+    assert await unit.getConversationHistory(call_context, since_seq=2) == [message("b"), message("c")]
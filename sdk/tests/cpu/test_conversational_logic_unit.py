@@ -1,11 +1,15 @@
+import asyncio
 from contextlib import contextmanager
+from copy import deepcopy
 from typing import Annotated
+from unittest.mock import patch
 
 import pytest
 from fastapi import Body
 from pydantic import BaseModel
 
 from eidos_sdk.agent.agent import register_program, register_action
+from eidos_sdk.agent_os import AgentOS
 from eidos_sdk.cpu.conversational_logic_unit import (
     ConversationalLogicUnit,
     ConversationalSpec,
@@ -43,9 +47,14 @@ class Bar:
 
 
 @pytest.fixture(scope="module")
-def open_api_json(client_builder):
+def client(client_builder):
     with client_builder(Foo, Bar) as client:
-        yield client.get("/openapi.json").json()
+        yield client
+
+
+@pytest.fixture(scope="module")
+def open_api_json(client):
+    return client.get("/openapi.json").json()
 
 
 @pytest.fixture
@@ -106,3 +115,120 @@ async def test_docs(conversational_logic_unit):
     with conversational_logic_unit(Foo) as clu:
         tools = await clu.build_tools([])
         assert tools[0].description(None, None) == "init docs"
+
+
+def tool_response(process_id, state, available_actions):
+    return ToolResponseMessage(
+        name="convo_Foo_init",
+        tool_call_id=process_id,
+        result=ConversationalResponse(
+            program="Foo", process_id=process_id, state=state, data="foo", available_actions=available_actions
+        ).model_dump_json(),
+    )
+
+
+@pytest.mark.asyncio
+async def test_tracks_process_state_as_the_conversation_grows(conversational_logic_unit):
+    with conversational_logic_unit(Foo) as clu:
+        conversation = [tool_response("pid", "idle", ["progress_active", "progress_idle"])]
+        first = await clu.build_tools(conversation)
+        assert len(first) == 3
+
+        conversation = conversation + [tool_response("pid", "active", ["progress_idle"])]
+        with patch.object(
+            ConversationalResponse, "model_validate_json", wraps=ConversationalResponse.model_validate_json
+        ) as parse:
+            second = await clu.build_tools(conversation)
+        # only the new message is parsed, and the tools which did not change are reused
+        assert parse.call_count == 1
+        assert [t.name for t in second] == ["convo_Foo_init", "convo_Foo_pid_progress_idle"]
+        assert second[0] is first[0] and second[1] is first[2]
+
+        # a different history for the same thread is parsed from scratch
+        assert len(await clu.build_tools(conversation[:1] + [tool_response("other", "idle", [])])) == 3
+
+
+@pytest.mark.asyncio
+async def test_rebuilds_tools_when_the_schema_changes(conversational_logic_unit, open_api_json):
+    with conversational_logic_unit(Foo) as clu:
+        clu.spec.in_process = False
+        clu.set_openapi_json(deepcopy(open_api_json))
+        [tool] = await clu.build_tools([])
+        clu.set_openapi_json(deepcopy(open_api_json))
+        assert (await clu.build_tools([]))[0] is tool
+
+        changed = deepcopy(open_api_json)
+        changed["paths"]["/agents/Foo/programs/init"]["post"]["description"] = "new docs"
+        clu.set_openapi_json(changed)
+        [tool] = await clu.build_tools([])
+        assert tool.description(None, None) == "new docs"
+
+
+def test_calls_agents_on_the_same_machine_in_process(client):
+    with patch("eidos_sdk.cpu.conversational_logic_unit._agent_request") as remote:
+        unit = ConversationalLogicUnit(spec=ConversationalSpec(agents=["Foo"]), processing_unit_locator=None)
+
+        async def call_init():
+            [tool] = await unit.build_tools([])
+            return await tool.fn(unit, "world")
+
+        response = asyncio.run(call_init())
+
+        remote.assert_not_called()
+        assert response["program"] == "Foo"
+        assert response["state"] == "terminated"
+        status = client.get(f"/agents/Foo/processes/{response['process_id']}/status")
+        assert status.json()["state"] == "terminated"
+
+
+@pytest.mark.asyncio
+async def test_no_agents(monkeypatch):
+    monkeypatch.setattr(AgentOS, "machine", ...)
+    with patch("eidos_sdk.cpu.conversational_logic_unit._get_openapi_schema") as remote:
+        unit = ConversationalLogicUnit(spec=ConversationalSpec(agents=[]), processing_unit_locator=None)
+        assert await unit.build_tools([tool_response("p1", "idle", ["progress_idle"])]) == []
+        remote.assert_not_called()
+
+
+def test_in_process_call_reports_errors_like_http(client):
+    controller = AgentOS.machine.get_controller("Foo")
+
+    assert asyncio.run(controller.call("init", 123))[1] == 422
+    assert asyncio.run(controller.call("progress_active", "name", process_id="missing")) == (
+        dict(detail="Process not found"),
+        404,
+    )
+
+
+@pytest.mark.asyncio
+async def test_actions_of_a_process_are_called_one_at_a_time(conversational_logic_unit):
+    running = []
+    overlapped = []
+    max_running = 0
+
+    async def agent_request(url, _body):
+        nonlocal max_running
+        process_id = url.split("/")[-3]
+        overlapped.append(process_id in running)
+        running.append(process_id)
+        max_running = max(max_running, len(running))
+        await asyncio.sleep(0.01)
+        running.remove(process_id)
+        return dict(process_id=process_id, state="idle", data="foo", available_actions=[])
+
+    with conversational_logic_unit(Foo) as clu, patch(
+        "eidos_sdk.cpu.conversational_logic_unit._agent_request", agent_request
+    ):
+        clu.spec.in_process = False
+        await asyncio.gather(
+            *[
+                clu._make_tool_fn(f"/agents/Foo/processes/{process_id}/actions/progress_idle", "Foo", process_id)(
+                    clu, {}
+                )
+                for process_id in ["p1", "p1", "p2"]
+            ]
+        )
+        # p2 runs alongside the first p1 action, the second p1 action waits for it
+        assert overlapped == [False, False, False]
+        assert max_running == 2
+        assert not clu._process_locks
@@ -0,0 +1,66 @@
+from typing import List
+
+import pytest
+
+from eidos_sdk.cpu.call_context import CallContext
+from eidos_sdk.cpu.llm_message import LLMMessage
+from eidos_sdk.cpu.logic_unit import LogicUnit, llm_function, LLMToolWrapper
+from eidos_sdk.system.eidos_handler import EidosHandler, get_handlers
+
+
+class CountingLogicUnit(LogicUnit):
+    def __init__(self):
+        super().__init__(processing_unit_locator=None)
+        self.builds = 0
+
+    @llm_function()
+    async def add(self, a: int, b: int) -> int:
+        """Adds two numbers."""
+        return a + b
+
+    def tools_depend_on_conversation(self) -> bool:
+        return False
+
+    async def build_tools(self, conversation: List[LLMMessage]) -> List[EidosHandler]:
+        self.builds += 1
+        return get_handlers(self)
+
+
+class DynamicLogicUnit(CountingLogicUnit):
+    def tools_depend_on_conversation(self) -> bool:
+        return True
+
+
+@pytest.mark.asyncio
+async def test_static_tools_are_built_once():
+    logic_unit = CountingLogicUnit()
+    first = await LLMToolWrapper.from_logic_units([logic_unit], conversation=[])
+    second = await LLMToolWrapper.from_logic_units([logic_unit], conversation=[])
+    assert logic_unit.builds == 1
+    assert first.keys() == second.keys() == {"CountingLogicUnit_add"}
+    assert first["CountingLogicUnit_add"].input_model is second["CountingLogicUnit_add"].input_model
+    assert second["CountingLogicUnit_add"].llm_message.parameters["required"] == ["a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_conversation_dependent_tools_are_rebuilt():
+    logic_unit = DynamicLogicUnit()
+    await LLMToolWrapper.from_logic_units([logic_unit], conversation=[])
+    await LLMToolWrapper.from_logic_units([logic_unit], conversation=[])
+    assert logic_unit.builds == 2
+
+
+def test_overriding_build_tools_implies_conversation_dependence():
+    class Overridden(LogicUnit):
+        async def build_tools(self, conversation):
+            return []
+
+    assert Overridden(processing_unit_locator=None).tools_depend_on_conversation()
+    assert not LogicUnit(processing_unit_locator=None).tools_depend_on_conversation()
+
+
+@pytest.mark.asyncio
+async def test_cached_tools_execute():
+    tools = await LLMToolWrapper.from_logic_units([CountingLogicUnit()], conversation=[])
+    result = await tools["CountingLogicUnit_add"].execute(CallContext(process_id="p"), dict(a=1, b=2))
+    assert result == 3
@@ -0,0 +1,154 @@
+import json
+from pathlib import Path
+from unittest.mock import patch
+
+import httpx
+import pytest
+from openai import AsyncOpenAI
+
+from eidos_sdk.agent_os import AgentOS
+from eidos_sdk.cpu.call_context import CallContext
+from eidos_sdk.cpu.llm import open_ai_llm_unit
+from eidos_sdk.cpu.llm.open_ai_llm_unit import OpenAIGPT, ScaledImageCache
+from eidos_sdk.cpu.llm.open_ai_scheduler import OpenAIScheduler
+from eidos_sdk.cpu.llm_message import UserMessage, AssistantMessage, UserMessageText, UserMessageImageURL
+from eidos_sdk.cpu.llm_unit import LLMCallFunction
+from eidos_sdk.memory.local_file_memory import LocalFileMemory, LocalFileMemoryConfig
+from eidos_sdk.system.reference_model import Reference
+from eidos_sdk.util.class_utils import fqn
+
+
+def chunk(**delta):
+    return {
+        "id": "chatcmpl-1",
+        "object": "chat.completion.chunk",
+        "created": 0,
+        "model": "gpt-4-1106-preview",
+        "choices": [{"index": 0, "delta": delta, "finish_reason": None}],
+    }
+
+
+def tool_fragment(index, arguments, id=None, name=None):
+    function = dict(arguments=arguments)
+    if name:
+        function["name"] = name
+    fragment = dict(index=index, function=function)
+    if id:
+        fragment.update(id=id, type="function")
+    return dict(tool_calls=[fragment])
+
+
+@pytest.fixture
+def streamed_chunks():
+    return []
+
+
+@pytest.fixture
+def requests():
+    return []
+
+
+@pytest.fixture(autouse=True)
+def scheduler(streamed_chunks, requests):
+    def handler(request: httpx.Request):
+        requests.append(json.loads(request.content))
+        body = "".join(f"data: {json.dumps(c)}\n\n" for c in streamed_chunks) + "data: [DONE]\n\n"
+        return httpx.Response(200, content=body.encode(), headers={"content-type": "text/event-stream"})
+
+    scheduler = OpenAIScheduler(
+        client_factory=lambda: AsyncOpenAI(
+            api_key="sk-test", http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)), max_retries=0
+        )
+    )
+    AgentOS.openai_scheduler = scheduler
+    yield scheduler
+    AgentOS.openai_scheduler = ...
+
+
+@pytest.fixture
+def llm():
+    return Reference(implementation=fqn(OpenAIGPT)).instantiate(processing_unit_locator=None)
+
+
+async def collect(llm, output_format="str", tools=()):
+    return [
+        event
+        async for event in llm.execute_llm_stream(
+            CallContext(process_id="p"), [UserMessage(content=[UserMessageText(text="hi")])], list(tools), output_format
+        )
+    ]
+
+
+@pytest.mark.asyncio
+async def test_streams_content_deltas(llm, streamed_chunks, requests):
+    streamed_chunks.extend([chunk(role="assistant", content="Hel"), chunk(content="lo"), chunk(content="!")])
+    events = await collect(llm)
+    assert requests[0]["stream"] is True
+    assert [e.data for e in events if e.event == "delta"] == ["Hel", "lo", "!"]
+    assert events[-1].event == "result"
+    assert events[-1].data == AssistantMessage(content="Hello!", tool_calls=[])
+
+
+@pytest.mark.asyncio
+async def test_assembles_tool_call_fragments(llm, streamed_chunks):
+    streamed_chunks.extend(
+        [
+            chunk(**tool_fragment(0, "", id="call_0", name="search")),
+            chunk(**tool_fragment(1, '{"b"', id="call_1", name="lookup")),
+            chunk(**tool_fragment(0, '{"query": ')),
+            chunk(**tool_fragment(0, '"cats"}')),
+            chunk(**tool_fragment(1, ": 2}")),
+        ]
+    )
+    tool = LLMCallFunction(name="search", description="search", parameters={})
+    events = await collect(llm, tools=[tool])
+    tool_calls = [e.data for e in events if e.event == "tool_call"]
+    assert [(t.tool_call_id, t.name, t.arguments) for t in tool_calls] == [
+        ("call_0", "search", {"query": "cats"}),
+        ("call_1", "lookup", {"b": 2}),
+    ]
+    assert events[-1].data.tool_calls == tool_calls
+
+
+@pytest.mark.asyncio
+async def test_parses_json_output_after_stream(llm, streamed_chunks):
+    streamed_chunks.extend([chunk(content='{"answer"'), chunk(content=": 42}")])
+    events = await collect(llm, output_format=dict(type="object"))
+    assert events[-1].data.content == {"answer": 42}
+
+
+@pytest.mark.asyncio
+async def test_images_are_scaled_once(llm, streamed_chunks, requests, tmp_path):
+    file_memory = LocalFileMemory(LocalFileMemoryConfig(root_dir=str(tmp_path)))
+    file_memory.write_file("cat.png", (Path(__file__).parent.parent / "images" / "cat.png").read_bytes())
+    AgentOS.file_memory = file_memory
+    message = UserMessage(content=[UserMessageImageURL(image_url="cat.png")])
+    streamed_chunks.append(chunk(role="assistant", content="a cat"))
+
+    async def describe():
+        return [e async for e in llm.execute_llm_stream(CallContext(process_id="p"), [message], [], "str")]
+
+    try:
+        with patch.object(open_ai_llm_unit, "scaled_images", ScaledImageCache()), patch.object(
+            open_ai_llm_unit, "scale_image", wraps=open_ai_llm_unit.scale_image
+        ) as scale_image:
+            await describe()
+            await describe()
+            # a fresh cache (e.g. after a restart) reuses the scaled image stored in file memory
+            open_ai_llm_unit.scaled_images = ScaledImageCache()
+            await describe()
+        assert scale_image.call_count == 1
+    finally:
+        AgentOS.file_memory = ...
+
+    urls = [request["messages"][0]["content"][0]["image_url"]["url"] for request in requests]
+    assert len(set(urls)) == 1 and urls[0].startswith("data:image/jpeg;base64,")
+
+
+def test_images_are_estimated_by_size_not_encoding(llm):
+    image = {"type": "image_url", "image_url": {"url": "data:image/jpeg;base64," + "A" * 1_000_000}}
+    text = {"type": "text", "text": "describe this"}
+    request = dict(messages=[{"role": "user", "content": [text, image, image]}])
+
+    text_only = llm._estimate_tokens(dict(messages=[{"role": "user", "content": [text]}]))
+    assert llm._estimate_tokens(request) == text_only + 2 * open_ai_llm_unit.IMAGE_TOKEN_ESTIMATE
@@ -0,0 +1,157 @@
+import asyncio
+
+import httpx
+import openai
+import pytest
+
+from eidos_sdk.agent_os import AgentOS
+from eidos_sdk.cpu.llm.open_ai_scheduler import OpenAIScheduler, OpenAISchedulerSpec, TokenBucket, get_scheduler
+
+
+class FakeResponse:
+    def __init__(self, value, headers=None):
+        self.value = value
+        self.headers = headers or {}
+
+    def parse(self):
+        return self.value
+
+
+def rate_limit_error(headers=None):
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    response = httpx.Response(429, request=request, headers=headers or {})
+    return openai.RateLimitError("rate limited", response=response, body=None)
+
+
+class FakeClient:
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+def scheduler():
+    return OpenAIScheduler(OpenAISchedulerSpec(initial_backoff=0.001, max_backoff=0.01), client_factory=FakeClient)
+
+
+@pytest.mark.asyncio
+async def test_returns_parsed_response_and_updates_limits(scheduler):
+    async def request(_client):
+        return FakeResponse(
+            "done",
+            {
+                "x-ratelimit-limit-requests": "100",
+                "x-ratelimit-remaining-requests": "10",
+                "x-ratelimit-limit-tokens": "1000",
+                "x-ratelimit-remaining-tokens": "50",
+            },
+        )
+
+    assert await scheduler.execute(request) == "done"
+    assert scheduler.requests.capacity == 100
+    assert scheduler.requests.tokens <= 11
+    assert scheduler.tokens.capacity == 1000
+    assert scheduler.tokens.tokens <= 51
+
+
+@pytest.mark.asyncio
+async def test_retries_rate_limits(scheduler):
+    calls = []
+
+    async def request(_client):
+        calls.append(1)
+        if len(calls) < 3:
+            raise rate_limit_error({"retry-after": "0"})
+        return FakeResponse("done")
+
+    scheduler.requests = TokenBucket(60_000)
+    assert await scheduler.execute(request) == "done"
+    assert len(calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_gives_up_after_max_retries():
+    scheduler = OpenAIScheduler(OpenAISchedulerSpec(max_retries=1, initial_backoff=0.001), client_factory=FakeClient)
+
+    async def request(_client):
+        raise rate_limit_error()
+
+    scheduler.requests = TokenBucket(60_000)
+    with pytest.raises(openai.RateLimitError):
+        await scheduler.execute(request)
+
+
+@pytest.mark.asyncio
+async def test_waiting_requests_are_served_by_priority(scheduler):
+    # a token every 100ms, so both requests are waiting by the time the first one is available
+    scheduler.requests = TokenBucket(600)
+    scheduler.requests.tokens = 0
+    order = []
+
+    def request(name):
+        async def fn(_client):
+            order.append(name)
+            return FakeResponse(name)
+
+        return fn
+
+    tasks = [
+        asyncio.create_task(scheduler.execute(request("background"), priority=10)),
+        asyncio.create_task(scheduler.execute(request("interactive"), priority=0)),
+    ]
+    await asyncio.gather(*tasks)
+    assert order == ["interactive", "background"]
+
+
+class FakeStream:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.chunks:
+            raise StopAsyncIteration
+        return self.chunks.pop(0)
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.mark.asyncio
+async def test_streams_hold_their_permit_until_closed():
+    scheduler = OpenAIScheduler(OpenAISchedulerSpec(max_concurrent_requests=1), client_factory=FakeClient)
+    first = FakeStream(["a", "b"])
+
+    async def request(_client):
+        return FakeResponse(first)
+
+    async with scheduler.stream(request) as stream:
+        assert [chunk async for chunk in stream] == ["a", "b"]
+        # the stream is consumed but still open, so another request has to wait
+        second = asyncio.create_task(scheduler.execute(lambda _client: asyncio.sleep(0, "second")))
+        await asyncio.sleep(0.01)
+        assert not second.done()
+    assert first.closed
+    assert await second == "second"
+
+
+def test_default_scheduler_per_event_loop():
+    async def scheduler_and_semaphore():
+        scheduler = get_scheduler()
+        assert get_scheduler() is scheduler
+        return scheduler, scheduler._get_semaphore()
+
+    assert AgentOS.openai_scheduler is ...
+    first, first_semaphore = asyncio.run(scheduler_and_semaphore())
+    second, second_semaphore = asyncio.run(scheduler_and_semaphore())
+    assert first is not second and first_semaphore is not second_semaphore
+
+
+def test_token_bucket_wait_time():
+    bucket = TokenBucket(60)
+    bucket.consume(60)
+    assert 0.9 < bucket.wait_time(1) <= 1
+    # requests larger than the bucket can still run once it is full
+    assert bucket.wait_time(1000) <= 60
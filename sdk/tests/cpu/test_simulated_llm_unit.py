@@ -0,0 +1,80 @@
+import statistics
+
+import jsonschema
+import pytest
+from pydantic import BaseModel
+
+from eidos_sdk.cpu.call_context import CallContext
+from eidos_sdk.cpu.llm.simulated_llm_unit import SimulatedLLMUnit
+from eidos_sdk.cpu.llm_message import UserMessage, UserMessageText, ToolResponseMessage
+from eidos_sdk.cpu.llm_unit import LLMCallFunction
+from eidos_sdk.system.reference_model import Reference
+from eidos_sdk.util.class_utils import fqn
+
+
+class Address(BaseModel):
+    street: str
+    zip: int
+
+
+class Person(BaseModel):
+    name: str
+    addresses: list[Address]
+    nickname: str | None = None
+
+
+def make_llm(**spec) -> SimulatedLLMUnit:
+    return Reference(implementation=fqn(SimulatedLLMUnit), **spec).instantiate(processing_unit_locator=None)
+
+
+def user(text):
+    return UserMessage(content=[UserMessageText(text=text)])
+
+
+@pytest.mark.asyncio
+async def test_generates_schema_conforming_content():
+    schema = Person.model_json_schema()
+    response = await make_llm(seed=1).execute_llm(CallContext(process_id="p"), [user("hi")], [], schema)
+    jsonschema.validate(response.content, schema)
+    assert response.tool_calls == []
+
+
+@pytest.mark.asyncio
+async def test_scripted_tool_calls():
+    llm = make_llm(
+        responses=[
+            dict(message_type="tool", content="done"),
+            dict(match="weather", tool_calls=[dict(name="get_weather")]),
+        ]
+    )
+    tool = LLMCallFunction(name="get_weather", description="Gets the weather", parameters=Address.model_json_schema())
+    response = await llm.execute_llm(CallContext(process_id="p"), [user("what is the weather?")], [tool], "str")
+    assert [tool_call.name for tool_call in response.tool_calls] == ["get_weather"]
+    jsonschema.validate(response.tool_calls[0].arguments, Address.model_json_schema())
+
+    tool_response = ToolResponseMessage(tool_call_id="1", name="get_weather", result="sunny")
+    response = await llm.execute_llm(CallContext(process_id="p"), [tool_response], [tool], "str")
+    assert response.content == "done" and response.tool_calls == []
+
+
+@pytest.mark.asyncio
+async def test_fixture_file(tmp_path):
+    fixture_file = tmp_path / "responses.yaml"
+    fixture_file.write_text("- match: hello\n  content: {greeting: hi}\n")
+    llm = make_llm(fixture_file=str(fixture_file))
+    response = await llm.execute_llm(CallContext(process_id="p"), [user("hello")], [], {"type": "object"})
+    assert response.content == {"greeting": "hi"}
+
+
+@pytest.mark.asyncio
+async def test_streams_one_token_at_a_time():
+    llm = make_llm(completion_tokens=5)
+    events = [e async for e in llm.execute_llm_stream(CallContext(process_id="p"), [user("hi")], [], "str")]
+    assert [e.event for e in events] == ["delta"] * 5 + ["result"]
+    assert "".join(e.data for e in events[:-1]) == events[-1].data.content
+
+
+@pytest.mark.parametrize("distribution", ["constant", "uniform", "exponential", "lognormal"])
+def test_latency_distributions_have_the_configured_mean(distribution):
+    llm = make_llm(latency_distribution=distribution, mean_latency=0.2, latency_sigma=0.5, seed=0)
+    assert statistics.mean(llm.sample_latency() for _ in range(20_000)) == pytest.approx(0.2, rel=0.05)
@@ -0,0 +1,155 @@
+import asyncio
+from types import SimpleNamespace
+from typing import List, Dict, Any, Literal, Union
+from unittest.mock import patch
+
+import pytest
+from bson import ObjectId
+
+from eidos_sdk.cpu.call_context import CallContext
+from eidos_sdk.cpu.conversation_store import ConversationStore
+from eidos_sdk.cpu.llm_message import LLMMessage, AssistantMessage, SystemMessage, ToolCall, ToolResponseMessage
+from eidos_sdk.cpu.llm_unit import LLMUnit, LLMCallFunction, LLM_MAX_TOKENS
+from eidos_sdk.cpu.processing_unit import ProcessingUnitLocator
+from eidos_sdk.cpu.summarization_memory_unit import SummarizationMemoryUnit, SummarizationMemoryUnitConfig
+from eidos_sdk.cpu.message_summarizer import MessageSummarizer
+from eidos_sdk.system.reference_model import Reference
+from eidos_sdk.util.class_utils import fqn
+
+
+class SummarizingLLM(LLMUnit):
+    def __init__(self):
+        super().__init__(processing_unit_locator=None)
+        self.spec = SimpleNamespace(model="tiny")
+        self.calls = 0
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def execute_llm(
+        self,
+        call_context: CallContext,
+        messages: List[LLMMessage],
+        tools: List[LLMCallFunction],
+        output_format: Union[Literal["str"], Dict[str, Any]],
+    ) -> AssistantMessage:
+        self.calls += 1
+        await self.gate.wait()
+        return AssistantMessage(content=dict(summary="summary"), tool_calls=[])
+
+
+class Locator(ProcessingUnitLocator):
+    def __init__(self, llm):
+        self.llm = llm
+
+    def locate_unit(self, unit_type):
+        return self.llm
+
+
+class WordCountingMemoryUnit(SummarizationMemoryUnit):
+    def count_tokens(self, message: LLMMessage) -> int:
+        return len(str(getattr(message, "content", "")).split())
+
+
+@pytest.fixture(autouse=True)
+def tiny_llm(os_symbolic_memory):
+    with patch.dict(LLM_MAX_TOKENS, {"tiny": 100}):
+        yield
+
+
+@pytest.fixture
+def llm():
+    return SummarizingLLM()
+
+
+@pytest.fixture
+def call_context():
+    return CallContext(process_id="process")
+
+
+def make_unit(llm, **kwargs) -> WordCountingMemoryUnit:
+    spec = SummarizationMemoryUnitConfig(
+        summarizer=Reference(implementation=fqn(MessageSummarizer)), max_token_fraction=0.5, **kwargs
+    )
+    return WordCountingMemoryUnit(spec, processing_unit_locator=Locator(llm))
+
+
+def words(n, word="word"):
+    return AssistantMessage(content=" ".join([word] * n), tool_calls=[])
+
+
+@pytest.mark.asyncio
+async def test_summarizes_when_limit_is_reached(llm, call_context):
+    unit = make_unit(llm)
+    await unit.writeBootMessages(call_context, [SystemMessage(content="boot")])
+    assert await unit.storeAndFetch(call_context, [words(20)]) == [SystemMessage(content="boot"), words(20)]
+    assert llm.calls == 0
+
+    conversation = await unit.storeAndFetch(call_context, [words(30, "latest")])
+    assert llm.calls == 1
+    assert [m.content for m in conversation] == ["boot", {"summary": "summary"}, words(30, "latest").content]
+    assert conversation == await make_unit(llm).getConversationHistory(call_context)
+
+
+@pytest.mark.asyncio
+async def test_tool_calls_stay_with_their_responses(llm, call_context):
+    unit = make_unit(llm)
+    tool_call = AssistantMessage(content="", tool_calls=[ToolCall(tool_call_id="1", name="tool", arguments={})])
+    await unit.writeMessages(
+        call_context, [words(10), tool_call, ToolResponseMessage(tool_call_id="1", name="tool", result="r")]
+    )
+    await unit._summarize(call_context)
+    history = await unit.getConversationHistory(call_context)
+    assert history[1:] == [tool_call, ToolResponseMessage(tool_call_id="1", name="tool", result="r")]
+
+
+@pytest.mark.asyncio
+async def test_background_summarization_does_not_block(llm, call_context):
+    unit = make_unit(llm, background_summarization=True, soft_token_fraction=0.3)
+    llm.gate.clear()
+    await unit.storeAndFetch(call_context, [words(35)])
+    conversation = await asyncio.wait_for(unit.storeAndFetch(call_context, [words(5, "new")]), 1)
+    assert conversation == [words(35), words(5, "new")]
+    assert llm.calls == 1
+
+    llm.gate.set()
+    await asyncio.gather(*unit._summarizations.values())
+    conversation = await unit.getConversationHistory(call_context)
+    # messages written while summarizing are kept
+    assert [m.content for m in conversation] == [{"summary": "summary"}, "new new new new new"]
+
+
+@pytest.mark.asyncio
+async def test_forks_are_unaffected_by_later_summaries(llm, call_context):
+    unit = make_unit(llm)
+    await unit.writeMessages(call_context, [words(10), words(10, "second")])
+    fork = call_context.derive_call_context()
+    await unit.forkThread(call_context, fork)
+    await unit._summarize(call_context)
+
+    assert [m.content for m in await unit.getConversationHistory(call_context)] == [{"summary": "summary"}]
+    assert await make_unit(llm).getConversationHistory(fork) == [words(10), words(10, "second")]
+
+
+@pytest.mark.asyncio
+async def test_legacy_summaries_are_migrated(os_symbolic_memory, llm, call_context):
+    thread = ConversationStore.thread_query(call_context)
+
+    async def legacy_write(msg, **fields):
+        # written before messages had a seq, one at a time so they are inserted in order
+        await os_symbolic_memory.insert("conversation_memory", [dict(**thread, message=msg.model_dump(), **fields)])
+
+    await legacy_write(words(10, "old"))
+    await legacy_write(words(10, "older"))
+    summary_id = str(ObjectId())
+    await os_symbolic_memory.update_many("conversation_memory", thread, {"$set": {"archive": summary_id}})
+    await legacy_write(AssistantMessage(content=dict(summary="legacy"), tool_calls=[]), _id=summary_id)
+    await legacy_write(words(5, "after"))
+
+    unit = make_unit(llm)
+    await unit.writeMessages(call_context, [words(5, "new")])
+    conversation = await unit.getConversationHistory(call_context)
+    assert [m.content for m in conversation] == [
+        {"summary": "legacy"},
+        words(5, "after").content,
+        words(5, "new").content,
+    ]
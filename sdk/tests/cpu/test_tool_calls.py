@@ -0,0 +1,99 @@
+import asyncio
+import json
+from unittest.mock import patch
+
+import pytest
+
+from eidos_sdk.cpu.call_context import CallContext
+from eidos_sdk.cpu.llm_message import ToolCall
+from eidos_sdk.cpu.logic_unit import LogicUnit, llm_function, LLMToolWrapper
+from eidos_sdk.cpu.no_memory_cpu import NoMemoryCPU
+from eidos_sdk.system.reference_model import Reference
+from eidos_sdk.util.class_utils import fqn
+
+
+class SleepyLogicUnit(LogicUnit):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.running = 0
+        self.max_running = 0
+
+    @llm_function()
+    async def sleep(self, seconds: float, label: str) -> str:
+        """Sleeps for a number of seconds and then returns the label."""
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            self.running -= 1
+        return label
+
+
+class SerialLogicUnit(SleepyLogicUnit):
+    def allow_parallel_tool_calls(self) -> bool:
+        return False
+
+
+def make_cpu(logic_unit, **kwargs) -> NoMemoryCPU:
+    return Reference(
+        implementation=fqn(NoMemoryCPU), logic_units=[dict(implementation=fqn(logic_unit))], **kwargs
+    ).instantiate()
+
+
+async def execute(cpu, *sleeps):
+    tool_defs = await LLMToolWrapper.from_logic_units(cpu.logic_units, conversation=[])
+    name = next(iter(tool_defs))
+    tool_calls = [
+        ToolCall(tool_call_id=str(i), name=name, arguments=dict(seconds=seconds, label=f"call {i}"))
+        for i, seconds in enumerate(sleeps)
+    ]
+    return await cpu._execute_tool_calls(CallContext(process_id="p"), tool_calls, tool_defs)
+
+
+@pytest.mark.asyncio
+async def test_tool_calls_run_concurrently_and_keep_order():
+    cpu = make_cpu(SleepyLogicUnit)
+    results = await execute(cpu, 0.1, 0.05, 0.0)
+    assert [r.tool_call_id for r in results] == ["0", "1", "2"]
+    assert [json.loads(r.result)["text"] for r in results] == ["call 0", "call 1", "call 2"]
+    assert cpu.logic_units[0].max_running == 3
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_capped():
+    cpu = make_cpu(SleepyLogicUnit, max_concurrent_tool_calls=2)
+    await execute(cpu, 0.02, 0.02, 0.02, 0.02)
+    assert cpu.logic_units[0].max_running == 2
+
+
+@pytest.mark.asyncio
+async def test_logic_units_can_opt_out():
+    cpu = make_cpu(SerialLogicUnit)
+    results = await execute(cpu, 0.02, 0.01, 0.0)
+    assert [r.tool_call_id for r in results] == ["0", "1", "2"]
+    assert cpu.logic_units[0].max_running == 1
+
+
+@pytest.mark.asyncio
+async def test_timed_out_tool_calls_report_an_error():
+    cpu = make_cpu(SleepyLogicUnit, tool_call_timeout=0.05)
+    slow, fast = await execute(cpu, 10, 0.0)
+    assert "timed out" in json.loads(slow.result)["error"]
+    assert json.loads(fast.result) == {"text": "call 1"}
+    assert cpu.logic_units[0].running == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_tool_call_cancels_the_others():
+    cpu = make_cpu(SleepyLogicUnit)
+    to_json = cpu._to_json
+
+    def unserializable(result):
+        if result == {"text": "call 1"}:
+            raise TypeError("Object of type bytes is not JSON serializable")
+        return to_json(result)
+
+    with patch.object(cpu, "_to_json", unserializable), pytest.raises(TypeError):
+        await asyncio.wait_for(execute(cpu, 10, 0.0), 1)
+    assert cpu.logic_units[0].running == 0
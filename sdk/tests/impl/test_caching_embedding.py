@@ -0,0 +1,84 @@
+from typing import Any, List
+
+import pytest
+
+from eidos_sdk.memory.caching_embedding import CachingEmbedding, CachingEmbeddingSpec
+from eidos_sdk.memory.embeddings import Embedding, EmbeddingSpec, HashingEmbedding
+from eidos_sdk.system.reference_model import Reference
+from eidos_sdk.util.class_utils import fqn
+
+
+class CountingEmbedding(Embedding):
+    calls = []
+
+    def __init__(self, spec: EmbeddingSpec = None):
+        super().__init__(spec or EmbeddingSpec())
+
+    async def embed_text(self, text: str, **kwargs: Any) -> List[float]:
+        CountingEmbedding.calls.append(text)
+        return [float(len(text))]
+
+
+def make_embedder(**kwargs):
+    CountingEmbedding.calls = []
+    spec = CachingEmbeddingSpec(embedder=Reference(implementation=fqn(CountingEmbedding)), **kwargs)
+    return CachingEmbedding(spec)
+
+
+@pytest.mark.asyncio
+async def test_only_misses_are_embedded(os_symbolic_memory):
+    embedder = make_embedder()
+    assert await embedder.embed_batch(["a", "bb"]) == [[1.0], [2.0]]
+    assert await embedder.embed_batch(["bb", "ccc", "a", "ccc"]) == [[2.0], [3.0], [1.0], [3.0]]
+    assert CountingEmbedding.calls == ["a", "bb", "ccc"]
+
+
+@pytest.mark.asyncio
+async def test_persistent_tier_survives_new_instance(os_symbolic_memory):
+    await make_embedder().embed_batch(["a", "bb"])
+    embedder = make_embedder(max_memory_entries=1)
+    assert await embedder.embed_text("bb") == [2.0]
+    assert CountingEmbedding.calls == []
+
+
+@pytest.mark.asyncio
+async def test_no_persistence(os_symbolic_memory):
+    await make_embedder(persist=False).embed_batch(["a"])
+    assert await os_symbolic_memory.count("embedding_cache", {}) == 0
+
+
+@pytest.mark.asyncio
+async def test_differently_configured_embedders_do_not_share_entries(os_symbolic_memory):
+    def hashing(**kwargs):
+        return CachingEmbedding(CachingEmbeddingSpec(embedder=Reference(implementation=fqn(HashingEmbedding), **kwargs)))
+
+    small, large = hashing(dimensions=8), hashing(dimensions=16)
+    assert small.cache_key("a") != large.cache_key("a")
+    assert hashing(dimensions=8).cache_key("a") == small.cache_key("a")
+    await small.embed_text("a")
+    assert len(await large.embed_text("a")) == 16
+
+
+@pytest.mark.asyncio
+async def test_batching_settings_do_not_change_keys(os_symbolic_memory):
+    def counting(**kwargs):
+        return CachingEmbedding(
+            CachingEmbeddingSpec(embedder=Reference(implementation=fqn(CountingEmbedding), **kwargs))
+        )
+
+    CountingEmbedding.calls = []
+    await counting().embed_batch(["a", "bb"])
+    tuned = counting(max_batch_size=1, max_batch_tokens=10, max_concurrency=1)
+    assert await tuned.embed_batch(["a", "bb"]) == [[1.0], [2.0]]
+    assert CountingEmbedding.calls == ["a", "bb"]
+
+
+@pytest.mark.asyncio
+async def test_batches_with_stored_embeddings_are_persisted(os_symbolic_memory):
+    first, second = make_embedder(), make_embedder()
+    await first.embed_batch(["a", "bb"])
+    # embedded by a concurrent request before the first one stored them
+    await second._persist({second.cache_key("bb"): [2.0], second.cache_key("ccc"): [3.0]})
+
+    assert await make_embedder(max_memory_entries=1).embed_batch(["a", "bb", "ccc"]) == [[1.0], [2.0], [3.0]]
+    assert CountingEmbedding.calls == []
@@ -0,0 +1,86 @@
+import asyncio
+from typing import Any, List
+
+import numpy as np
+import pytest
+
+from eidos_sdk.memory.document import Document
+from eidos_sdk.memory.embeddings import Embedding, EmbeddingSpec, HashingEmbedding, HashingEmbeddingSpec
+
+
+class RecordingEmbedding(Embedding):
+    def __init__(self, spec: EmbeddingSpec):
+        super().__init__(spec)
+        self.batches = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def embed_text(self, text: str, **kwargs: Any) -> List[float]:
+        return [float(len(text))]
+
+    async def _embed_batch(self, texts: List[str], **kwargs: Any) -> List[List[float]]:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        self.batches.append(texts)
+        # finish later batches first to make sure ordering does not depend on completion order
+        await asyncio.sleep(0.01 / len(self.batches))
+        self.in_flight -= 1
+        return await super()._embed_batch(texts, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_embed_batch_preserves_order():
+    embedder = RecordingEmbedding(EmbeddingSpec(max_batch_size=3, max_concurrency=2))
+    texts = ["a" * i for i in range(10)]
+    embeddings = await embedder.embed_batch(texts)
+    assert embeddings == [[float(i)] for i in range(10)]
+    assert [len(b) for b in embedder.batches] == [3, 3, 3, 1]
+    assert embedder.max_in_flight == 2
+
+
+@pytest.mark.asyncio
+async def test_embed_batch_respects_token_budget():
+    embedder = RecordingEmbedding(EmbeddingSpec(max_batch_tokens=10))
+    await embedder.embed_batch(["a" * 16, "a" * 16, "a" * 100, "a"])
+    assert [len(b) for b in embedder.batches] == [2, 1, 1]
+
+
+@pytest.mark.asyncio
+async def test_embed_documents():
+    embedder = RecordingEmbedding(EmbeddingSpec())
+    docs = [Document(id=str(i), page_content="a" * i, metadata=dict(i=i)) for i in range(5)]
+    embedded = [d async for d in embedder.embed(docs)]
+    assert [(d.id, d.embedding, d.metadata) for d in embedded] == [(str(i), [float(i)], dict(i=i)) for i in range(5)]
+    assert len(embedder.batches) == 1
+
+
+class TestHashingEmbedding:
+    @pytest.fixture
+    def embedder(self):
+        return HashingEmbedding(HashingEmbeddingSpec(dimensions=128))
+
+    @pytest.mark.asyncio
+    async def test_is_deterministic(self, embedder):
+        text = "the quick brown fox"
+        other = HashingEmbedding(HashingEmbeddingSpec(dimensions=128))
+        assert await embedder.embed_text(text) == await other.embed_text(text)
+        assert len(await embedder.embed_text(text)) == 128
+
+    @pytest.mark.asyncio
+    async def test_batch_matches_single(self, embedder):
+        texts = ["the quick brown fox", "", "jumps over the lazy dog"]
+        batch = await embedder.embed_batch(texts)
+        assert np.allclose(batch, [await embedder.embed_text(t) for t in texts])
+
+    def test_similar_texts_are_closer(self, embedder):
+        fox, fox2, stocks, empty = embedder.embed_array(
+            [
+                "the quick brown fox jumps over the lazy dog",
+                "a quick brown fox jumped over a lazy dog",
+                "stock markets fell sharply on tuesday",
+                "",
+            ]
+        )
+        assert fox @ fox2 > fox @ stocks
+        assert np.isclose(np.linalg.norm(fox), 1)
+        assert not empty.any()
@@ -101,3 +101,17 @@ class TestLocalSymbolicMemory:
             await memory.upsert_one(
                 "collection", {"_id": "4"}, {"key": "updated_value", "updated": "2022-01-02T00:00:00"}
             )
+
+    @pytest.mark.asyncio
+    async def test_update_many_set(self, memory):
+        await memory.insert("collection", [{"_id": "5", "group": "a"}, {"_id": "6", "group": "a"}, {"_id": "7"}])
+        await memory.update_many("collection", {"_id": {"$in": ["5", "6"]}}, {"$set": {"archive": "x"}})
+        assert [doc["_id"] async for doc in memory.find("collection", {"archive": "x"})] == ["5", "6"]
+        with pytest.raises(ValueError):
+            await memory.update_many("collection", {}, {"$inc": {"counter": 1}})
+
+    @pytest.mark.asyncio
+    async def test_find_exists(self, memory):
+        await memory.insert("collection", [{"_id": "8", "seq": 1}, {"_id": "9"}])
+        assert [doc["_id"] async for doc in memory.find("collection", {"seq": {"$exists": True}})] == ["8"]
+        assert [doc["_id"] async for doc in memory.find("collection", {"seq": {"$exists": False}})] == ["9"]
@@ -0,0 +1,186 @@
+import time
+from typing import List
+
+import httpx
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt
+from starlette.requests import Request
+
+from eidos_sdk.security.jwks_cache import JWKSCache
+from eidos_sdk.security.jwt_middleware import BaseJWTMiddleware, BaseJWTMiddlewareSpec
+
+
+def signing_key(kid: str):
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    public_pem = private_key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    return private_pem, dict(jwk.construct(public_pem, "RS256").to_dict(), kid=kid)
+
+
+@pytest.fixture(scope="module")
+def keys():
+    return dict(k1=signing_key("k1"), k2=signing_key("k2"))
+
+
+class Provider:
+    """Publishes the given key sets in turn, repeating the last one."""
+
+    def __init__(self, *key_sets: List[dict], headers=None):
+        self.key_sets = list(key_sets)
+        self.headers = headers or {}
+        self.fetches = 0
+
+    def handle(self, _request: httpx.Request) -> httpx.Response:
+        keys = self.key_sets[min(self.fetches, len(self.key_sets) - 1)]
+        self.fetches += 1
+        if keys is None:
+            return httpx.Response(503)
+        return httpx.Response(200, json=dict(keys=keys), headers=self.headers)
+
+    def cache(self, **kwargs) -> JWKSCache:
+        return JWKSCache("https://provider/keys", transport=httpx.MockTransport(self.handle), **kwargs)
+
+
+class TestJWKSCache:
+    @pytest.mark.asyncio
+    async def test_keeps_keys_for_max_age(self, keys):
+        provider = Provider([keys["k1"][1]], headers={"cache-control": "public, max-age=3600"})
+        cache = provider.cache()
+
+        assert await cache.get_keys() == [keys["k1"][1]]
+        assert await cache.get_keys("k1") == [keys["k1"][1]]
+        assert provider.fetches == 1
+
+    def test_ttl_from_cache_headers(self):
+        cache = JWKSCache("https://provider/keys", default_ttl=100, min_ttl=10, max_ttl=1000)
+
+        assert cache._ttl(httpx.Headers({"cache-control": "max-age=600", "age": "200"})) == 400
+        assert cache._ttl(httpx.Headers({"cache-control": "no-store"})) == 10
+        assert cache._ttl(httpx.Headers({"cache-control": "max-age=99999"})) == 1000
+        expires = {"date": "Mon, 19 Oct 2026 10:00:00 GMT", "expires": "Mon, 19 Oct 2026 10:05:00 GMT"}
+        assert cache._ttl(httpx.Headers(expires)) == 300
+        assert cache._ttl(httpx.Headers({"cache-control": "max-age=soon"})) == 100
+        assert cache._ttl(httpx.Headers()) == 100
+
+    @pytest.mark.asyncio
+    async def test_refetches_for_unknown_kid(self, keys):
+        for refetch_interval, expected in ((60, []), (0, [keys["k2"][1]])):
+            provider = Provider([keys["k1"][1]], [keys["k1"][1], keys["k2"][1]])
+            cache = provider.cache(refetch_interval=refetch_interval)
+            await cache.get_keys()
+
+            assert await cache.get_keys("k2") == expected
+            assert provider.fetches == (1 if refetch_interval else 2)
+
+    @pytest.mark.asyncio
+    async def test_refreshes_in_the_background(self, keys):
+        provider = Provider([keys["k1"][1]], [keys["k2"][1]])
+        cache = provider.cache(refresh_ahead=0)
+
+        await cache.get_keys()
+        # answered with the current keys while the new ones are fetched
+        assert await cache.get_keys() == [keys["k1"][1]]
+        await cache._fetch_task
+        assert cache._keys == [keys["k2"][1]]
+
+    @pytest.mark.asyncio
+    async def test_keeps_keys_when_refresh_fails(self, keys):
+        provider = Provider([keys["k1"][1]], None)
+        cache = provider.cache(min_ttl=0, default_ttl=0)
+
+        await cache.get_keys()
+        assert await cache.get_keys() == [keys["k1"][1]]
+        assert provider.fetches == 2
+
+    @pytest.mark.asyncio
+    async def test_first_fetch_failure_raises(self):
+        with pytest.raises(httpx.HTTPStatusError):
+            await Provider(None).cache().get_keys()
+
+
+class Middleware(BaseJWTMiddleware):
+    def getOAuthConfig(self) -> dict:
+        return {}
+
+    def register_auth(self, oauth):
+        pass
+
+    async def get_audience_and_issuer(self):
+        return "audience", "issuer"
+
+    def get_algorithms(self) -> List[str]:
+        return ["RS256"]
+
+    def get_jwks_url(self) -> str:
+        return "https://provider/keys"
+
+
+def request(token: str) -> Request:
+    return Request(dict(type="http", method="GET", path="/", headers=[(b"authorization", f"Bearer {token}".encode())]))
+
+
+class TestBaseJWTMiddleware:
+    @pytest.fixture
+    def provider(self, keys):
+        return Provider([keys["k1"][1]])
+
+    @pytest.fixture
+    def middleware(self, provider):
+        rtn = Middleware(spec=BaseJWTMiddlewareSpec())
+        rtn._jwks = provider.cache()
+        return rtn
+
+    @staticmethod
+    def token(keys, kid="k1", expires_in=60):
+        claims = dict(sub="user", aud="audience", iss="issuer", exp=int(time.time()) + expires_in)
+        return jwt.encode(claims, keys[kid][0], algorithm="RS256", headers=dict(kid=kid))
+
+    @pytest.mark.asyncio
+    async def test_remembers_verified_tokens(self, keys, middleware, provider, monkeypatch):
+        token = self.token(keys)
+        first, second = request(token), request(token)
+
+        assert await middleware.dispatch(first) is None
+
+        def fail(*_args, **_kwargs):
+            raise AssertionError("token verified again")
+
+        monkeypatch.setattr(jwt, "decode", fail)
+        assert await middleware.dispatch(second) is None
+        assert second.state.payload == first.state.payload
+        assert second.state.payload["sub"] == "user"
+
+    @pytest.mark.asyncio
+    async def test_rejects_expired_and_invalid_tokens(self, keys, middleware):
+        assert (await middleware.dispatch(request(self.token(keys, expires_in=-10)))).status_code == 401
+        # signed with a key the provider does not publish
+        assert (await middleware.dispatch(request(self.token(keys, kid="k2")))).status_code == 401
+        assert (await middleware.dispatch(request("not-a-token"))).status_code == 401
+        assert len(middleware._verified_tokens) == 0
+
+    @pytest.mark.asyncio
+    async def test_does_not_use_expired_entries(self, keys, middleware):
+        token = self.token(keys)
+        await middleware.dispatch(request(token))
+        [key] = middleware._verified_tokens._data
+        middleware._verified_tokens.put(key, (dict(sub="stale"), time.time() - 1))
+
+        verified = request(token)
+        assert await middleware.dispatch(verified) is None
+        assert verified.state.payload["sub"] == "user"
+
+    def test_jwks_url_is_required(self):
+        class NoKeys(BaseJWTMiddleware):
+            getOAuthConfig = Middleware.getOAuthConfig
+            register_auth = Middleware.register_auth
+            get_audience_and_issuer = Middleware.get_audience_and_issuer
+            get_algorithms = Middleware.get_algorithms
+
+        with pytest.raises(TypeError, match="get_jwks_url"):
+            NoKeys(spec=BaseJWTMiddlewareSpec())
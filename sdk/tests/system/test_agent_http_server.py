@@ -0,0 +1,88 @@
+import logging
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from starlette.responses import JSONResponse, StreamingResponse
+
+from eidos_sdk.agent_os import AgentOS
+from eidos_sdk.bin.agent_http_server import add_middleware
+
+
+class DenyProcessor:
+    async def dispatch(self, request: Request):
+        if request.headers.get("authorization") != "ok":
+            return JSONResponse(status_code=401, content={"detail": "Authorization header missing"})
+        request.state.payload = dict(sub="user")
+
+
+@pytest.fixture
+def app():
+    _app = FastAPI()
+
+    @_app.get("/hello")
+    async def hello(request: Request):
+        return dict(payload=request.state.payload)
+
+    @_app.get("/stream")
+    async def stream():
+        return StreamingResponse((f"data: {i}\n\n" for i in range(3)), media_type="text/event-stream")
+
+    @_app.get("/error")
+    async def error():
+        raise RuntimeError("boom")
+
+    AgentOS.security_manager = SimpleNamespace(authorization_processor=DenyProcessor())
+    yield _app
+    AgentOS.security_manager = ...
+
+
+@pytest.fixture
+def eidolon_caplog(caplog):
+    # the server's logging config stops eidolon records from propagating to caplog's handler on the root logger
+    eidolon_logger = logging.getLogger("eidolon")
+    level = eidolon_logger.level
+    eidolon_logger.addHandler(caplog.handler)
+    eidolon_logger.setLevel(logging.INFO)
+    yield caplog
+    eidolon_logger.removeHandler(caplog.handler)
+    eidolon_logger.setLevel(level)
+
+
+def test_security_rejects_and_passes_caller_state(app):
+    add_middleware(app)
+    client = TestClient(app)
+
+    assert client.get("/hello").status_code == 401
+    assert client.get("/hello", headers={"authorization": "ok"}).json() == dict(payload=dict(sub="user"))
+
+
+def test_streams_through_the_stack(app):
+    add_middleware(app)
+    with TestClient(app).stream("GET", "/stream", headers={"authorization": "ok"}) as response:
+        assert list(response.iter_lines()) == ["data: 0", "", "data: 1", "", "data: 2", ""]
+
+
+def test_logs_structured_lines(app, eidolon_caplog):
+    add_middleware(app)
+    client = TestClient(app, raise_server_exceptions=False)
+
+    client.get("/hello?token=secret", headers={"authorization": "ok"})
+    client.get("/hello")
+
+    ok, rejected = eidolon_caplog.records
+    assert ok.getMessage().startswith("method=GET path=/hello status=200 duration_ms=")
+    assert "secret" not in ok.getMessage()
+    assert rejected.http["status"] == 401
+
+
+def test_samples_successful_requests_but_not_errors(app, eidolon_caplog):
+    add_middleware(app, log_sample_rate=0)
+    client = TestClient(app, raise_server_exceptions=False)
+
+    client.get("/hello", headers={"authorization": "ok"})
+    client.get("/error", headers={"authorization": "ok"})
+
+    [error] = eidolon_caplog.records
+    assert error.levelno == logging.ERROR and error.http["path"] == "/error" and error.exc_info
@@ -0,0 +1,17 @@
+import pytest
+
+from eidos_sdk.bin.agent_server_benchmark import run
+
+
+@pytest.mark.asyncio
+async def test_benchmark_reports_every_scenario():
+    results = await run(requests=4, concurrency=2, warmup=1, documents=4)
+
+    assert set(results["scenarios"]) == {"generic_program", "generic_action", "tot_program", "retriever_search"}
+    for name, scenario in results["scenarios"].items():
+        assert scenario["errors"] == 0, name
+        assert scenario["throughput_rps"] > 0
+        latency = scenario["latency_ms"]
+        assert latency["p50"] <= latency["p95"] <= latency["p99"] <= latency["max"]
+        assert "llm" in scenario["layers_ms"] and "framework" in scenario["layers_ms"]
+        assert "rss_growth_mb" in scenario["memory"]
@@ -0,0 +1,76 @@
+import json
+from typing import Annotated
+
+import pytest
+from fastapi import Body
+
+from eidos_sdk.agent.agent import register_program
+from eidos_sdk.agent_os import AgentOS
+
+
+class BatchAgent:
+    @register_program()
+    async def greet(self, name: Annotated[str, Body()]):
+        if name == "error":
+            raise Exception("bad name")
+        return f"Hello, {name}!"
+
+    @register_program()
+    async def add(self, a: Annotated[int, Body()], b: Annotated[int, Body()]):
+        return a + b
+
+
+class TestBatch:
+    @pytest.fixture(scope="class")
+    def client(self, client_builder):
+        with client_builder(BatchAgent) as client:
+            yield client
+
+    def test_async_batch_returns_process_ids(self, client):
+        post = client.post("/agents/BatchAgent/programs/greet/batch", json=["a", "b", "c"])
+        assert post.status_code == 202
+        process_ids = post.json()["process_ids"]
+        assert len(set(process_ids)) == 3
+
+        for process_id, name in zip(process_ids, ["a", "b", "c"]):
+            status = client.get(f"/agents/BatchAgent/processes/{process_id}/status", params=dict(wait="5s"))
+            assert status.json()["data"] == f"Hello, {name}!"
+
+    def test_stream_batch(self, client):
+        post = client.post(
+            "/agents/BatchAgent/programs/add/batch",
+            json=[dict(a=1, b=2), dict(a=3, b=4)],
+            headers={"execution-mode": "stream"},
+        )
+        assert post.status_code == 200
+        assert post.headers["content-type"] == "application/x-ndjson"
+        results = sorted((json.loads(line) for line in post.text.splitlines()), key=lambda r: r["index"])
+        assert [(r["status_code"], r["data"]) for r in results] == [(200, 3), (200, 7)]
+
+    def test_sync_batch_reports_errors_per_input(self, client):
+        post = client.post(
+            "/agents/BatchAgent/programs/greet/batch", json=["a", "error"], headers={"execution-mode": "sync"}
+        )
+        assert post.status_code == 200
+        ok, error = post.json()
+        assert ok["data"] == "Hello, a!"
+        assert error["status_code"] == 500 and error["index"] == 1
+
+    def test_invalid_input(self, client):
+        post = client.post("/agents/BatchAgent/programs/add/batch", json=[dict(a=1)])
+        assert post.status_code == 422
+
+    def test_rejects_batch_larger_than_max_batch_size(self, client, monkeypatch):
+        monkeypatch.setattr(AgentOS.job_executor.spec, "max_batch_size", 2)
+        post = client.post("/agents/BatchAgent/programs/greet/batch", json=["a", "b", "c"])
+        assert post.status_code == 413
+        assert "Retry-After" not in post.headers
+        assert client.post("/agents/BatchAgent/programs/greet/batch", json=["a", "b"]).status_code == 202
+
+    def test_rejects_batch_larger_than_capacity(self, client, monkeypatch):
+        # a batch which would not fit even in an idle executor can never be admitted, so it is not worth retrying
+        monkeypatch.setattr(AgentOS.job_executor.spec, "max_workers", 1)
+        monkeypatch.setattr(AgentOS.job_executor.spec, "max_queue_size", 1)
+        post = client.post("/agents/BatchAgent/programs/greet/batch", json=["a", "b", "c"])
+        assert post.status_code == 413
+        assert AgentOS.job_executor.reserved == 0
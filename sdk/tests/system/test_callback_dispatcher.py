@@ -0,0 +1,160 @@
+import asyncio
+import json
+import time
+from typing import Annotated, List
+
+import httpx
+import pytest
+from fastapi import Body
+
+from eidos_sdk.agent.agent import register_program
+from eidos_sdk.agent_os import AgentOS
+from eidos_sdk.system.callback_dispatcher import CallbackDispatcher, CallbackDispatcherSpec, CallbackDoc
+
+
+class Receiver:
+    """Answers callbacks with the given status codes, then with 200."""
+
+    def __init__(self, *status_codes: int):
+        self.status_codes = list(status_codes)
+        self.requests: List[httpx.Request] = []
+        self.delivered = asyncio.Event()
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        status_code = self.status_codes.pop(0) if self.status_codes else 200
+        if status_code == 200:
+            self.delivered.set()
+        return httpx.Response(status_code)
+
+
+def dispatcher(receiver: Receiver, **kwargs) -> CallbackDispatcher:
+    rtn = CallbackDispatcher(CallbackDispatcherSpec(initial_backoff=0.001, **kwargs))
+    rtn._client = httpx.AsyncClient(transport=httpx.MockTransport(receiver.handle))
+    return rtn
+
+
+async def outbox(state="pending"):
+    return [doc async for doc in AgentOS.symbolic_memory.find(CallbackDoc.collection, dict(state=state))]
+
+
+@pytest.mark.asyncio
+async def test_delivers_and_clears_outbox(os_symbolic_memory):
+    receiver = Receiver()
+    callbacks = dispatcher(receiver)
+
+    doc = await callbacks.enqueue("http://receiver/hook", "agent", "process", dict(state="terminated"))
+    await asyncio.wait_for(receiver.delivered.wait(), 1)
+    await callbacks.stop()
+
+    request = receiver.requests[0]
+    assert request.headers["eidolon-delivery-id"] == doc.record_id
+    assert request.headers["eidolon-process-id"] == "process"
+    assert json.loads(request.read()) == dict(state="terminated")
+    assert await outbox() == []
+
+
+@pytest.mark.asyncio
+async def test_prunes_delivered_callbacks(os_symbolic_memory):
+    callbacks = dispatcher(Receiver(), retention=0)
+    await CallbackDoc.create(
+        url="http://receiver/hook", agent="agent", process_id="process", payload={}, state="delivered"
+    )
+
+    await callbacks.deliver_due()
+
+    assert await outbox("delivered") == []
+
+
+@pytest.mark.asyncio
+async def test_retries_server_errors(os_symbolic_memory):
+    receiver = Receiver(503, 500)
+    callbacks = dispatcher(receiver)
+
+    await callbacks.enqueue("http://receiver/hook", "agent", "process", {})
+    await asyncio.wait_for(receiver.delivered.wait(), 1)
+    await callbacks.stop()
+
+    assert len(receiver.requests) == 3
+    [doc] = await outbox("delivered")
+    assert doc["attempts"] == 3
+
+
+@pytest.mark.asyncio
+async def test_gives_up_on_client_errors(os_symbolic_memory):
+    receiver = Receiver(404)
+    callbacks = dispatcher(receiver)
+
+    await callbacks.enqueue("http://receiver/hook", "agent", "process", {})
+    await asyncio.sleep(0.05)
+    await callbacks.stop()
+
+    assert len(receiver.requests) == 1
+    [doc] = await outbox("failed")
+    assert doc["last_error"] == "404 response"
+
+
+@pytest.mark.asyncio
+async def test_outbox_is_delivered_once_after_restart(os_symbolic_memory):
+    await CallbackDoc.create(url="http://receiver/hook", agent="agent", process_id="process", payload={})
+    await CallbackDoc.create(
+        url="http://receiver/hook",
+        agent="agent",
+        process_id="process",
+        payload={},
+        state="pending",
+        next_attempt=time.time() + 60,
+    )
+    receiver = Receiver()
+    workers = [dispatcher(receiver), dispatcher(receiver)]
+
+    await asyncio.gather(*(worker.deliver_due() for worker in workers))
+    await asyncio.wait_for(receiver.delivered.wait(), 1)
+    for worker in workers:
+        await worker.stop()
+
+    # the callback which is not due yet stays in the outbox
+    assert len(receiver.requests) == 1
+    assert len(await outbox()) == 1
+    assert len(await outbox("delivered")) == 1
+
+
+class CallbackAgent:
+    @register_program()
+    async def idle(self, name: Annotated[str, Body()]):
+        return f"Hello, {name}!"
+
+
+class TestCallbackUrl:
+    @pytest.fixture
+    def vcr_config(self, vcr_config):
+        # callbacks are answered by a mock transport and their bodies change with each run
+        return dict(vcr_config, ignore_hosts=[*vcr_config["ignore_hosts"], "hook"])
+
+    @pytest.fixture(scope="class")
+    def client(self, client_builder):
+        with client_builder(CallbackAgent) as client:
+            yield client
+
+    def test_callback_receives_final_state(self, client):
+        received = []
+
+        def handle(request: httpx.Request):
+            received.append(request)
+            return httpx.Response(200)
+
+        AgentOS.callback_dispatcher._client = httpx.AsyncClient(transport=httpx.MockTransport(handle))
+        post = client.post("/agents/CallbackAgent/programs/idle", json="world", headers={"callback-url": "http://hook"})
+        assert post.status_code == 202
+
+        deadline = time.time() + 5
+        while not received:
+            assert time.time() < deadline
+            time.sleep(0.01)
+        body = json.loads(received[0].read())
+        assert body["process_id"] == post.json()["process_id"]
+        assert body["data"] == "Hello, world!"
+
+    def test_rejects_non_http_callback(self, client):
+        post = client.post("/agents/CallbackAgent/programs/idle", json="world", headers={"callback-url": "file:///x"})
+        assert post.status_code == 400
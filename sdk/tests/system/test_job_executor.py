@@ -0,0 +1,182 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Annotated
+
+import pytest
+from fastapi import Body
+
+from eidos_sdk.agent.agent import register_program
+from eidos_sdk.agent_os import AgentOS
+from eidos_sdk.system.job_executor import BatchTooLargeError, JobExecutor, JobExecutorSpec, QueueFullError
+from eidos_sdk.system.processes import ProcessDoc
+
+
+def executor(**kwargs) -> JobExecutor:
+    return JobExecutor(JobExecutorSpec(**kwargs))
+
+
+@pytest.mark.asyncio
+async def test_runs_waiting_jobs_by_priority():
+    jobs = executor(max_workers=1)
+    release = asyncio.Event()
+    order = []
+
+    async def job(name):
+        await release.wait()
+        order.append(name)
+
+    jobs.submit("agent", lambda: job("first"))
+    jobs.submit("agent", lambda: job("low"), priority=5)
+    jobs.submit("agent", lambda: job("high"), priority=1)
+    assert jobs.running == 1 and jobs.queue_depth == 2
+
+    release.set()
+    await jobs.stop()
+    assert order == ["first", "high", "low"]
+    assert jobs.get_metrics()["completed"] == 3
+
+
+@pytest.mark.asyncio
+async def test_agent_quota_does_not_block_other_agents():
+    jobs = executor(max_workers=4, agent_concurrency=dict(slow=1))
+    release = asyncio.Event()
+
+    for agent in ["slow", "slow", "fast", "fast"]:
+        jobs.submit(agent, release.wait)
+
+    agents = jobs.get_metrics()["agents"]
+    assert agents["slow"] == dict(queued=1, running=1)
+    assert agents["fast"] == dict(queued=0, running=2)
+    release.set()
+    await jobs.stop()
+
+
+@pytest.mark.asyncio
+async def test_rejects_when_queue_is_full():
+    jobs = executor(max_workers=1, max_queue_size=1, retry_after=3)
+    release = asyncio.Event()
+
+    jobs.check_capacity("agent")
+    jobs.submit("agent", release.wait)
+    jobs.check_capacity("agent")
+    jobs.submit("agent", release.wait)
+    with pytest.raises(QueueFullError) as e:
+        jobs.check_capacity("agent")
+    assert e.value.retry_after == 3
+    assert jobs.get_metrics()["rejected"] == 1
+
+    release.set()
+    await jobs.stop()
+    with pytest.raises(QueueFullError):
+        jobs.check_capacity("agent")
+
+
+@pytest.mark.asyncio
+async def test_admitted_jobs_are_reserved_until_submitted():
+    jobs = executor(max_workers=1, max_queue_size=1)
+    release = asyncio.Event()
+
+    # a burst of requests, all admitted before any of them submits its job
+    jobs.check_capacity("agent")
+    jobs.check_capacity("agent")
+    with pytest.raises(QueueFullError):
+        jobs.check_capacity("agent")
+    assert jobs.get_metrics()["reserved"] == 2
+
+    # one request fails before submitting, which frees its place
+    jobs.release("agent")
+    jobs.check_capacity("agent")
+    jobs.submit("agent", release.wait)
+    jobs.submit("agent", release.wait)
+    assert jobs.reserved == 0 and jobs.running == 1 and jobs.queue_depth == 1
+    with pytest.raises(QueueFullError):
+        jobs.check_capacity("agent")
+
+    release.set()
+    await jobs.stop()
+
+
+def test_rejects_batches_which_can_never_fit():
+    jobs = executor(max_workers=4, max_queue_size=2, max_batch_size=5, agent_concurrency=dict(slow=1))
+
+    with pytest.raises(BatchTooLargeError) as e:
+        jobs.check_capacity("agent", 6)
+    assert e.value.limit == 5
+    with pytest.raises(BatchTooLargeError) as e:
+        jobs.check_capacity("slow", 4)
+    assert e.value.limit == 3
+    jobs.check_capacity("slow", 3)
+    assert jobs.reserved == 3
+
+
+@pytest.mark.asyncio
+async def test_stop_cancels_jobs_after_drain_timeout():
+    jobs = executor(max_workers=1, drain_timeout=0.01)
+    jobs.submit("agent", lambda: asyncio.sleep(10))
+    jobs.submit("agent", lambda: asyncio.sleep(10))
+
+    await jobs.stop()
+
+    metrics = jobs.get_metrics()
+    assert metrics["cancelled"] == 2
+    assert metrics["running"] == 0 and metrics["queue_depth"] == 0
+
+
+class SlowAgent:
+    @register_program()
+    async def idle(self, name: Annotated[str, Body()]):
+        await asyncio.sleep(0.01)
+        return f"Hello, {name}!"
+
+
+class TestAsyncExecution:
+    @pytest.fixture(scope="class")
+    def client(self, client_builder):
+        with client_builder(SlowAgent) as client:
+            yield client
+
+    def test_async_program_runs_in_background(self, client):
+        post = client.post("/agents/SlowAgent/programs/idle", json="world", headers={"execution-mode": "async"})
+        assert post.status_code == 202
+        process_id = post.json()["process_id"]
+
+        deadline = time.time() + 5
+        while (status := client.get(f"/agents/SlowAgent/processes/{process_id}/status").json())["state"] != "terminated":
+            assert time.time() < deadline
+            time.sleep(0.01)
+        assert status["data"] == "Hello, world!"
+        assert client.get("/system/jobs").json()["completed"] >= 1
+
+    def test_concurrent_requests_are_admitted_against_reserved_capacity(self, client, monkeypatch):
+        monkeypatch.setattr(AgentOS.job_executor.spec, "max_workers", 1)
+        monkeypatch.setattr(AgentOS.job_executor.spec, "max_queue_size", 1)
+        create = ProcessDoc.create
+
+        async def slow_create(**kwargs):
+            # every request is admitted before the first one submits its job
+            await asyncio.sleep(0.2)
+            return await create(**kwargs)
+
+        monkeypatch.setattr(ProcessDoc, "create", slow_create)
+
+        def post(_):
+            return client.post("/agents/SlowAgent/programs/idle", json="world", headers={"execution-mode": "async"})
+
+        with ThreadPoolExecutor(6) as pool:
+            status_codes = [response.status_code for response in pool.map(post, range(6))]
+        assert sorted(status_codes) == [202, 202, 429, 429, 429, 429]
+        assert AgentOS.job_executor.reserved == 0
+
+    def test_failed_requests_release_their_reservation(self, client):
+        post = client.post(
+            "/agents/SlowAgent/processes/missing/actions/idle", json="world", headers={"execution-mode": "async"}
+        )
+        assert post.status_code == 404
+        assert AgentOS.job_executor.reserved == 0
+
+    def test_invalid_priority(self, client):
+        post = client.post(
+            "/agents/SlowAgent/programs/idle", json="world", headers={"execution-mode": "async", "job-priority": "x"}
+        )
+        assert post.status_code == 400
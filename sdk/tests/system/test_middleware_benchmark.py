@@ -0,0 +1,16 @@
+import pytest
+
+from eidos_sdk.bin.middleware_benchmark import run
+
+
+@pytest.mark.asyncio
+async def test_benchmark_reports_every_endpoint():
+    results = await run(requests=20, concurrency=4, warmup=2, log_sample_rate=0.5)
+
+    assert set(results["endpoints"]) == {"json", "stream"}
+    for name, endpoint in results["endpoints"].items():
+        for run_name in ("bare", "stack"):
+            assert endpoint[run_name]["errors"] == 0, name
+            assert endpoint[run_name]["throughput_rps"] > 0
+        assert set(endpoint["added_latency_ms"]) == {"mean", "p50", "p95", "p99"}
+        assert endpoint["throughput_ratio"] > 0
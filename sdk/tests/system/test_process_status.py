@@ -0,0 +1,55 @@
+import asyncio
+import time
+from typing import Annotated
+
+import pytest
+from fastapi import Body
+
+from eidos_sdk.agent.agent import register_program
+
+
+class SleepyAgent:
+    @register_program()
+    async def idle(self, seconds: Annotated[float, Body()]):
+        await asyncio.sleep(seconds)
+        return "done"
+
+
+class TestStatusWait:
+    @pytest.fixture(scope="class")
+    def client(self, client_builder):
+        with client_builder(SleepyAgent) as client:
+            yield client
+
+    def start(self, client, seconds: float) -> str:
+        post = client.post("/agents/SleepyAgent/programs/idle", json=seconds, headers={"execution-mode": "async"})
+        assert post.status_code == 202
+        return post.json()["process_id"]
+
+    def test_wait_returns_on_state_change(self, client):
+        process_id = self.start(client, 0.2)
+
+        started = time.monotonic()
+        status = client.get(f"/agents/SleepyAgent/processes/{process_id}/status", params=dict(wait="10s"))
+        assert status.json()["state"] == "terminated"
+        # woken by the update rather than the poll interval
+        assert time.monotonic() - started < 0.9
+
+    def test_wait_times_out(self, client):
+        process_id = self.start(client, 1)
+
+        status = client.get(f"/agents/SleepyAgent/processes/{process_id}/status", params=dict(wait="100ms"))
+        assert status.json()["state"] == "processing"
+
+    def test_without_wait_returns_immediately(self, client):
+        process_id = self.start(client, 1)
+
+        status = client.get(f"/agents/SleepyAgent/processes/{process_id}/status")
+        assert status.json()["state"] == "processing"
+
+    def test_invalid_wait(self, client):
+        process_id = self.start(client, 0)
+
+        for wait in ("soon", "-1s", "nan", "infms"):
+            status = client.get(f"/agents/SleepyAgent/processes/{process_id}/status", params=dict(wait=wait))
+            assert status.status_code == 400, wait
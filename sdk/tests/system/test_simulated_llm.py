@@ -0,0 +1,48 @@
+import pytest
+
+from eidos_sdk.system.resources.resources_base import Resource, Metadata
+
+
+@pytest.fixture(scope="module")
+def simulated_agent():
+    return Resource(
+        apiVersion="eidolon/v1",
+        kind="Agent",
+        metadata=Metadata(name="SimulatedAgent"),
+        spec=dict(
+            implementation="GenericAgent",
+            cpu=dict(
+                llm_unit=dict(
+                    implementation="SimulatedLLMUnit",
+                    responses=[dict(match="France", content=dict(answer="Paris", confidence=0.9))],
+                )
+            ),
+            system_prompt="You are a helpful assistant.",
+            user_prompt="{{instruction}}",
+            input_schema=dict(instruction=dict(type="string")),
+            description="An agent which answers with a simulated llm.",
+            output_schema=dict(
+                type="object",
+                properties=dict(answer=dict(type="string"), confidence=dict(type="number")),
+            ),
+        ),
+    )
+
+
+class TestSimulatedLLM:
+    @pytest.fixture(scope="class")
+    def client(self, client_builder, simulated_agent):
+        with client_builder(simulated_agent) as client:
+            yield client
+
+    def test_scripted_response(self, client):
+        response = client.post(
+            "/agents/SimulatedAgent/programs/question", json=dict(instruction="What is the capital of France?")
+        )
+        assert response.status_code == 200
+        assert response.json()["data"] == dict(answer="Paris", confidence=0.9)
+
+    def test_generated_response(self, client):
+        response = client.post("/agents/SimulatedAgent/programs/question", json=dict(instruction="Hi"))
+        assert response.status_code == 200
+        assert set(response.json()["data"]) == {"answer", "confidence"}
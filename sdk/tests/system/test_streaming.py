@@ -0,0 +1,115 @@
+import json
+from typing import List, Any, Dict, Literal, Union
+
+import pytest
+
+from eidos_sdk.cpu.call_context import CallContext
+from eidos_sdk.cpu.llm_message import LLMMessage, AssistantMessage
+from eidos_sdk.cpu.llm_unit import LLMUnit, LLMCallFunction
+from eidos_sdk.cpu.streaming import StreamEvent
+from eidos_sdk.system.resources.resources_base import Resource, Metadata
+from eidos_sdk.util.class_utils import fqn
+
+
+class ScriptedLLM(LLMUnit):
+    """Streams a fixed response one word at a time."""
+
+    response = "The capital of France is Paris."
+
+    async def execute_llm(
+        self,
+        call_context: CallContext,
+        messages: List[LLMMessage],
+        tools: List[LLMCallFunction],
+        output_format: Union[Literal["str"], Dict[str, Any]],
+    ) -> AssistantMessage:
+        return AssistantMessage(content=self.response, tool_calls=[])
+
+    async def execute_llm_stream(self, call_context, messages, tools, output_format):
+        words = self.response.split(" ")
+        for i, word in enumerate(words):
+            delta = word if i == 0 else " " + word
+            yield StreamEvent(event="delta", thread_id=call_context.thread_id, data=delta)
+        yield StreamEvent(event="result", data=await self.execute_llm(call_context, messages, tools, output_format))
+
+
+def parse_sse(text: str):
+    events = []
+    for block in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+@pytest.fixture(scope="module")
+def streaming_agent():
+    return Resource(
+        apiVersion="eidolon/v1",
+        kind="Agent",
+        metadata=Metadata(name="StreamingAgent"),
+        spec=dict(
+            implementation="GenericAgent",
+            cpu=dict(llm_unit=dict(implementation=fqn(ScriptedLLM))),
+            system_prompt="You are a helpful assistant.",
+            user_prompt="{{instruction}}",
+            input_schema=dict(instruction=dict(type="string")),
+            description="An agent which streams its responses.",
+        ),
+    )
+
+
+class TestStreaming:
+    @pytest.fixture(scope="class")
+    def client(self, client_builder, streaming_agent):
+        with client_builder(streaming_agent) as client:
+            yield client
+
+    def test_program_streams_deltas_then_state(self, client):
+        response = client.post(
+            "/agents/StreamingAgent/programs/question",
+            json=dict(instruction="What is the capital of France?"),
+            headers={"execution-mode": "stream"},
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = parse_sse(response.text)
+        deltas = [data["data"] for event, data in events if event == "delta"]
+        assert len(deltas) == 6
+        assert "".join(deltas) == ScriptedLLM.response
+        event, state = events[-1]
+        assert event == "state"
+        assert state["state"] == "idle"
+        assert state["data"] == ScriptedLLM.response
+        assert state["available_actions"] == ["respond"]
+
+    def test_final_state_is_persisted(self, client):
+        response = client.post(
+            "/agents/StreamingAgent/programs/question",
+            json=dict(instruction="What is the capital of France?"),
+            headers={"execution-mode": "stream"},
+        )
+        process_id = parse_sse(response.text)[-1][1]["process_id"]
+        status = client.get(f"/agents/StreamingAgent/processes/{process_id}/status")
+        assert status.json()["state"] == "idle"
+        assert status.json()["data"] == ScriptedLLM.response
+
+    def test_action_streams(self, client):
+        process_id = client.post(
+            "/agents/StreamingAgent/programs/question", json=dict(instruction="What is the capital of France?")
+        ).json()["process_id"]
+        response = client.post(
+            f"/agents/StreamingAgent/processes/{process_id}/actions/respond",
+            json=dict(statement="Are you sure?"),
+            headers={"execution-mode": "stream"},
+        )
+        events = parse_sse(response.text)
+        assert [event for event, _ in events] == ["delta"] * 6 + ["state"]
+        assert events[-1][1]["process_id"] == process_id
+
+    def test_errors_are_streamed(self, client):
+        response = client.post(
+            "/agents/StreamingAgent/processes/unknown/actions/respond",
+            json=dict(statement="Are you sure?"),
+            headers={"execution-mode": "stream"},
+        )
+        assert response.status_code == 404
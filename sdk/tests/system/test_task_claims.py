@@ -0,0 +1,97 @@
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from eidos_sdk.bin.worker_pool import process_local_components
+from eidos_sdk.memory.local_symbolic_memory import LocalSymbolicMemory
+from eidos_sdk.memory.noop_memory import NoopFileMemory
+from eidos_sdk.system import task_claims
+from eidos_sdk.system.task_claims import TaskClaim, claim_task, complete_task, release_stale_claims, wait_for_task
+
+
+@pytest.mark.asyncio
+async def test_one_worker_claims_each_period(os_symbolic_memory, monkeypatch):
+    monkeypatch.setattr(task_claims, "worker_id", lambda: "a")
+    assert await claim_task("sync", 60)
+    monkeypatch.setattr(task_claims, "worker_id", lambda: "b")
+    assert not await claim_task("sync", 60)
+    # tasks are claimed independently
+    assert await claim_task("retention", 60)
+
+    claim = await TaskClaim.find(query={"_id": "sync"})
+    assert claim.worker == "a"
+    assert claim.expires == pytest.approx(time.time() + 54, abs=1)
+
+
+@pytest.mark.asyncio
+async def test_expired_claims_can_be_taken(os_symbolic_memory, monkeypatch):
+    monkeypatch.setattr(task_claims, "worker_id", lambda: "a")
+    assert await claim_task("sync", 0)
+    monkeypatch.setattr(task_claims, "worker_id", lambda: "b")
+    assert await claim_task("sync", 60)
+    assert (await TaskClaim.find(query={"_id": "sync"})).worker == "b"
+
+
+@pytest.mark.asyncio
+async def test_loses_race_for_expired_claim(os_symbolic_memory, monkeypatch):
+    await claim_task("sync", 0)
+    stale = await TaskClaim.find(query={"_id": "sync"})
+    # another worker takes the expired claim between this worker's read and write
+    await stale.update(worker="other", expires=time.time() + 60)
+
+    async def find(**_kwargs):
+        return stale
+
+    monkeypatch.setattr(TaskClaim, "find", find)
+    assert not await claim_task("sync", 60)
+
+
+@pytest.mark.asyncio
+async def test_losing_workers_wait_for_the_first_completion(os_symbolic_memory, monkeypatch):
+    monkeypatch.setattr(task_claims, "worker_id", lambda: "a")
+    assert await claim_task("sync", 60)
+    waiting = asyncio.create_task(wait_for_task("sync", poll_interval=0.01))
+    await asyncio.sleep(0.05)
+    assert not waiting.done()
+
+    await complete_task("sync")
+    assert await waiting
+    # later periods do not wait, the previous completion stands
+    await (await TaskClaim.find(query={"_id": "sync"})).update(worker="b", expires=time.time() + 60)
+    assert await wait_for_task("sync")
+
+
+@pytest.mark.asyncio
+async def test_stops_waiting_when_the_claim_expires(os_symbolic_memory):
+    assert not await wait_for_task("sync")
+    assert await claim_task("sync", 0.05)
+    assert not await wait_for_task("sync", poll_interval=0.01)
+    assert await claim_task("sync", 60)
+
+
+@pytest.mark.asyncio
+async def test_releases_claims_of_stopped_workers_on_this_host(os_symbolic_memory):
+    exited = subprocess.Popen([sys.executable, "-c", "pass"])
+    exited.wait()
+    host = socket.gethostname()
+    expires = time.time() + 60
+    await TaskClaim.create(_id="stopped", worker=f"{host}:{exited.pid}", expires=expires)
+    await TaskClaim.create(_id="running", worker=f"{host}:{os.getpid()}", expires=expires)
+    await TaskClaim.create(_id="remote", worker=f"not-{host}:{exited.pid}", expires=expires)
+
+    await release_stale_claims()
+
+    assert await claim_task("stopped", 60)
+    assert not await claim_task("running", 60)
+    assert not await claim_task("remote", 60)
+
+
+def test_process_local_components():
+    memory = SimpleNamespace(symbolic_memory=LocalSymbolicMemory(), file_memory=NoopFileMemory())
+    assert process_local_components(SimpleNamespace(memory=memory)) == ["symbolic_memory (LocalSymbolicMemory)"]